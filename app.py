@@ -1,10 +1,15 @@
 import streamlit as st
-from chatbot import ask_gemini
 from auth import GoogleAuthenticator, validate_google_email, handle_oauth_callback, reset_auth_state
-import datetime
 import re
-import uuid
 import time
+import uuid
+from collections import OrderedDict, deque
+from chat_render import BubbleCache, RENDER_WINDOW, bot_bubble_html, window_start
+from llm_worker import CANCELLED, DONE, FAILED, TIMED_OUT
+from chat_store import ChatStore
+from context_builder import turns_from_history
+from metrics import metrics, start_exporters
+from session_memory import sessions
 
 # --- Streamlit Config ---
 st.set_page_config(
@@ -19,11 +24,42 @@ GOOGLE_CLIENT_ID = st.secrets.get("GOOGLE_CLIENT_ID", "")
 GOOGLE_CLIENT_SECRET = st.secrets.get("GOOGLE_CLIENT_SECRET", "")
 REDIRECT_URI = st.secrets.get("REDIRECT_URI", "https://your-app-name.streamlit.app/")
 
+# --- Shared Resources (built once per process, not on every rerun) ---
+@st.cache_resource
+def get_google_authenticator(client_id, client_secret, redirect_uri):
+    return GoogleAuthenticator(client_id, client_secret, redirect_uri)
+
+@st.cache_resource
+def get_chat_engine():
+    """Import the Gemini-backed pipeline on first use instead of at cold start"""
+    import user_data_manager
+    return user_data_manager
+
+@st.cache_resource
+def get_llm_runner():
+    """Thread pool shared by every session for LLM calls"""
+    from llm_worker import LLMJobRunner
+    return LLMJobRunner()
+
+# Seconds between checks on a reply being generated
+POLL_INTERVAL = 0.25
+
+@st.cache_resource
+def start_metrics():
+    """Serve or write metrics when ASHA_METRICS_PORT / ASHA_METRICS_FILE are set"""
+    metrics.add_collector("asha_llm_jobs", get_llm_runner().stats)
+    metrics.add_collector("asha_sessions", sessions.totals)
+    metrics.add_page("/sessions", sessions.report)
+    start_exporters()
+    return metrics
+
+start_metrics()
+
 # Initialize Google Authenticator
 google_auth = None
 if GOOGLE_CLIENT_ID and GOOGLE_CLIENT_SECRET:
     try:
-        google_auth = GoogleAuthenticator(GOOGLE_CLIENT_ID, GOOGLE_CLIENT_SECRET, REDIRECT_URI)
+        google_auth = get_google_authenticator(GOOGLE_CLIENT_ID, GOOGLE_CLIENT_SECRET, REDIRECT_URI)
     except Exception as e:
         st.warning(f"Google OAuth not configured: {e}")
 
@@ -40,17 +76,31 @@ def init_session_state():
         "interests": [],
         "authenticated": False,
         "user_info": None,
-        "current_chat_id": None,
-        "all_chats": {},
-        "last_processed_message": None,  # Track last processed message
-        "processing_timestamp": None,    # Track when processing started
-        "message_processed": False,      # NEW: Flag to prevent infinite processing
-        "input_cleared": False           # NEW: Flag for input clearing
+        "chat_store": None,
+        "bubble_cache": None,
+        "render_window": RENDER_WINDOW,  # Messages rendered from the end of the chat
+        "chat_list_page": 0,             # Sidebar page of the chat list
+        "request_id": None,              # Id carried by the next submission from this page
+        "processed_requests": None,      # Request ids already accepted, oldest first
+        "pending_requests": None,        # (request_id, message, quick action) waiting to be answered, oldest first
+        "active_job": None,              # {"job_id", "chat_id"} of the reply being generated
+        "data_loaded": False             # Stored profile/chats loaded for this login
     }
     
     for key, default in defaults.items():
         if key not in st.session_state:
             st.session_state[key] = default
+    # .get(): outside `streamlit run` (startup_benchmark.py) nothing above is stored
+    if st.session_state.get("chat_store") is None:
+        st.session_state.chat_store = ChatStore()
+    if st.session_state.get("bubble_cache") is None:
+        st.session_state.bubble_cache = BubbleCache()
+    if st.session_state.get("processed_requests") is None:
+        st.session_state.processed_requests = OrderedDict()
+    if st.session_state.get("pending_requests") is None:
+        st.session_state.pending_requests = deque()
+    if st.session_state.get("request_id") is None:
+        st.session_state.request_id = uuid.uuid4().hex
 
 init_session_state()
 
@@ -150,68 +200,100 @@ def apply_theme():
     """, unsafe_allow_html=True)
 
 # --- Data Management ---
+@st.cache_resource
+def get_data_manager():
+    """Storage client shared by every session in this process"""
+    from database import UserDataManager
+    return UserDataManager()
+
+# Chats listed per sidebar page
+CHATS_PER_PAGE = 10
+
+PROFILE_FIELDS = ["name", "career_stage", "interests", "profile_picture"]
+
 def save_user_data():
+    """Persist the profile and whichever chats changed"""
+    if st.session_state.email:
+        user_data = {field: st.session_state[field] for field in PROFILE_FIELDS}
+        user_data["email"] = st.session_state.email
+        user_data["current_chat_id"] = st.session_state.chat_store.active_id
+        with metrics.span("save_profile"):
+            get_data_manager().save_user_data(st.session_state.email, user_data)
+        save_dirty_chats()
+
+def save_chat(chat):
+    with metrics.span("save_chat"):
+        saved = get_data_manager().save_chat(st.session_state.email, chat.id, chat.to_dict())
+    if saved:
+        chat.dirty = False
+    return saved
+
+def save_dirty_chats():
     if st.session_state.email:
-        user_data = {
-            "email": st.session_state.email,
-            "name": st.session_state.name,
-            "chat_history": st.session_state.chat_history,
-            "career_stage": st.session_state.career_stage,
-            "interests": st.session_state.interests,
-            "profile_picture": st.session_state.profile_picture,
-            "all_chats": st.session_state.all_chats,
-            "current_chat_id": st.session_state.current_chat_id
-        }
-        st.session_state[f"user_data_{st.session_state.email}"] = user_data
-
-def load_user_data():
+        for chat in st.session_state.chat_store.dirty_chats():
+            save_chat(chat)
+        trim_session_memory()
+
+def trim_session_memory():
+    """Unload inactive chats past the session budget and update the process-wide view"""
+    store = st.session_state.chat_store
+    # The chat a reply is being generated for is written to when the job ends
+    keep = [st.session_state.active_job["chat_id"]] if st.session_state.active_job else []
+    store.evict(save_chat, keep=keep)
+    sessions.track(store, st.session_state.email, st.session_state.to_dict())
+
+def load_user_data(entered=None):
+    """Load the profile, chat titles and the active chat; other histories load on demand.
+
+    ``entered`` holds the profile fields the login form or Google just set;
+    those win, every other field comes from the stored profile.
+    """
     if st.session_state.email:
-        user_data_key = f"user_data_{st.session_state.email}"
-        if user_data_key in st.session_state:
-            data = st.session_state[user_data_key]
-            st.session_state.chat_history = data.get("chat_history", [])
-            st.session_state.name = data.get("name", st.session_state.name)
-            st.session_state.career_stage = data.get("career_stage", "")
-            st.session_state.interests = data.get("interests", [])
-            st.session_state.profile_picture = data.get("profile_picture", None)
-            st.session_state.all_chats = data.get("all_chats", {})
-            st.session_state.current_chat_id = data.get("current_chat_id", None)
+        manager = get_data_manager()
+        email = st.session_state.email
+        data = manager.load_user_data(email) or {}
+        entered = {field: value for field, value in (entered or {}).items() if value}
+        for field in PROFILE_FIELDS:
+            if field in entered:
+                st.session_state[field] = entered[field]
+            elif field in data:
+                st.session_state[field] = data[field]
+        
+        store = ChatStore.from_metadata(manager.list_chats(email),
+                                        loader=lambda chat_id: manager.load_chat(email, chat_id))
+        st.session_state.chat_store = store
+        if data.get("current_chat_id") in store:
+            store.switch(data["current_chat_id"])
+        st.session_state.chat_history = store.active.history if store.active else []
+        st.session_state.render_window = RENDER_WINDOW
+        st.session_state.data_loaded = True
+
+def active_chat():
+    """The chat new messages go to, started on first use"""
+    store = st.session_state.chat_store
+    if store.active is None:
+        store.new_chat()
+        st.session_state.chat_history = store.active.history
+    return store.active
 
 def create_new_chat():
-    if st.session_state.current_chat_id and st.session_state.chat_history:
-        st.session_state.all_chats[st.session_state.current_chat_id] = {
-            "title": get_chat_title(st.session_state.chat_history),
-            "history": st.session_state.chat_history.copy(),
-            "created": datetime.datetime.now().isoformat()
-        }
-    
-    st.session_state.current_chat_id = str(uuid.uuid4())
-    st.session_state.chat_history = []
-    st.session_state.last_processed_message = None
-    st.session_state.message_processed = False  # Reset processing flag
+    # The previous chat stays in the store as-is; nothing is copied
+    st.session_state.chat_history = st.session_state.chat_store.new_chat().history
+    st.session_state.render_window = RENDER_WINDOW
+    st.session_state.chat_list_page = 0
     save_user_data()
 
 def load_chat(chat_id):
-    if chat_id in st.session_state.all_chats:
-        if st.session_state.current_chat_id and st.session_state.chat_history:
-            st.session_state.all_chats[st.session_state.current_chat_id] = {
-                "title": get_chat_title(st.session_state.chat_history),
-                "history": st.session_state.chat_history.copy(),
-                "created": datetime.datetime.now().isoformat()
-            }
-        
-        chat_data = st.session_state.all_chats[chat_id]
-        st.session_state.current_chat_id = chat_id
-        st.session_state.chat_history = chat_data["history"]
-        st.session_state.last_processed_message = None
-        st.session_state.message_processed = False  # Reset processing flag
+    if chat_id in st.session_state.chat_store:
+        chat = st.session_state.chat_store.switch(chat_id)
+        if chat is None:
+            st.error("Couldn't load this chat right now. Please try again in a moment.")
+            return False
+        st.session_state.chat_history = chat.history
+        st.session_state.render_window = RENDER_WINDOW
         save_user_data()
-
-def get_chat_title(chat_history):
-    if chat_history:
-        first_message = next((msg[1] for msg in chat_history if msg[0] == 'user'), "New Chat")
-        return first_message[:40] + "..." if len(first_message) > 40 else first_message
-    return "New Chat"
+        return True
+    return False
 
 # --- Login Page ---
 def login_page():
@@ -222,10 +304,8 @@ def login_page():
         user_info = st.session_state.user_info
         st.session_state.logged_in = True
         st.session_state.email = user_info.get('email')
-        st.session_state.name = user_info.get('name', '')
-        st.session_state.profile_picture = user_info.get('picture')
         st.session_state.page = "chat"
-        load_user_data()
+        load_user_data({"name": user_info.get('name', ''), "profile_picture": user_info.get('picture')})
         st.rerun()
     
     # Handle OAuth callback
@@ -281,13 +361,8 @@ def login_page():
                 if re.match(r'^[\w\.-]+@[\w\.-]+\.\w+$', email):
                     st.session_state.logged_in = True
                     st.session_state.email = email
-                    st.session_state.name = name
-                    st.session_state.career_stage = career_stage
-                    st.session_state.interests = interests
                     st.session_state.page = "chat"
-                    st.session_state.last_processed_message = None
-                    st.session_state.message_processed = False  # Reset processing flag
-                    load_user_data()
+                    load_user_data({"name": name, "career_stage": career_stage, "interests": interests})
                     save_user_data()
                     st.rerun()
                 else:
@@ -297,22 +372,18 @@ def login_page():
 def chat_page():
     apply_theme()
     
-    # IMPORTANT: Reset message_processed flag so new messages can be sent
-    # But only if enough time has passed since last processing
-    current_time = time.time()
-    if (st.session_state.processing_timestamp is None or 
-        (current_time - st.session_state.processing_timestamp) > 3):
-        st.session_state.message_processed = False
-    
-    # Clear input if needed
-    if st.session_state.get("input_cleared", False):
-        st.session_state["chat_input"] = ""
-        st.session_state.input_cleared = False
+    # Widgets rendered in this run submit under this id
+    request_id = st.session_state.request_id
     
     # Load user data
-    if not st.session_state.chat_history and st.session_state.email:
+    if not st.session_state.data_loaded and st.session_state.email:
         load_user_data()
     
+    # Start the oldest accepted submission; messages sent mid-answer wait their turn
+    if st.session_state.pending_requests and not st.session_state.active_job:
+        _, message, quick_action = st.session_state.pending_requests.popleft()
+        start_llm_job(message, quick_action)
+    
     # Sidebar
     with st.sidebar:
         # Profile section
@@ -336,51 +407,60 @@ def chat_page():
             create_new_chat()
             st.rerun()
         
-        # Previous chats
-        if st.session_state.all_chats:
-            for chat_id, chat_data in reversed(list(st.session_state.all_chats.items())):
-                chat_title = chat_data.get("title", "Untitled Chat")
-                is_active = chat_id == st.session_state.current_chat_id
+        # Previous chats, one page at a time from the metadata index
+        chat_index = st.session_state.chat_store.index
+        shown_chats, search = [], ""
+        if chat_index:
+            search = st.text_input("🔍 Search chats", key="chat_search")
+            chats, page, pages = sidebar_chats(chat_index, search)
+            shown_chats = [(chat["chat_id"], chat["title"]) for chat in chats]
+            
+            for chat_data in chats:
+                chat_id = chat_data["chat_id"]
+                is_active = chat_id == st.session_state.chat_store.active_id
                 
-                if st.button(f"{'🟢' if is_active else '💬'} {chat_title}", 
+                if st.button(f"{'🟢' if is_active else '💬'} {chat_data['title']}", 
                            key=f"load_chat_{chat_id}", use_container_width=True):
-                    if not is_active:
-                        load_chat(chat_id)
+                    # A failed load leaves its error on screen instead of rerunning
+                    if not is_active and load_chat(chat_id):
+                        st.rerun()
+            
+            if pages > 1:
+                col1, col2, col3 = st.columns([1, 2, 1])
+                with col1:
+                    if st.button("◀", key="chats_prev_btn", disabled=page == 0):
+                        st.session_state.chat_list_page = page - 1
+                        st.rerun()
+                with col2:
+                    st.caption(f"Page {page + 1} of {pages}")
+                with col3:
+                    if st.button("▶", key="chats_next_btn", disabled=page >= pages - 1):
+                        st.session_state.chat_list_page = page + 1
                         st.rerun()
 
         # Quick actions
         st.markdown("### 🚀 Quick Actions")
         
-        if st.button("💼 Find Jobs", key="quick_jobs", use_container_width=True):
-            if handle_quick_action("Show me women-friendly job opportunities"):
-                st.rerun()
-        
-        if st.button("📄 Resume Help", key="quick_resume", use_container_width=True):
-            if handle_quick_action("Help me build a professional resume"):
-                st.rerun()
-        
-        if st.button("🎓 Scholarships", key="quick_scholarships", use_container_width=True):
-            if handle_quick_action("Tell me about scholarships for women"):
-                st.rerun()
-        
-        if st.button("💪 Salary Tips", key="quick_salary", use_container_width=True):
-            if handle_quick_action("Help me with salary negotiation"):
-                st.rerun()
+        for label, key, message in QUICK_ACTIONS:
+            st.button(label, key=f"{key}_{request_id}", use_container_width=True,
+                      on_click=submit_request, args=(request_id, message, True))
 
         st.markdown("---")
         if st.button("🧹 Clear Chat", use_container_width=True, key="clear_chat_btn"):
-            st.session_state.chat_history.clear()
-            st.session_state.last_processed_message = None
-            st.session_state.message_processed = False  # Reset processing flag
+            if st.session_state.chat_store.active:
+                st.session_state.chat_store.active.clear()
             save_user_data()
             st.rerun()
         
         if st.button("🚪 Logout", use_container_width=True, key="logout_btn"):
+            cancel_llm_job()
             save_user_data()
-            # Clear auth session state
+            sessions.forget(st.session_state.chat_store)
+            # Clear auth session state and everything loaded for this user
             for key in list(st.session_state.keys()):
-                if key in ['page', 'logged_in', 'email', 'authenticated', 'user_info', 
-                          'last_processed_message', 'message_processed', 'input_cleared']:
+                if key in ['page', 'logged_in', 'email', 'authenticated', 'user_info', 'credentials',
+                          'pending_requests', 'active_job', 'data_loaded',
+                          'chat_store', 'bubble_cache', 'chat_history'] + PROFILE_FIELDS:
                     del st.session_state[key]
             st.session_state.page = "login"
             st.rerun()
@@ -397,147 +477,166 @@ def chat_page():
         </div>
         """, unsafe_allow_html=True)
 
-    # Display chat history
-    for role, message in st.session_state.chat_history:
-        if role == "user":
-            st.markdown(f"""
-            <div class="chat-bubble user-bubble">
-                <strong>You:</strong> {message}
-            </div>
-            """, unsafe_allow_html=True)
-        else:
-            st.markdown(f"""
-            <div class="chat-bubble bot-bubble">
-                <strong>🌸 Asha:</strong> {message}
-            </div>
-            """, unsafe_allow_html=True)
+    # Display chat history: only the newest messages, older ones on request
+    history = st.session_state.chat_history
+    start = window_start(len(history), st.session_state.render_window)
+    if start > 0:
+        if st.button(f"⬆️ Load earlier messages ({start} more)", key="load_earlier_btn"):
+            st.session_state.render_window += RENDER_WINDOW
+            st.rerun()
+    if history:
+        with metrics.span("render"):
+            for html in st.session_state.bubble_cache.render(history, start):
+                st.markdown(html, unsafe_allow_html=True)
+
+    # The reply being generated streams in here, above the input form
+    response_slot = st.empty()
+    if st.session_state.active_job:
+        st.button("⏹ Stop generating", key=f"stop_{st.session_state.active_job['job_id']}",
+                  on_click=cancel_llm_job)
 
     # Chat input form
     st.markdown("---")
     
-    # Use a container to isolate the form
-    chat_container = st.container()
-    with chat_container:
-        with st.form("chat_input_form"):
-            user_input = st.text_area(
-                "💬 Ask me anything:",
-                placeholder="Ask about career advice, job opportunities, resume tips...",
-                height=100,
-                key="chat_input"
-            )
-            
-            col1, col2 = st.columns([4, 1])
-            with col1:
-                send_clicked = st.form_submit_button("💜 Send Message", use_container_width=True)
-            with col2:
-                clear_clicked = st.form_submit_button("🧹 Clear Input", use_container_width=True)
-            
-            # Handle clear input button
-            if clear_clicked:
-                st.session_state.input_cleared = True
-                st.session_state.message_processed = True  # Prevent rerun processing
-                st.rerun()
-            
-            # Process the message if send was clicked
-            if send_clicked and user_input.strip():
-                processed = handle_user_message(user_input.strip())
-                if processed:
-                    # Clear input after successful processing
-                    st.session_state.input_cleared = True
-                    # Add a small delay to prevent immediate reprocessing
-                    time.sleep(0.1)
-                    st.rerun()
-                elif processed is False and st.session_state.last_processed_message == user_input.strip():
-                    # Message was blocked from reprocessing - just clear input
-                    st.session_state.input_cleared = True
-                    st.rerun()
-
-def handle_quick_action(message):
-    """Handle quick action button clicks"""
-    # Debug print for troubleshooting
-    print(f"Quick Action - Processing Message: {message}")
-    print(f"Last Processed: {st.session_state.last_processed_message}")
-    print(f"Message Processed Flag: {st.session_state.message_processed}")
-    
-    # Check if this exact message was already processed recently (within 2 seconds)
-    current_time = time.time()
-    if (st.session_state.last_processed_message == message and 
-        st.session_state.processing_timestamp and 
-        (current_time - st.session_state.processing_timestamp) < 2):
-        print(f"BLOCKING: Same quick action processed recently")
-        return False
+    with st.form("chat_input_form", clear_on_submit=True):
+        st.text_area(
+            "💬 Ask me anything:",
+            placeholder="Ask about career advice, job opportunities, resume tips...",
+            height=100,
+            key="chat_input"
+        )
+        
+        col1, col2 = st.columns([4, 1])
+        with col1:
+            st.form_submit_button("💜 Send Message", use_container_width=True,
+                                  on_click=submit_form, args=(request_id,))
+        with col2:
+            # Submitting a clear_on_submit form empties the input
+            st.form_submit_button("🧹 Clear Input", use_container_width=True)
     
-    if not st.session_state.message_processed and message != st.session_state.last_processed_message:
-        st.session_state.message_processed = True
-        return process_message(message)
-    return False
+    # Wait for the reply last, so the whole page stays usable while it is generated
+    if st.session_state.active_job:
+        wait_for_llm_job(response_slot)
+        # Rerun when a queued message is waiting or the sidebar drawn above is out of date
+        chat_index = st.session_state.chat_store.index
+        if (st.session_state.pending_requests or
+                shown_chats != [(chat["chat_id"], chat["title"]) for chat in sidebar_chats(chat_index, search)[0]]):
+            st.rerun()
 
-def handle_user_message(message):
-    """Handle user input from the chat form"""
-    # Debug print for troubleshooting
-    print(f"User Message - Processing Message: {message}")
-    print(f"Last Processed: {st.session_state.last_processed_message}")
-    print(f"Message Processed Flag: {st.session_state.message_processed}")
-    
-    # Check if this exact message was already processed recently (within 2 seconds)
-    current_time = time.time()
-    if (st.session_state.last_processed_message == message and 
-        st.session_state.processing_timestamp and 
-        (current_time - st.session_state.processing_timestamp) < 2):
-        print(f"BLOCKING: Same message processed recently")
+# Sidebar shortcuts: (label, widget key, message sent)
+QUICK_ACTIONS = [
+    ("💼 Find Jobs", "quick_jobs", "Show me women-friendly job opportunities"),
+    ("📄 Resume Help", "quick_resume", "Help me build a professional resume"),
+    ("🎓 Scholarships", "quick_scholarships", "Tell me about scholarships for women"),
+    ("💪 Salary Tips", "quick_salary", "Help me with salary negotiation"),
+]
+
+# Accepted request ids remembered per session
+MAX_TRACKED_REQUESTS = 256
+
+def sidebar_chats(chat_index, search):
+    """Chats on the current sidebar page, with the page number and page count"""
+    chats = chat_index.search(search) if search.strip() else None
+    total = len(chats) if chats is not None else len(chat_index)
+    pages = max((total - 1) // CHATS_PER_PAGE + 1, 1)
+    page = min(st.session_state.chat_list_page, pages - 1)
+    if chats is not None:
+        chats = chats[page * CHATS_PER_PAGE:(page + 1) * CHATS_PER_PAGE]
+    else:
+        chats = chat_index.newest_first(page * CHATS_PER_PAGE, CHATS_PER_PAGE)
+    return chats, page, pages
+
+def submit_request(request_id, message, quick_action=False):
+    """Widget callback: accept a message once per request id.
+
+    Every widget rendered in a run carries that run's request id, and an
+    accepted id is replaced before the next run, so a double click or a
+    resubmitted form arrives with an id that is already taken and is dropped.
+    Quick actions are answered without the conversation (see start_llm_job).
+    """
+    message = message.strip()
+    processed = st.session_state.processed_requests
+    if not message or request_id in processed:
         return False
-    
-    if not st.session_state.message_processed and message.strip():
-        st.session_state.message_processed = True
-        return process_message(message)
-    return False
+    processed[request_id] = True
+    if len(processed) > MAX_TRACKED_REQUESTS:
+        processed.popitem(last=False)
+    st.session_state.request_id = uuid.uuid4().hex
+    st.session_state.pending_requests.append((request_id, message, quick_action))
+    return True
 
-def process_message(user_message):
-    """Process a user message and get AI response"""
-    try:
-        # Track this message as processed
-        st.session_state.last_processed_message = user_message
-        st.session_state.processing_timestamp = time.time()
-        
-        # Ensure chat session exists
-        if not st.session_state.get("current_chat_id"):
-            st.session_state.current_chat_id = str(uuid.uuid4())
+def submit_form(request_id):
+    submit_request(request_id, st.session_state.get("chat_input", ""))
 
-        # Add user message to history
-        st.session_state.chat_history.append(("user", user_message))
+def start_llm_job(user_message, quick_action=False):
+    """Add the message to the active chat and generate the reply in the background.
 
-        # Show loading message
-        loading_placeholder = st.empty()
-        loading_placeholder.info("🌸 Asha is thinking...")
+    A quick action is a standalone question: it is answered for the user's
+    profile rather than the conversation, so its reply is shared across chats.
+    """
+    chat = active_chat()
+    context = turns_from_history(chat.history)
+    profile = ({"career_stage": st.session_state.career_stage,
+                "interests": sorted(st.session_state.interests)} if quick_action else None)
+    chat.append("user", user_message)
+    engine = get_chat_engine()
+    job_id = get_llm_runner().submit(lambda: engine.ask_gemini_stream(user_message, context, chat.id, profile),
+                                     owner=st.session_state.email)
+    st.session_state.active_job = {"job_id": job_id, "chat_id": chat.id}
 
-        # Get AI response
-        try:
-            response = ask_gemini(user_message)
-            loading_placeholder.empty()
-            
-            if response:
-                # Add AI response to history
-                st.session_state.chat_history.append(("assistant", response))
-                save_user_data()
-                return True
-            else:
-                st.error("Sorry, I couldn't generate a response. Please try again.")
-                # Remove the user message if no response
-                if st.session_state.chat_history and st.session_state.chat_history[-1][0] == "user":
-                    st.session_state.chat_history.pop()
-                return False
-                
-        except Exception as e:
-            loading_placeholder.empty()
-            st.error(f"An error occurred while getting response: {str(e)}")
-            # Remove the user message if error occurred
-            if st.session_state.chat_history and st.session_state.chat_history[-1][0] == "user":
-                st.session_state.chat_history.pop()
-            return False
+def cancel_llm_job():
+    if st.session_state.active_job:
+        get_llm_runner().cancel(st.session_state.active_job["job_id"])
 
-    except Exception as e:
-        st.error(f"An unexpected error occurred: {str(e)}")
-        return False
+def wait_for_llm_job(slot):
+    """Stream the active job into ``slot`` until it finishes, then store the reply.
+
+    Each poll updates ``slot``, which is where Streamlit stops this run when
+    the user clicks something; the next run picks the job up again.
+    """
+    active = st.session_state.active_job
+    runner = get_llm_runner()
+    job = runner.get(active["job_id"])
+    chat = st.session_state.chat_store.chats.get(active["chat_id"])
+    visible = chat is not None and chat is st.session_state.chat_store.active
+    while job is not None and not job.is_finished:
+        if not visible:
+            slot.caption("⏳ Asha is still answering in another chat...")
+        elif job.text:
+            slot.markdown(bot_bubble_html(job.text + " ▌"), unsafe_allow_html=True)
+        else:
+            slot.info("🌸 Asha is thinking...")
+        time.sleep(POLL_INTERVAL)
+    
+    st.session_state.active_job = None
+    status = job.status if job is not None else FAILED
+    response = job.text.strip() if job is not None else ""
+    if job is not None:
+        runner.forget(job.id)
+        if job.started is not None:
+            metrics.observe("llm_queue", job.started - job.submitted)
+        if job.finished is not None:
+            metrics.observe("llm_job", job.finished - job.submitted)
+    if chat is None:
+        return
+    
+    # A stopped answer keeps what was generated so far
+    if response and status in (DONE, CANCELLED):
+        chat.append("assistant", response)
+        if visible:
+            slot.markdown(bot_bubble_html(response), unsafe_allow_html=True)
+    else:
+        slot.empty()
+        if status == TIMED_OUT:
+            st.error("Asha took too long to answer. Please try again.")
+        elif status == FAILED and job is not None and job.error:
+            st.error(f"An error occurred while getting response: {job.error}")
+        elif status != CANCELLED:
+            st.error("Sorry, I couldn't generate a response. Please try again.")
+        # Remove the user message if there is no response
+        if chat.history and chat.history[-1][0] == "user":
+            chat.pop()
+    save_dirty_chats()
 
 # --- Main App ---
 def main():
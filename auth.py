@@ -1,10 +1,6 @@
 # Enhanced auth.py with popup OAuth support - Fixed for Streamlit Cloud
 
 import streamlit as st
-import requests
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import Flow
 import re
 import secrets
 import os
@@ -64,6 +60,25 @@ class GoogleAuthenticator:
             'https://www.googleapis.com/auth/userinfo.profile'
         ]
     
+    def _build_flow(self):
+        """Create the OAuth flow; the OAuth SDK is only imported once someone signs in"""
+        from google_auth_oauthlib.flow import Flow
+
+        flow = Flow.from_client_config(
+            {
+                "web": {
+                    "client_id": self.client_id,
+                    "client_secret": self.client_secret,
+                    "auth_uri": "https://accounts.google.com/o/oauth2/auth",
+                    "token_uri": "https://oauth2.googleapis.com/token",
+                    "redirect_uris": [self.redirect_uri]
+                }
+            },
+            scopes=self.scopes
+        )
+        flow.redirect_uri = self.redirect_uri
+        return flow
+    
     def get_authorization_url(self, state=None):
         """Generate OAuth URL with improved error handling"""
         if not self.client_id or not self.client_secret:
@@ -71,19 +86,7 @@ class GoogleAuthenticator:
             return None
             
         try:
-            flow = Flow.from_client_config(
-                {
-                    "web": {
-                        "client_id": self.client_id,
-                        "client_secret": self.client_secret,
-                        "auth_uri": "https://accounts.google.com/o/oauth2/auth",
-                        "token_uri": "https://oauth2.googleapis.com/token",
-                        "redirect_uris": [self.redirect_uri]
-                    }
-                },
-                scopes=self.scopes
-            )
-            flow.redirect_uri = self.redirect_uri
+            flow = self._build_flow()
             
             if not state:
                 state = secrets.token_urlsafe(32)
@@ -126,19 +129,7 @@ class GoogleAuthenticator:
             return None, None
         
         try:
-            flow = Flow.from_client_config(
-                {
-                    "web": {
-                        "client_id": self.client_id,
-                        "client_secret": self.client_secret,
-                        "auth_uri": "https://accounts.google.com/o/oauth2/auth",
-                        "token_uri": "https://oauth2.googleapis.com/token",
-                        "redirect_uris": [self.redirect_uri]
-                    }
-                },
-                scopes=self.scopes
-            )
-            flow.redirect_uri = self.redirect_uri
+            flow = self._build_flow()
             
             # Exchange code for token
             flow.fetch_token(code=authorization_code)
@@ -166,6 +157,8 @@ class GoogleAuthenticator:
     
     def _get_user_info(self, access_token):
         """Get user information from Google API"""
+        import requests
+
         headers = {'Authorization': f'Bearer {access_token}'}
         response = requests.get(
             'https://www.googleapis.com/oauth2/v2/userinfo', 
@@ -0,0 +1,257 @@
+"""Roadmap and career catalog answered without an LLM call.
+
+The catalog lives in career_catalog.json (versioned). It is loaded once per
+process and indexed by skill alias, level and field, so a roadmap or
+"which careers" question is a dictionary lookup. Gemini is only asked when
+the user shares their own background and the answer should be personalized;
+the catalog text is then passed along as reference material.
+
+    python career_catalog.py     # coverage check + latency comparison
+"""
+import json
+import os
+import re
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+CATALOG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "career_catalog.json")
+
+# Skills users ask about most often; every one must resolve to a roadmap
+COMMON_SKILLS = [
+    "python", "java", "javascript", "sql", "excel", "data science", "data analysis",
+    "machine learning", "ai", "web development", "frontend", "react", "cloud", "aws",
+    "devops", "cybersecurity", "ui/ux", "product management", "digital marketing", "seo",
+    "content writing", "project management", "business analyst", "finance", "hr",
+    "graphic design", "public speaking", "leadership",
+]
+
+_WORD = re.compile(r"[a-z0-9+#/]+(?:-[a-z0-9]+)*")
+_LEVEL_WORDS = {
+    "beginner": "beginner", "basics": "beginner", "scratch": "beginner", "fresher": "beginner",
+    "intermediate": "intermediate", "next level": "intermediate",
+    "advanced": "advanced", "expert": "advanced", "senior": "advanced",
+}
+_FIELD_WORDS = {
+    "non-tech": "non-tech", "non tech": "non-tech", "non-technical": "non-tech", "non technical": "non-tech",
+    "tech": "tech", "technical": "tech", "technology": "tech", "software": "tech",
+}
+# "Which careers / roles ..." and "career options"; "what jobs ..." is a job search
+_CAREER_QUESTION = re.compile(
+    r"\b(which|what|suggest\w*|list)\b.*\b(careers?|roles|professions?)\b"
+    r"|\bcareer (options|paths|ideas|choices)\b")
+# Pay, openings and places change; the static list cannot answer those
+_LIVE_QUESTION = re.compile(r"\b(pay|pays|paid|paying|salary|salaries|earn\w*|openings?|vacanc\w*|hiring|"
+                            r"open positions?|near me|locations?|cit(y|ies))\b")
+# Places users ask about; matched by name rather than by capitalization, so
+# "in Data Science" or "in Product Management" is not taken for a place
+KNOWN_PLACES = [
+    "india", "bangalore", "bengaluru", "mumbai", "delhi", "new delhi", "ncr", "gurgaon", "gurugram",
+    "noida", "hyderabad", "chennai", "pune", "kolkata", "ahmedabad", "kochi", "coimbatore", "jaipur",
+    "chandigarh", "indore", "lucknow", "mysore", "mysuru", "trivandrum", "thiruvananthapuram",
+    "usa", "uk", "canada", "germany", "singapore", "dubai", "uae", "australia", "europe",
+    "london", "new york", "san francisco", "toronto", "berlin",
+]
+_PLACE = re.compile(r"\b(" + "|".join(re.escape(place) for place in KNOWN_PLACES) + r")\b")
+# Background the user shares about themselves; worth a personalized answer
+_PERSONAL = re.compile(r"\b(i am|i'm|i have|i've|i was|my)\b")
+PERSONAL_MIN_WORDS = 9
+ROADMAP_FOOTER = "Tip: build one small project per stage and share it on LinkedIn or GitHub. 💜"
+
+ROADMAP = "roadmap"
+JOB_SEARCH = "job_search"
+
+# Questions the catalog must leave to Gemini, with the intent they arrive with
+NOT_CATALOG = [
+    ("What jobs are open for women in tech in Bangalore?", JOB_SEARCH),
+    ("what jobs pay the most in sql", JOB_SEARCH),
+    ("Which careers pay the most for data science?", JOB_SEARCH),
+    ("Any openings for a python developer role?", JOB_SEARCH),
+    ("What careers suit me?", None),
+    ("Python roadmap for jobs in Pune", ROADMAP),
+    ("Which tech careers are open in Chennai?", JOB_SEARCH),
+]
+# Questions the catalog must answer even though a capitalized phrase follows "in"
+CATALOG_ONLY = [
+    ("Which roles are there in Product Management?", JOB_SEARCH),
+    ("Give me a roadmap for a career in Data Science", ROADMAP),
+]
+
+
+def _words(text: str) -> List[str]:
+    return _WORD.findall(text.lower())
+
+
+def _phrase_lookup(table: Dict[str, str], words: List[str], max_words: int) -> Optional[str]:
+    """Longest phrase of ``table`` found in ``words``; earliest wins on ties"""
+    best, best_len = None, 0
+    for start in range(len(words)):
+        for size in range(min(max_words, len(words) - start), best_len, -1):
+            value = table.get(" ".join(words[start:start + size]))
+            if value is not None:
+                best, best_len = value, size
+                break
+    return best
+
+
+class CareerCatalog:
+    def __init__(self, data: Dict):
+        self.version = data.get("version", 0)
+        self.levels = data["levels"]
+        self.skills = {skill["id"]: skill for skill in data["skills"]}
+        self.careers = data["careers"]
+
+        self._alias_to_skill = {}
+        for skill in data["skills"]:
+            for alias in [skill["id"], skill["name"]] + skill.get("aliases", []):
+                self._alias_to_skill[" ".join(_words(alias))] = skill["id"]
+        self._max_alias_words = max(len(alias.split()) for alias in self._alias_to_skill)
+        self.skills_by_field = defaultdict(list)
+        for skill in data["skills"]:
+            self.skills_by_field[skill["field"]].append(skill["id"])
+        self.careers_by_field = defaultdict(list)
+        self.careers_by_skill = defaultdict(list)
+        for career in self.careers:
+            self.careers_by_field[career["field"]].append(career["title"])
+            for skill_id in career["skills"]:
+                self.careers_by_skill[skill_id].append(career["title"])
+
+    @classmethod
+    def from_file(cls, path: str = CATALOG_PATH) -> "CareerCatalog":
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def find_skill(self, query: str) -> Optional[str]:
+        return _phrase_lookup(self._alias_to_skill, _words(query), self._max_alias_words)
+
+    def find_level(self, query: str) -> str:
+        return _phrase_lookup(_LEVEL_WORDS, _words(query), 2) or "beginner"
+
+    def find_field(self, query: str) -> Optional[str]:
+        return _phrase_lookup(_FIELD_WORDS, _words(query), 2)
+
+    def available_level(self, skill_id: str, level: str = "beginner") -> Optional[str]:
+        """``level`` if the skill has it, else the closest lower level it has"""
+        roadmaps = self.skills.get(skill_id, {}).get("roadmap", {})
+        if level not in self.levels:
+            level = "beginner"
+        for candidate in reversed(self.levels[:self.levels.index(level) + 1]):
+            if candidate in roadmaps:
+                return candidate
+        return None
+
+    def roadmap(self, skill_id: str, level: str = "beginner") -> Optional[List[str]]:
+        level = self.available_level(skill_id, level)
+        return self.skills[skill_id]["roadmap"][level] if level else None
+
+    def careers_for(self, field: Optional[str] = None) -> List[str]:
+        if field in self.careers_by_field:
+            return list(self.careers_by_field[field])
+        return [career["title"] for career in self.careers]
+
+    def needs_personalization(self, query: str) -> bool:
+        """True when the user describes their own situation in some detail"""
+        return bool(_PERSONAL.search(query.lower())) and len(_words(query)) >= PERSONAL_MIN_WORDS
+
+    def answer(self, query: str, intent: Optional[str]) -> Optional[str]:
+        """Catalog reply for a roadmap or career-options question, else None.
+
+        Questions about pay, openings or a place are left to Gemini even
+        when their wording matches.
+        """
+        if intent not in (ROADMAP, JOB_SEARCH):
+            return None
+        if _LIVE_QUESTION.search(query.lower()) or _PLACE.search(query.lower()):
+            return None
+        skill_id = self.find_skill(query)
+        if intent == ROADMAP and skill_id:
+            level = self.available_level(skill_id, self.find_level(query))
+            if level:
+                name = self.skills[skill_id]["name"]
+                lines = "\n".join(f"• {step}" for step in self.skills[skill_id]["roadmap"][level])
+                return f"🗺️ Here's your {name} roadmap ({level} level):\n\n{lines}\n\n{ROADMAP_FOOTER}"
+        if _CAREER_QUESTION.search(query.lower()):
+            if skill_id and self.careers_by_skill.get(skill_id):
+                name = self.skills[skill_id]["name"]
+                titles = self.careers_by_skill[skill_id]
+                heading = f"💼 Roles where {name} is a core skill:"
+            else:
+                field = self.find_field(query)
+                if field is None:
+                    return None
+                titles = self.careers_for(field)
+                heading = f"💼 Popular {field} career options:"
+            return heading + "\n\n" + "\n".join(f"• {title}" for title in titles)
+        return None
+
+
+career_catalog = CareerCatalog.from_file()
+
+
+def check_coverage(catalog: CareerCatalog, skills: List[str] = COMMON_SKILLS) -> bool:
+    ok = True
+    for skill in skills:
+        query = f"Can you give me a roadmap to learn {skill}?"
+        reply = catalog.answer(query, ROADMAP)
+        if reply is None:
+            ok = False
+            print(f"  MISSING roadmap for {skill!r}")
+    for query, intent in NOT_CATALOG:
+        if catalog.answer(query, intent) is not None:
+            ok = False
+            print(f"  {query!r} should go to Gemini, got a catalog answer")
+    for query, intent in CATALOG_ONLY:
+        if catalog.answer(query, intent) is None:
+            ok = False
+            print(f"  {query!r} should get a catalog answer, went to Gemini")
+    for skill_id, skill in catalog.skills.items():
+        if "beginner" not in skill["roadmap"]:
+            ok = False
+            print(f"  {skill_id!r} has no beginner roadmap")
+    for career in catalog.careers:
+        unknown = [skill_id for skill_id in career["skills"] if skill_id not in catalog.skills]
+        if unknown:
+            ok = False
+            print(f"  {career['title']!r} lists unknown skills {unknown}")
+    print(f"coverage: {len(skills)} common skills, {len(catalog.skills)} roadmaps, "
+          f"{len(catalog.careers)} careers, {'all covered' if ok else 'gaps above'}")
+    return ok
+
+
+def run_benchmark(catalog: CareerCatalog, repeat: int = 2000):
+    """Local catalog answer vs a Gemini round trip for the same questions"""
+    queries = [
+        ("Can you give me a roadmap to learn python?", ROADMAP),
+        ("What is an intermediate path for UI/UX design?", ROADMAP),
+        ("Which careers can I get into with SQL?", JOB_SEARCH),
+        ("Suggest some non-tech career options", JOB_SEARCH),
+    ]
+    start = time.perf_counter()
+    CareerCatalog.from_file()
+    print(f"catalog load: {(time.perf_counter() - start) * 1000:.1f} ms (once per process)")
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for query, intent in queries:
+            catalog.answer(query, intent)
+    local = (time.perf_counter() - start) / (repeat * len(queries))
+    print(f"catalog answer: {local * 1e6:.1f} us/query")
+
+    if not os.getenv("API_KEY"):
+        print("Gemini: set API_KEY to time the same questions against the model")
+        return
+    from gemini_client import get_model
+
+    timings = []
+    for query, _ in queries:
+        start = time.perf_counter()
+        get_model().generate_content(query)
+        timings.append(time.perf_counter() - start)
+    remote = sum(timings) / len(timings)
+    print(f"Gemini: {remote * 1000:.0f} ms/query ({remote / local:,.0f}x the catalog)")
+
+
+if __name__ == "__main__":
+    passed = check_coverage(career_catalog)
+    run_benchmark(career_catalog)
+    sys.exit(0 if passed else 1)
@@ -0,0 +1,125 @@
+import time
+from typing import List
+
+# Messages shown before "Load earlier messages"; each click shows this many more
+RENDER_WINDOW = 20
+
+
+# Each bubble is its own st.markdown call: in a shared block, unbalanced
+# markup in one message (an open "<!--" or ``` fence) swallows the bubbles
+# after it. Bubbles start at column 0 so dedenting never makes them code.
+def user_bubble_html(message):
+    return f'<div class="chat-bubble user-bubble"><strong>You:</strong> {message}</div>'
+
+def bot_bubble_html(message):
+    return f'<div class="chat-bubble bot-bubble"><strong>🌸 Asha:</strong> {message}</div>'
+
+def bubble_html(role, message):
+    return user_bubble_html(message) if role == "user" else bot_bubble_html(message)
+
+
+class BubbleCache:
+    """Rendered bubble HTML for one chat history, reused across reruns.
+
+    Entry ``i`` remembers which message object it was rendered from, so an
+    entry is rebuilt only when that slot now holds a different message
+    (another chat was opened, or the chat was cleared and refilled).
+    Entries above the rendered window are dropped, so the cache never keeps
+    messages of an unloaded chat alive.
+    """
+
+    def __init__(self):
+        self._entries = []
+        self._first = 0
+        self.rendered = 0
+
+    def render(self, history: List, start: int = 0) -> List[str]:
+        """HTML of each bubble in ``history[start:]``, one st.markdown call each"""
+        entries = self._entries
+        if len(entries) < len(history):
+            entries.extend([None] * (len(history) - len(entries)))
+        del entries[len(history):]
+        start = max(start, 0)
+        for i in range(self._first, min(start, len(entries))):
+            entries[i] = None
+        self._first = start
+
+        parts = []
+        for i in range(start, len(history)):
+            entry = entries[i]
+            if entry is None or entry[0] is not history[i]:
+                entry = entries[i] = (history[i], bubble_html(*history[i]))
+                self.rendered += 1
+            parts.append(entry[1])
+        return parts
+
+
+def window_start(history_length: int, window: int) -> int:
+    return max(history_length - window, 0)
+
+
+def check_layout() -> bool:
+    """No message may turn the bubbles after it into code or hide them.
+
+    Renders each bubble the way st.markdown does: clean_text (dedent and
+    strip), then CommonMark (markdown-it-py ships with streamlit's rich).
+    A browser treats everything after an unclosed ``<!--`` in a block as
+    a comment, so bubbles past one are not counted.
+    """
+    from markdown_it import MarkdownIt
+    from streamlit.string_util import clean_text
+
+    from user_data_manager import FOLLOW_UP_SUFFIX
+
+    markdown = MarkdownIt("commonmark")
+    cases = {
+        "multi-line reply": "Start by shadowing a product manager." + FOLLOW_UP_SUFFIX,
+        "unclosed comment": "Is <!-- a problem in my resume?",
+        "unclosed code fence": "Try this:\n\n```python\nprint('hello')",
+    }
+    ok = True
+    for name, message in cases.items():
+        history = [("user", "How do I move into product management?"), ("assistant", message),
+                   ("user", "Yes, tell me about interviews"), ("assistant", "Practise product-sense questions.")]
+        bubbles = 0
+        for block in BubbleCache().render(history):
+            html = markdown.render(clean_text(block))
+            if "<!--" in html and "-->" not in html.split("<!--", 1)[1]:
+                html = html.split("<!--", 1)[0]
+            bubbles += html.count('<div class="chat-bubble')
+        passed = bubbles == len(history)
+        ok = ok and passed
+        print(f"{name} then more bubbles: {bubbles}/{len(history)} bubbles shown, {'ok' if passed else 'BROKEN'}")
+    return ok
+
+
+def run_benchmark(sizes=(10, 100, 1000), reruns: int = 20):
+    """Per-rerun render time: every message vs the cached window, one st.markdown per bubble"""
+    import streamlit as st
+
+    answer = ("Here is a step-by-step plan to grow your career. " * 60).strip()
+    print(f"{'messages':>8} {'per message':>12} {'windowed':>10}  (ms/rerun, window={RENDER_WINDOW})")
+    for size in sizes:
+        history = [("user", f"Question {i} about my career?") if i % 2 == 0 else ("assistant", answer)
+                   for i in range(size)]
+
+        start = time.perf_counter()
+        for _ in range(reruns):
+            for role, message in history:
+                st.markdown(bubble_html(role, message), unsafe_allow_html=True)
+        full = (time.perf_counter() - start) / reruns
+
+        cache = BubbleCache()
+        start = time.perf_counter()
+        for _ in range(reruns):
+            for html in cache.render(history, window_start(len(history), RENDER_WINDOW)):
+                st.markdown(html, unsafe_allow_html=True)
+        windowed = (time.perf_counter() - start) / reruns
+        print(f"{size:>8} {full * 1000:>12.2f} {windowed * 1000:>10.2f}")
+
+
+if __name__ == "__main__":
+    import sys
+
+    run_benchmark()
+    sys.exit(0 if check_layout() else 1)
@@ -0,0 +1,354 @@
+import bisect
+import datetime
+import os
+import re
+import sys
+import uuid
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+_WORD = re.compile(r"[a-z0-9]+")
+# Bytes of loaded chat histories a session may hold; older inactive chats are
+# unloaded past this and reloaded from storage when opened again
+MEMORY_BUDGET = int(os.getenv("ASHA_SESSION_MEMORY_KB", "1024")) * 1024
+# Tuple and list slot per message, on top of the message text
+MESSAGE_OVERHEAD = sys.getsizeof(("user", "")) + 8
+
+
+def make_title(history: List) -> str:
+    """First user message, shortened for the sidebar"""
+    for role, content in history:
+        if role == "user":
+            return content[:40] + "..." if len(content) > 40 else content
+    return "New Chat"
+
+
+def tokenize(text: str) -> Set[str]:
+    return set(_WORD.findall(text.lower()))
+
+
+class Chat:
+    """One conversation. ``history`` is None until it is loaded from storage.
+
+    ``terms`` are the words of its messages; they are saved with the chat
+    metadata so the sidebar search covers chats whose history is not loaded.
+    """
+
+    def __init__(self, chat_id: str, title: str = "New Chat", created: Optional[str] = None,
+                 last_updated: Optional[str] = None, history: Optional[List] = None,
+                 message_count: int = 0, terms: Optional[Iterable[str]] = None):
+        now = datetime.datetime.now().isoformat()
+        self.id = chat_id
+        self.title = title
+        self.created = created or now
+        self.last_updated = last_updated or self.created
+        self.history = history
+        self.message_count = len(history) if history is not None else message_count
+        self.terms = set(terms or ())
+        for _, content in history or ():
+            self.terms |= tokenize(content)
+        self.dirty = False
+        self._size = None
+        # Called as listener(chat, added_terms) after every edit; set by ChatStore
+        self.listener = None
+
+    @property
+    def loaded(self) -> bool:
+        return self.history is not None
+
+    @property
+    def size(self) -> int:
+        """Approximate bytes held by the loaded history (0 when unloaded)"""
+        if self._size is None:
+            self._size = sum(sys.getsizeof(content) + MESSAGE_OVERHEAD
+                             for _, content in self.history) if self.history else 0
+        return self._size
+
+    def unload(self):
+        """Drop the history; it must already be saved"""
+        self.history = None
+        self._size = None
+
+    def append(self, role: str, content: str):
+        self.history.append((role, content))
+        if role == "user" and self.title == "New Chat":
+            self.title = make_title(self.history)
+        self._touch(content)
+
+    def pop(self):
+        message = self.history.pop()
+        self._touch()
+        return message
+
+    def clear(self):
+        self.history.clear()
+        self.title = "New Chat"
+        self.terms.clear()
+        self._touch()
+
+    def _touch(self, added_text: Optional[str] = None):
+        self.message_count = len(self.history)
+        self.last_updated = datetime.datetime.now().isoformat()
+        self.dirty = True
+        self._size = None
+        added_terms = tokenize(added_text) if added_text else set()
+        self.terms |= added_terms
+        if self.listener:
+            self.listener(self, added_terms)
+
+    def metadata(self) -> Dict:
+        return {"chat_id": self.id, "title": self.title, "created": self.created,
+                "last_updated": self.last_updated, "message_count": self.message_count}
+
+    def to_dict(self) -> Dict:
+        """Storage shape used by StorageBackend.save_chat"""
+        return {"title": self.title, "created": self.created, "last_updated": self.last_updated,
+                "terms": sorted(self.terms), "history": [list(message) for message in self.history]}
+
+
+class ChatIndex:
+    """Sidebar view of a user's chats: metadata only, never histories.
+
+    Keeps the chats sorted by ``last_updated`` with bisect, so an edit
+    moves one entry instead of re-sorting, and an inverted index from
+    words to chat ids over titles and every message text it is given.
+    """
+
+    def __init__(self):
+        self.entries = {}
+        self._order = []
+        self._postings = {}
+        self._tokens = {}
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def update(self, meta: Dict):
+        """Insert or refresh one chat's metadata and title words"""
+        chat_id = meta["chat_id"]
+        old = self.entries.get(chat_id)
+        if old is not None:
+            position = bisect.bisect_left(self._order, (old["last_updated"], chat_id))
+            if position < len(self._order) and self._order[position] == (old["last_updated"], chat_id):
+                del self._order[position]
+        self.entries[chat_id] = dict(meta)
+        bisect.insort(self._order, (meta["last_updated"], chat_id))
+        if old is None or old["title"] != meta["title"]:
+            self.add_text(chat_id, meta["title"])
+
+    def add_text(self, chat_id: str, text: str):
+        self.add_terms(chat_id, tokenize(text))
+
+    def add_terms(self, chat_id: str, terms: Iterable[str]):
+        tokens = self._tokens.setdefault(chat_id, set())
+        for token in set(terms) - tokens:
+            tokens.add(token)
+            self._postings.setdefault(token, set()).add(chat_id)
+
+    def reset_text(self, chat_id: str):
+        """Forget the words of a chat, e.g. after it was cleared"""
+        for token in self._tokens.pop(chat_id, ()):
+            chat_ids = self._postings[token]
+            chat_ids.discard(chat_id)
+            if not chat_ids:
+                del self._postings[token]
+
+    def remove(self, chat_id: str):
+        meta = self.entries.pop(chat_id, None)
+        if meta is not None:
+            self._order.remove((meta["last_updated"], chat_id))
+            self.reset_text(chat_id)
+
+    def newest_first(self, offset: int = 0, limit: Optional[int] = None) -> List[Dict]:
+        end = len(self._order) - offset
+        start = 0 if limit is None else max(end - limit, 0)
+        return [self.entries[chat_id] for _, chat_id in reversed(self._order[start:max(end, 0)])]
+
+    def search(self, query: str) -> List[Dict]:
+        """Chats containing every word of the query, newest first"""
+        words = tokenize(query)
+        if not words:
+            return self.newest_first()
+        matches = None
+        for word in words:
+            chat_ids = self._postings.get(word, set())
+            matches = set(chat_ids) if matches is None else matches & chat_ids
+            if not matches:
+                return []
+        return sorted((self.entries[chat_id] for chat_id in matches),
+                      key=lambda meta: meta["last_updated"], reverse=True)
+
+
+class ChatStore:
+    """Id-keyed chats for one session; the active chat is referenced, never copied.
+
+    Switching chats only moves ``active_id``. Histories are fetched through
+    ``loader(chat_id)`` the first time a chat is opened, and only chats
+    marked dirty by an edit are handed back for saving. ``index`` follows
+    every edit and starts from the ``terms`` saved with each chat, so
+    message words are searchable without loading histories. Chats saved
+    before terms were stored become searchable once opened.
+
+    ``evict`` keeps the loaded histories within a byte budget by unloading
+    the least recently used inactive chats, which ``switch`` pages back in.
+    """
+
+    def __init__(self, loader: Optional[Callable[[str], Optional[Dict]]] = None):
+        self.loader = loader
+        self.chats = OrderedDict()
+        self.index = ChatIndex()
+        self.active_id = None
+        # Ids of chats loaded in this session, least recently used first
+        self._used = OrderedDict()
+        self.evictions = 0
+        self.page_ins = 0
+        self.load_errors = 0
+
+    @classmethod
+    def from_metadata(cls, chats: List[Dict], loader=None) -> "ChatStore":
+        """Build from StorageBackend.list_chats output (newest first)"""
+        store = cls(loader)
+        for meta in reversed(chats):
+            store._add(Chat(meta["chat_id"], meta.get("title", "New Chat"), meta.get("created"),
+                            meta.get("last_updated"), message_count=meta.get("message_count", 0),
+                            terms=meta.get("terms")))
+        return store
+
+    def _add(self, chat: Chat):
+        chat.listener = self._on_change
+        self.chats[chat.id] = chat
+        self.index.update(chat.metadata())
+        self.index.add_terms(chat.id, chat.terms)
+        if chat.loaded:
+            self._use(chat.id)
+
+    def _use(self, chat_id: str):
+        self._used[chat_id] = True
+        self._used.move_to_end(chat_id)
+
+    def _on_change(self, chat: Chat, added_terms: Set[str]):
+        self._use(chat.id)
+        self.index.update(chat.metadata())
+        if not chat.history:
+            self.index.reset_text(chat.id)
+            self.index.add_text(chat.id, chat.title)
+        self.index.add_terms(chat.id, added_terms)
+
+    def __contains__(self, chat_id: str) -> bool:
+        return chat_id in self.chats
+
+    def __len__(self) -> int:
+        return len(self.chats)
+
+    @property
+    def active(self) -> Optional[Chat]:
+        return self.chats.get(self.active_id)
+
+    def new_chat(self) -> Chat:
+        chat = Chat(str(uuid.uuid4()), history=[])
+        self._add(chat)
+        self.active_id = chat.id
+        return chat
+
+    def switch(self, chat_id: str) -> Optional[Chat]:
+        """Make ``chat_id`` active, loading its history first; None if that fails"""
+        chat = self.chats.get(chat_id)
+        if chat is None:
+            return None
+        if not chat.loaded:
+            try:
+                stored = self.loader(chat_id) if self.loader else None
+            except Exception as e:
+                stored = None
+                print(f"Chat load error ({chat_id}): {e}")
+            if stored is None and (chat.message_count or chat_id in self._used):
+                # Storage had messages for it; an empty history would overwrite them on the next save
+                self.load_errors += 1
+                return None
+            chat.history = [tuple(message) for message in stored["history"]] if stored else []
+            chat.message_count = len(chat.history)
+            if chat_id in self._used:
+                self.page_ins += 1
+            elif chat.history and not chat.terms:
+                # Saved before terms were stored; they go out with its next save
+                for _, content in chat.history:
+                    chat.terms |= tokenize(content)
+                self.index.add_terms(chat_id, chat.terms)
+        self._use(chat_id)
+        self.active_id = chat_id
+        return chat
+
+    def dirty_chats(self) -> List[Chat]:
+        return [chat for chat in self.chats.values() if chat.dirty]
+
+    def loaded_bytes(self) -> int:
+        return sum(self.chats[chat_id].size for chat_id in self._used if self.chats[chat_id].loaded)
+
+    def evict(self, save: Callable[[Chat], bool], budget: int = MEMORY_BUDGET,
+              keep: Iterable[str] = ()) -> int:
+        """Unload least recently used chats until the loaded ones fit ``budget`` bytes.
+
+        The active chat and the ids in ``keep`` stay loaded. A dirty chat is
+        unloaded only after ``save(chat)`` returns True. Without a loader
+        nothing could page a chat back in, so nothing is evicted.
+        """
+        if self.loader is None:
+            return 0
+        total = self.loaded_bytes()
+        keep = set(keep) | {self.active_id}
+        evicted = 0
+        for chat_id in list(self._used):
+            if total <= budget:
+                break
+            chat = self.chats[chat_id]
+            if chat_id in keep or not chat.loaded:
+                continue
+            if chat.dirty:
+                if not save(chat):
+                    continue
+                chat.dirty = False
+            total -= chat.size
+            chat.unload()
+            evicted += 1
+        self.evictions += evicted
+        return evicted
+
+    def memory_stats(self) -> Dict:
+        return {
+            "chats": len(self.chats),
+            "loaded_chats": sum(chat.loaded for chat in self.chats.values()),
+            "loaded_bytes": self.loaded_bytes(),
+            "evictions": self.evictions,
+            "page_ins": self.page_ins,
+            "load_errors": self.load_errors,
+        }
+
+
+def run_benchmark(chats: int = 300, messages: int = 200, switches: int = 1000):
+    """Switch cost of copying the active history into a dict vs moving active_id"""
+    import time
+
+    history = [("user", "question " * 20), ("assistant", "answer " * 200)] * (messages // 2)
+    all_chats = {str(i): {"title": make_title(history), "history": list(history)} for i in range(chats)}
+    active_history = all_chats["0"]["history"]
+    start = time.perf_counter()
+    for switch in range(switches):
+        chat_id = str(switch % chats)
+        all_chats[chat_id] = {"title": make_title(active_history), "history": active_history.copy(),
+                              "created": datetime.datetime.now().isoformat()}
+        active_history = all_chats[str((switch + 1) % chats)]["history"]
+    copying = (time.perf_counter() - start) / switches
+
+    store = ChatStore()
+    for i in range(chats):
+        store._add(Chat(str(i), make_title(history), history=list(history)))
+    start = time.perf_counter()
+    for switch in range(switches):
+        store.switch(str(switch % chats))
+    viewing = (time.perf_counter() - start) / switches
+    print(f"{chats} chats x {messages} messages: copy {copying * 1e6:.1f} us/switch, "
+          f"store {viewing * 1e6:.2f} us/switch, dirty after switching: {len(store.dirty_chats())}")
+
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,204 @@
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence
+
+# Tokens of conversation context sent with each prompt
+CONTEXT_TOKEN_BUDGET = int(os.getenv("ASHA_CONTEXT_TOKENS", "600"))
+# Turns kept word for word before older ones are summarized
+RECENT_TURNS = 2
+# Share of the budget the rolling summary may use
+SUMMARY_SHARE = 0.35
+# Chats whose summaries are kept in memory
+MAX_CACHED_CHATS = 512
+
+_SENTENCE = re.compile(r"[^.!?\n]+[.!?]*")
+_SPACE = re.compile(r"\s+")
+
+
+def count_tokens(text: str) -> int:
+    """Approximate Gemini tokens: about four characters each for English text"""
+    return (len(text) + 3) // 4
+
+
+def sentences(text: str) -> List[str]:
+    return [s.strip() for s in _SENTENCE.findall(text) if s.strip()]
+
+
+def fingerprint(text: str) -> str:
+    return _SPACE.sub(" ", text.lower()).strip()
+
+
+def turns_from_history(history: Sequence) -> List[Dict]:
+    """Pair (role, content) chat history into {"user", "asha"} turns"""
+    turns = []
+    for role, content in history:
+        if role == "user":
+            turns.append({"user": content, "asha": ""})
+        elif turns and not turns[-1]["asha"]:
+            turns[-1]["asha"] = content
+    return turns
+
+
+def trim_to_tokens(text: str, max_tokens: int) -> str:
+    """Whole sentences from the start of ``text`` that fit in ``max_tokens``"""
+    if count_tokens(text) <= max_tokens:
+        return text
+    kept, used = [], 0
+    for sentence in sentences(text):
+        cost = count_tokens(sentence) + 1
+        if used + cost > max_tokens:
+            break
+        kept.append(sentence)
+        used += cost
+    return " ".join(kept) if kept else text[:max_tokens * 4].rstrip() + "..."
+
+
+def summarize_turn(turn: Dict) -> str:
+    """One line per turn: the question and the first sentence of the answer"""
+    question = trim_to_tokens(turn["user"], 30)
+    answer = sentences(turn.get("asha", ""))
+    return f"- User asked: {question}" + (f" / Asha: {trim_to_tokens(answer[0], 30)}" if answer else "")
+
+
+class ContextResult:
+    def __init__(self, text: str, recent_turns: int, summarized_turns: int, duplicates: int):
+        self.text = text
+        self.tokens = count_tokens(text)
+        self.recent_turns = recent_turns
+        self.summarized_turns = summarized_turns
+        self.duplicates = duplicates
+
+
+class ContextBuilder:
+    """Fits conversation context into a token budget.
+
+    The newest ``recent_turns`` turns are kept word for word (long answers
+    are cut at a sentence boundary). Older turns are folded into a rolling
+    one-line-per-turn summary that is cached per chat, so each turn is
+    summarized once. Repeated questions and repeated sentences are sent
+    only once.
+    """
+
+    def __init__(self, budget: int = CONTEXT_TOKEN_BUDGET, recent_turns: int = RECENT_TURNS,
+                 summary_share: float = SUMMARY_SHARE, max_cached_chats: int = MAX_CACHED_CHATS):
+        self.budget = budget
+        self.recent_turns = recent_turns
+        self.summary_share = summary_share
+        self.max_cached_chats = max_cached_chats
+        self._summaries = OrderedDict()
+        self._lock = threading.Lock()
+        self.summaries_built = 0
+
+    def _summary_lines(self, chat_key: Optional[str], older: List[Dict]) -> List[str]:
+        """Summary lines for ``older``, reusing lines cached for ``chat_key``"""
+        if chat_key is None:
+            self.summaries_built += len(older)
+            return [summarize_turn(turn) for turn in older]
+        with self._lock:
+            cached = self._summaries.get(chat_key)
+            # Reuse only if the chat still starts with the turns summarized before
+            if cached and cached["count"] <= len(older) and (
+                    cached["count"] == 0 or fingerprint(older[cached["count"] - 1]["user"]) == cached["last"]):
+                lines = list(cached["lines"])
+            else:
+                lines = []
+            start = len(lines)
+        new_lines = [summarize_turn(turn) for turn in older[start:]]
+        lines += new_lines
+        with self._lock:
+            self.summaries_built += len(new_lines)
+            self._summaries[chat_key] = {"count": len(older), "lines": lines,
+                                         "last": fingerprint(older[-1]["user"]) if older else ""}
+            self._summaries.move_to_end(chat_key)
+            while len(self._summaries) > self.max_cached_chats:
+                self._summaries.popitem(last=False)
+        return lines
+
+    def build(self, turns: Sequence[Dict], chat_key: Optional[str] = None) -> ContextResult:
+        if not turns:
+            return ContextResult("No prior conversation.", 0, 0, 0)
+
+        # Keep the latest occurrence of a repeated question
+        seen_questions, unique, duplicates = set(), [], 0
+        for turn in reversed(turns):
+            key = fingerprint(turn["user"])
+            if key in seen_questions:
+                duplicates += 1
+                continue
+            seen_questions.add(key)
+            unique.append(turn)
+        unique.reverse()
+
+        recent = unique[-self.recent_turns:] if self.recent_turns else []
+        older = unique[:len(unique) - len(recent)]
+
+        # Recent turns, newest first, until the budget left for them runs out
+        summary_budget = int(self.budget * self.summary_share) if older else 0
+        remaining = self.budget - summary_budget
+        seen_sentences, recent_text = set(), []
+        for turn in reversed(recent):
+            answer = []
+            for sentence in sentences(turn.get("asha", "")):
+                key = fingerprint(sentence)
+                if key in seen_sentences:
+                    duplicates += 1
+                    continue
+                seen_sentences.add(key)
+                answer.append(sentence)
+            block = f"User: {turn['user']}\nAsha: {' '.join(answer)}"
+            if count_tokens(block) > remaining:
+                block = trim_to_tokens(block, remaining)
+            if not block or remaining <= 0:
+                break
+            recent_text.append(block)
+            remaining -= count_tokens(block) + 1
+        recent_text.reverse()
+        # Whatever the recent turns left over goes to the summary
+        summary_budget += max(remaining, 0)
+
+        summary_text = []
+        if older:
+            lines, used = [], count_tokens("Earlier in this chat:")
+            for line in reversed(self._summary_lines(chat_key, older)):
+                cost = count_tokens(line) + 1
+                if used + cost > summary_budget:
+                    break
+                lines.append(line)
+                used += cost
+            if lines:
+                summary_text = ["Earlier in this chat:"] + lines[::-1]
+
+        text = "\n".join(summary_text + recent_text)
+        return ContextResult(text, len(recent_text), len(summary_text[1:]), duplicates)
+
+    def forget(self, chat_key: str):
+        with self._lock:
+            self._summaries.pop(chat_key, None)
+
+
+context_builder = ContextBuilder()
+
+
+def run_benchmark(turn_counts=(3, 10, 50)):
+    """Context tokens: last three turns verbatim vs the budgeted builder"""
+    import time
+
+    answer = " ".join(f"Step {i}: practice a new skill every week and share it on LinkedIn." for i in range(40))
+    print(f"{'turns':>6} {'last 3 (tokens)':>16} {'builder (tokens)':>17} {'build ms':>9} {'cached ms':>10}")
+    for count in turn_counts:
+        turns = [{"user": f"What should I learn in month {i}?", "asha": answer} for i in range(count)]
+        naive = "\n".join(f"User: {t['user']}\nAsha: {t['asha']}" for t in turns[-3:])
+        builder = ContextBuilder()
+        start = time.perf_counter()
+        result = builder.build(turns, chat_key="bench")
+        first = time.perf_counter() - start
+        start = time.perf_counter()
+        builder.build(turns, chat_key="bench")
+        cached = time.perf_counter() - start
+        print(f"{count:>6} {count_tokens(naive):>16} {result.tokens:>17} {first * 1000:>9.2f} {cached * 1000:>10.2f}")
+
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -1,132 +1,169 @@
-import json
 import os
-import hashlib
+import queue
 import secrets
+import threading
 from datetime import datetime, timedelta
 import firebase_admin
 from firebase_admin import credentials, firestore
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
+from storage import FirestoreBackend, JsonFileBackend, SQLiteBackend, StorageBackend, conversation_key
 
 
 class Config:
     """Configuration class - you'll need to set this path"""
     FIREBASE_CREDENTIALS_PATH = "C:\\Users\\shrut\\OneDrive\\Desktop\\asha\\firebase\\firebase_cred.json"
+    # "firestore", "json" or "sqlite"; UserDataManager(use_firebase=...) decides when unset
+    STORAGE_BACKEND = os.getenv("ASHA_STORAGE_BACKEND")
+    LOCAL_STORAGE_PATH = "user_data"
+    SQLITE_PATH = os.getenv("ASHA_SQLITE_PATH", os.path.join("user_data", "asha.db"))
 
 
-class UserDataManager:
-    def __init__(self, use_firebase=True):
-        self.use_firebase = use_firebase
-        self.db = None
-        
-        if use_firebase:
-            self._init_firebase()
-        else:
-            self.local_storage_path = "user_data"
-            os.makedirs(self.local_storage_path, exist_ok=True)
-    
-    def _init_firebase(self):
-        """Initialize Firebase"""
+# Conversations kept per user after compaction
+MAX_CONVERSATIONS = 50
+# Appends per user between background compactions
+COMPACT_EVERY = 10
+
+
+class CompactionWorker:
+    """One background thread per process that compacts conversation logs.
+
+    Every UserDataManager schedules through the module's ``compaction_worker``.
+    The thread starts on the first compaction. The append counters and the
+    pending set are only touched under ``_lock``, so an append that races
+    the worker's reset is never lost.
+    """
+
+    def __init__(self, every: int = COMPACT_EVERY):
+        self.every = every
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        # (manager, email) -> appends since its last compaction
+        self._appends = {}
+        self._pending = set()
+        self._thread = None
+
+    def schedule(self, manager: "UserDataManager", email: str):
+        """Count one append; queue a compaction every ``every`` appends"""
+        key = (manager, email)
+        with self._lock:
+            count = self._appends.get(key, 0) + 1
+            self._appends[key] = count
+            if count < self.every or key in self._pending:
+                return
+            self._pending.add(key)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="conversation-compactor", daemon=True)
+                self._thread.start()
+        self._queue.put(key)
+
+    def _run(self):
+        while True:
+            manager, email = self._queue.get()
+            with self._lock:
+                self._pending.discard((manager, email))
+                self._appends.pop((manager, email), None)
+            try:
+                manager.compact_conversations(email)
+            except Exception as e:
+                print(f"Conversation compaction error: {e}")
+
+
+compaction_worker = CompactionWorker()
+
+
+def create_backend(kind: str, db=None) -> StorageBackend:
+    """Build a storage backend by name, falling back to local files if Firestore is unavailable"""
+    if kind == "sqlite":
+        return SQLiteBackend(Config.SQLITE_PATH)
+    if kind == "firestore":
         try:
-            if not firebase_admin._apps:
-                cred = credentials.Certificate(Config.FIREBASE_CREDENTIALS_PATH)
-                firebase_admin.initialize_app(cred)
-            self.db = firestore.client()
+            if db is None:
+                if not firebase_admin._apps:
+                    cred = credentials.Certificate(Config.FIREBASE_CREDENTIALS_PATH)
+                    firebase_admin.initialize_app(cred)
+                db = firestore.client()
+            return FirestoreBackend(db, fallback=JsonFileBackend(Config.LOCAL_STORAGE_PATH))
         except Exception as e:
             print(f"Firebase initialization failed: {e}")
-            self.use_firebase = False
-            # Initialize local storage as fallback
-            self.local_storage_path = "user_data"
-            os.makedirs(self.local_storage_path, exist_ok=True)
+    return JsonFileBackend(Config.LOCAL_STORAGE_PATH)
+
+
+class UserDataManager:
+    def __init__(self, use_firebase=True, db=None, backend=None):
+        if backend is None:
+            kind = Config.STORAGE_BACKEND or ("firestore" if use_firebase else "json")
+            backend = create_backend(kind, db)
+        elif isinstance(backend, str):
+            backend = create_backend(backend, db)
+        self.backend = backend
+        self.use_firebase = backend.name == "firestore"
     
     def save_user_data(self, email: str, user_data: Dict) -> bool:
-        """Save user data"""
+        """Save user data; Firestore writes are queued and committed in batches"""
         user_data['last_updated'] = datetime.now().isoformat()
-        
-        if self.use_firebase and self.db:
-            try:
-                doc_ref = self.db.collection('users').document(email)
-                doc_ref.set(user_data, merge=True)
-                return True
-            except Exception as e:
-                print(f"Firebase save error: {e}")
-                return self._save_locally(email, user_data)
-        else:
-            return self._save_locally(email, user_data)
+        return self.backend.save_user(email, user_data)
     
     def load_user_data(self, email: str) -> Optional[Dict]:
         """Load user data"""
-        if self.use_firebase and self.db:
-            try:
-                doc_ref = self.db.collection('users').document(email)
-                doc = doc_ref.get()
-                if doc.exists:
-                    return doc.to_dict()
-            except Exception as e:
-                print(f"Firebase load error: {e}")
-                return self._load_locally(email)
-        else:
-            return self._load_locally(email)
-        return None
+        return self.backend.load_user(email)
     
-    def _save_locally(self, email: str, user_data: Dict) -> bool:
-        """Local file storage fallback"""
-        try:
-            filename = hashlib.md5(email.encode()).hexdigest()
-            filepath = os.path.join(self.local_storage_path, f"{filename}.json")
-            with open(filepath, 'w') as f:
-                json.dump(user_data, f, indent=2)
-            return True
-        except Exception as e:
-            print(f"Local save error: {e}")
-            return False
+    def delete_user_data(self, email: str) -> bool:
+        """Delete the user document, conversations and chats"""
+        return self.backend.delete_user(email)
     
-    def _load_locally(self, email: str) -> Optional[Dict]:
-        """Local file storage fallback"""
-        try:
-            filename = hashlib.md5(email.encode()).hexdigest()
-            filepath = os.path.join(self.local_storage_path, f"{filename}.json")
-            if os.path.exists(filepath):
-                with open(filepath, 'r') as f:
-                    return json.load(f)
-        except Exception as e:
-            print(f"Local load error: {e}")
-        return None
+    def flush(self) -> int:
+        """Commit buffered writes now (tests, shutdown); returns records written"""
+        return self.backend.flush()
+    
+    def save_chat(self, email: str, chat_id: str, chat: Dict) -> bool:
+        """Save one chat; other chats of the user are not touched"""
+        return self.backend.save_chat(email, chat_id, chat)
+    
+    def load_chat(self, email: str, chat_id: str) -> Optional[Dict]:
+        """Load one chat including its history"""
+        return self.backend.load_chat(email, chat_id)
+    
+    def list_chats(self, email: str) -> List[Dict]:
+        """Chat titles and counts without histories, most recently updated first"""
+        return self.backend.list_chats(email)
+    
+    def delete_chat(self, email: str, chat_id: str) -> bool:
+        """Delete one chat and its history"""
+        return self.backend.delete_chat(email, chat_id)
     
     def save_conversation(self, email: str, conversation_data: Dict) -> bool:
-        """Save conversation history"""
-        user_data = self.load_user_data(email) or {}
-        
-        if 'conversations' not in user_data:
-            user_data['conversations'] = []
-        
-        # Add timestamp and save
+        """Append one conversation to the user's log; cost does not grow with history"""
         conversation_data['timestamp'] = datetime.now().isoformat()
         conversation_data['session_id'] = secrets.token_urlsafe(16)
         
-        user_data['conversations'].append(conversation_data)
-        
-        # Keep only last 50 conversations
-        user_data['conversations'] = user_data['conversations'][-50:]
-        
-        return self.save_user_data(email, user_data)
+        saved = self.backend.append_conversation(email, conversation_data)
+        if saved:
+            # Retention runs on the shared background worker every COMPACT_EVERY appends
+            compaction_worker.schedule(self, email)
+        return saved
+    
+    def compact_conversations(self, email: str, keep: int = MAX_CONVERSATIONS):
+        """Drop all but the newest ``keep`` conversations"""
+        self.backend.compact_conversations(email, keep)
     
     def get_conversation_history(self, email: str, days: int = 30) -> List[Dict]:
-        """Get recent conversation history"""
-        user_data = self.load_user_data(email)
-        if not user_data or 'conversations' not in user_data:
-            return []
-        
-        # Filter conversations from last N days
-        cutoff_date = datetime.now() - timedelta(days=days)
-        recent_conversations = []
-        
-        for conv in user_data['conversations']:
-            try:
-                conv_date = datetime.fromisoformat(conv.get('timestamp', ''))
-                if conv_date > cutoff_date:
-                    recent_conversations.append(conv)
-            except ValueError:
-                # Skip conversations with invalid timestamps
-                continue
-        
-        return recent_conversations
\ No newline at end of file
+        """Get recent conversation history, oldest first"""
+        cutoff = (datetime.now() - timedelta(days=days)).isoformat()
+        return self.backend.query_conversations(email, cutoff)
+    
+    def get_conversation_page(self, email: str, days: int = 30, cursor: Optional[Tuple[str, str]] = None,
+                              limit: int = 20) -> Dict:
+        """One page of recent conversations, newest first.
+
+        Pass the returned ``next_cursor`` back in to fetch the next (older)
+        page; it is None once the range is exhausted. The cursor is the
+        (timestamp, session_id) of the last row, so conversations saved in
+        the same instant are not skipped at a page boundary.
+
+        API only: app.py keeps its history in chats and does not write the
+        conversation log, so the sidebar pages chats (ChatIndex) instead.
+        """
+        cutoff = (datetime.now() - timedelta(days=days)).isoformat()
+        conversations = self.backend.query_conversations(email, cutoff, before=cursor, limit=limit)[::-1]
+        next_cursor = conversation_key(conversations[-1]) if len(conversations) == limit else None
+        return {"conversations": conversations, "next_cursor": next_cursor}
@@ -0,0 +1,215 @@
+"""In-memory stand-in for the parts of the Firestore client this app uses.
+
+Used by the storage benchmarks and conformance checks so they run without
+credentials or the emulator. ``latency`` adds a sleep to every round-trip
+(document get/set/delete, query stream, batch commit) to model network cost.
+"""
+import copy
+import threading
+import time
+from typing import Dict, Optional
+
+ASCENDING = "ASCENDING"
+DESCENDING = "DESCENDING"
+
+def _merge(document: Dict, data: Dict):
+    """set(merge=True): nested maps merge key by key, other values replace"""
+    for key, value in data.items():
+        if isinstance(value, dict) and isinstance(document.get(key), dict):
+            _merge(document[key], value)
+        else:
+            document[key] = copy.deepcopy(value)
+
+
+_OPERATORS = {
+    "==": lambda a, b: a == b,
+    "!=": lambda a, b: a != b,
+    "<": lambda a, b: a < b,
+    "<=": lambda a, b: a <= b,
+    ">": lambda a, b: a > b,
+    ">=": lambda a, b: a >= b,
+}
+
+
+class FakeSnapshot:
+    def __init__(self, reference, data: Optional[Dict]):
+        self.reference = reference
+        self.id = reference.id
+        self.exists = data is not None
+        self._data = data
+
+    def to_dict(self):
+        return copy.deepcopy(self._data) if self._data is not None else None
+
+
+class FakeDocument:
+    def __init__(self, client, path):
+        self._client = client
+        self.path = path
+        self.id = path[-1]
+
+    def collection(self, name):
+        return FakeCollection(self._client, self.path + (name,))
+
+    def set(self, data: Dict, merge: bool = False):
+        self._client._round_trip()
+        self._client._write(self.path, data, merge)
+
+    def get(self):
+        self._client._round_trip()
+        return FakeSnapshot(self, self._client._read(self.path))
+
+    def delete(self):
+        self._client._round_trip()
+        self._client._delete(self.path)
+
+
+class FakeQuery:
+    def __init__(self, client, path, filters=(), orders=(), limit_count=None,
+                 offset_count=0, cursor=None, fields=None):
+        self._client = client
+        self._path = path
+        self._filters = filters
+        self._orders = orders
+        self._limit = limit_count
+        self._offset = offset_count
+        self._cursor = cursor
+        self._fields = fields
+
+    def _copy(self, **changes):
+        state = dict(filters=self._filters, orders=self._orders, limit_count=self._limit,
+                     offset_count=self._offset, cursor=self._cursor, fields=self._fields)
+        state.update(changes)
+        return FakeQuery(self._client, self._path, **state)
+
+    def select(self, field_paths):
+        return self._copy(fields=tuple(field_paths))
+
+    def where(self, field, op, value):
+        return self._copy(filters=self._filters + ((field, op, value),))
+
+    def order_by(self, field, direction=ASCENDING):
+        return self._copy(orders=self._orders + ((field, direction),))
+
+    def limit(self, count):
+        return self._copy(limit_count=count)
+
+    def offset(self, count):
+        return self._copy(offset_count=count)
+
+    def start_after(self, values: Dict):
+        return self._copy(cursor=values)
+
+    def _after_cursor(self, data) -> bool:
+        """Whether ``data`` sorts strictly after the start_after values"""
+        for field, direction in self._orders:
+            if field not in self._cursor:
+                break
+            if data[field] != self._cursor[field]:
+                if direction == DESCENDING:
+                    return data[field] < self._cursor[field]
+                return data[field] > self._cursor[field]
+        return False
+
+    def stream(self):
+        self._client._round_trip()
+        documents = [
+            (document_id, data) for document_id, data in self._client._children(self._path)
+            if all(field in data and _OPERATORS[op](data[field], value)
+                   for field, op, value in self._filters)
+        ]
+        for field, direction in reversed(self._orders):
+            documents = [item for item in documents if field in item[1]]
+            documents.sort(key=lambda item: item[1][field], reverse=direction == DESCENDING)
+        if self._cursor and self._orders:
+            documents = [item for item in documents if self._after_cursor(item[1])]
+        documents = documents[self._offset:]
+        if self._limit is not None:
+            documents = documents[:self._limit]
+        for document_id, data in documents:
+            if self._fields is not None:
+                data = {field: data[field] for field in self._fields if field in data}
+            yield FakeSnapshot(FakeDocument(self._client, self._path + (document_id,)),
+                               copy.deepcopy(data))
+
+
+class FakeCollection(FakeQuery):
+    def __init__(self, client, path):
+        super().__init__(client, path)
+        self.id = path[-1]
+
+    def document(self, document_id):
+        return FakeDocument(self._client, self._path + (document_id,))
+
+
+class FakeBatch:
+    def __init__(self, client):
+        self._client = client
+        self._operations = []
+
+    def set(self, reference, data: Dict, merge: bool = False):
+        self._operations.append(("set", reference.path, copy.deepcopy(data), merge))
+
+    def delete(self, reference):
+        self._operations.append(("delete", reference.path, None, False))
+
+    def commit(self):
+        self._client._round_trip()
+        self._client.batch_commits += 1
+        for operation, path, data, merge in self._operations:
+            if operation == "set":
+                self._client._write(path, data, merge)
+            else:
+                self._client._delete(path)
+        self._operations = []
+
+
+class FakeFirestore:
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        # Set to simulate an outage: every round-trip raises ConnectionError
+        self.down = False
+        self.round_trips = 0
+        self.batch_commits = 0
+        # Documents set or deleted, whether directly or in a batch
+        self.writes = 0
+        self._documents = {}
+        self._lock = threading.Lock()
+
+    def _round_trip(self):
+        if self.down:
+            raise ConnectionError("Firestore unavailable")
+        with self._lock:
+            self.round_trips += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _write(self, path, data, merge):
+        with self._lock:
+            self.writes += 1
+            if merge and path in self._documents:
+                _merge(self._documents[path], data)
+            else:
+                self._documents[path] = copy.deepcopy(data)
+
+    def _read(self, path):
+        with self._lock:
+            data = self._documents.get(path)
+            return copy.deepcopy(data) if data is not None else None
+
+    def _delete(self, path):
+        with self._lock:
+            self.writes += 1
+            self._documents.pop(path, None)
+
+    def _children(self, collection_path):
+        depth = len(collection_path) + 1
+        with self._lock:
+            return [(path[-1], data) for path, data in self._documents.items()
+                    if len(path) == depth and path[:-1] == collection_path]
+
+    def collection(self, name):
+        return FakeCollection(self, (name,))
+
+    def batch(self):
+        return FakeBatch(self)
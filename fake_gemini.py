@@ -0,0 +1,68 @@
+"""In-memory stand-in for ``genai.GenerativeModel`` that injects faults.
+
+Used by the resilience scenarios so they run without an API key. Each call
+takes the next entry of ``faults`` (or, once that is empty, a random 429/503
+with probability ``fault_rate``):
+
+    "429", "503", "500", "403"   raise the matching google.api_core error
+    "hang"                       never answer (the pool timeout fires)
+    "midstream"                  send one chunk, then fail with 503
+"""
+import asyncio
+import random
+from typing import List, Optional
+
+from google.api_core import exceptions as api_exceptions
+
+ERRORS = {
+    "403": api_exceptions.PermissionDenied,
+    "429": api_exceptions.TooManyRequests,
+    "500": api_exceptions.InternalServerError,
+    "503": api_exceptions.ServiceUnavailable,
+}
+REPLY = "Practice common questions out loud, research the company, and prepare two stories about your impact."
+
+
+class FakeChunk:
+    def __init__(self, text: str):
+        self.text = text
+        # iter_response_text skips chunks without candidates
+        self.candidates = [text]
+
+
+class FakeGeminiModel:
+    def __init__(self, faults: Optional[List[str]] = None, fault_rate: float = 0.0,
+                 latency: float = 0.0, reply: str = REPLY):
+        self.faults = list(faults or [])
+        self.fault_rate = fault_rate
+        self.latency = latency
+        self.reply = reply
+        self.calls = 0
+
+    def _next_fault(self) -> Optional[str]:
+        if self.faults:
+            return self.faults.pop(0)
+        if self.fault_rate and random.random() < self.fault_rate:
+            return random.choice(["429", "503"])
+        return None
+
+    async def _chunks(self, fault: Optional[str]):
+        for i, word in enumerate(self.reply.split()):
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            if fault == "midstream" and i == 1:
+                raise api_exceptions.ServiceUnavailable("connection dropped mid-stream")
+            yield FakeChunk(word + " ")
+
+    async def generate_content_async(self, prompt, safety_settings=None, stream: bool = False):
+        self.calls += 1
+        fault = self._next_fault()
+        if fault == "hang":
+            await asyncio.sleep(3600)
+        if fault in ERRORS:
+            raise ERRORS[fault](f"injected {fault}")
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if stream:
+            return self._chunks(fault)
+        return FakeChunk(self.reply)
@@ -0,0 +1,224 @@
+import asyncio
+import os
+import queue
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from resilience import ResilientCaller
+
+MODEL_NAME = os.getenv("ASHA_GEMINI_MODEL", "gemini-1.5-flash")
+HEALTH_CHECK_MAX_AGE = 300
+MAX_CONCURRENCY = int(os.getenv("ASHA_GEMINI_CONCURRENCY", "8"))
+REQUEST_TIMEOUT = float(os.getenv("ASHA_GEMINI_TIMEOUT", "30"))
+
+_STREAM_END = object()
+
+_model = None
+_model_lock = threading.Lock()
+
+_health = {"ok": None, "checked_at": None, "error": None}
+_health_lock = threading.Lock()
+_health_thread = None
+
+
+def get_model():
+    """Configure the SDK and build the model on first use, then reuse it"""
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                api_key = os.getenv("API_KEY")
+                if not api_key:
+                    raise ValueError("❌ API Key not found. Please create a .env file with API_KEY=your_key")
+                # Deferred: the SDK import alone is most of a cold start
+                import google.generativeai as genai
+
+                genai.configure(api_key=api_key)
+                _model = genai.GenerativeModel(MODEL_NAME)
+    return _model
+
+
+def _run_health_check():
+    try:
+        get_model().generate_content("Hello")
+        result = {"ok": True, "checked_at": time.time(), "error": None}
+    except Exception as e:
+        result = {"ok": False, "checked_at": time.time(), "error": str(e)}
+    with _health_lock:
+        _health.update(result)
+
+
+def check_health(background: bool = True, max_age: float = HEALTH_CHECK_MAX_AGE) -> Dict:
+    """Return the cached Gemini connectivity status, refreshing it when stale.
+
+    Nothing calls this on import; it costs a real request and a quota unit.
+    With ``background=True`` the probe runs on a daemon thread and the
+    previous result (``ok`` is None before the first probe) is returned
+    immediately.
+    """
+    global _health_thread
+    with _health_lock:
+        checked_at = _health["checked_at"]
+        fresh = checked_at is not None and time.time() - checked_at < max_age
+        if fresh or (_health_thread is not None and _health_thread.is_alive()):
+            return dict(_health)
+        if background:
+            _health_thread = threading.Thread(target=_run_health_check, name="gemini-health", daemon=True)
+            _health_thread.start()
+            return dict(_health)
+    _run_health_check()
+    with _health_lock:
+        return dict(_health)
+
+
+class GeminiPool:
+    """Process-wide asyncio client for Gemini with a bounded request pool.
+
+    All Streamlit sessions in a process share one event loop running on a
+    daemon thread, so at most ``max_concurrency`` requests are in flight
+    against the quota at any time and the rest wait in the semaphore queue.
+    ``generate`` and ``stream`` are blocking facades over the async API for
+    callers on the Streamlit script thread; they go through ``resilience``
+    (rate limit, retry, circuit breaker) before taking a pool slot.
+    """
+
+    def __init__(self, model_provider: Callable, max_concurrency: int = MAX_CONCURRENCY,
+                 timeout: float = REQUEST_TIMEOUT, resilience: Optional[ResilientCaller] = None):
+        self._model_provider = model_provider
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.resilience = resilience or ResilientCaller()
+        self._loop = None
+        self._semaphore = None
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.in_flight = 0
+        self.completed = 0
+        self.timeouts = 0
+
+    def _ensure_loop(self):
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(target=loop.run_forever, name="gemini-pool", daemon=True)
+                thread.start()
+                self._semaphore = asyncio.run_coroutine_threadsafe(
+                    self._create_semaphore(), loop
+                ).result()
+                self._loop = loop
+        return self._loop
+
+    async def _create_semaphore(self):
+        return asyncio.Semaphore(self.max_concurrency)
+
+    async def _acquire(self):
+        self.queued += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.queued -= 1
+        self.in_flight += 1
+
+    def _release(self):
+        self.in_flight -= 1
+        self.completed += 1
+        self._semaphore.release()
+
+    async def generate_async(self, prompt, safety_settings: Optional[List[Dict]] = None,
+                             timeout: Optional[float] = None):
+        """Run one non-streaming request inside the pool"""
+        await self._acquire()
+        try:
+            model = self._model_provider()
+            return await asyncio.wait_for(
+                model.generate_content_async(prompt, safety_settings=safety_settings),
+                timeout or self.timeout
+            )
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise TimeoutError(f"Gemini request timed out after {timeout or self.timeout}s")
+        finally:
+            self._release()
+
+    async def stream_async(self, prompt, safety_settings: Optional[List[Dict]] = None,
+                           timeout: Optional[float] = None):
+        """Yield streamed response chunks; the pool slot is held until the stream ends"""
+        await self._acquire()
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + (timeout or self.timeout)
+        try:
+            model = self._model_provider()
+            response = await asyncio.wait_for(
+                model.generate_content_async(prompt, safety_settings=safety_settings, stream=True),
+                deadline - loop.time()
+            )
+            chunks = response.__aiter__()
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(chunks.__anext__(), deadline - loop.time())
+                except StopAsyncIteration:
+                    return
+                yield chunk
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise TimeoutError(f"Gemini request timed out after {timeout or self.timeout}s")
+        finally:
+            self._release()
+
+    def generate(self, prompt, safety_settings: Optional[List[Dict]] = None,
+                 timeout: Optional[float] = None):
+        """Blocking facade over ``generate_async``, retried when it fails transiently"""
+        return self.resilience.call(lambda: self._generate_once(prompt, safety_settings, timeout))
+
+    def _generate_once(self, prompt, safety_settings, timeout):
+        loop = self._ensure_loop()
+        future = asyncio.run_coroutine_threadsafe(
+            self.generate_async(prompt, safety_settings, timeout), loop
+        )
+        return future.result()
+
+    def stream(self, prompt, safety_settings: Optional[List[Dict]] = None,
+               timeout: Optional[float] = None):
+        """Blocking facade over ``stream_async``.
+
+        Closing the returned generator early cancels the request and frees
+        its pool slot. A failure before the first chunk is retried.
+        """
+        return self.resilience.stream(lambda: self._stream_once(prompt, safety_settings, timeout))
+
+    def _stream_once(self, prompt, safety_settings, timeout):
+        loop = self._ensure_loop()
+        chunks = queue.Queue()
+
+        async def pump():
+            try:
+                async for chunk in self.stream_async(prompt, safety_settings, timeout):
+                    chunks.put(chunk)
+            except Exception as e:
+                chunks.put(e)
+            finally:
+                chunks.put(_STREAM_END)
+
+        future = asyncio.run_coroutine_threadsafe(pump(), loop)
+        try:
+            while True:
+                item = chunks.get()
+                if item is _STREAM_END:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            future.cancel()
+
+    def stats(self) -> Dict:
+        """Queue depth and throughput counters for monitoring"""
+        return {
+            "max_concurrency": self.max_concurrency,
+            "queue_depth": self.queued,
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+            "timeouts": self.timeouts,
+            **self.resilience.stats(),
+        }
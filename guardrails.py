@@ -0,0 +1,170 @@
+"""Guardrail rules for incoming chat messages, evaluated in a single pass.
+
+Rules live in guardrails.json. Each rule has an id, an action and either a
+literal ``phrase`` or a ``regex``; all of them are compiled once into one
+alternation, each rule followed by an empty named group, so a message is
+lowercased and scanned once no matter how many rules there are and
+``match.lastgroup`` names the rule that matched. After a match the scan
+resumes one character past its start rather than past its end, so a rule
+overlapping another one's match still fires.
+
+    python guardrails.py     # corpus check + microbenchmark
+"""
+import json
+import os
+import re
+import sys
+from typing import Dict, List, Optional
+
+RULES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "guardrails.json")
+CORPUS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "guardrail_corpus.json")
+
+ALLOW = "allow"
+NONSENSE = "nonsense"
+GUARDRAIL = "guardrail"
+SENSITIVE = "sensitive"
+# When rules with different actions match, the first action here wins
+ACTION_PRIORITY = [NONSENSE, GUARDRAIL, SENSITIVE]
+
+_NO_WORDS = re.compile(r"[\W_]+")
+
+
+class Verdict:
+    def __init__(self, action: str = ALLOW, rule_ids: Optional[List[str]] = None):
+        self.action = action
+        self.rule_ids = rule_ids or []
+
+    @property
+    def allowed(self) -> bool:
+        return self.action == ALLOW
+
+    def __repr__(self):
+        return f"Verdict({self.action!r}, {self.rule_ids!r})"
+
+
+class GuardrailEngine:
+    def __init__(self, rules: List[Dict], version: int = 0):
+        self.version = version
+        self.actions = {}
+        alternatives = []
+        # marker group -> (rule id, index of its action in ACTION_PRIORITY)
+        self._group_rules = {}
+        for rule in rules:
+            if rule.get("action") not in ACTION_PRIORITY:
+                raise ValueError(f"Guardrail rule {rule.get('id')} has unknown action {rule.get('action')!r}")
+            self.actions[rule["id"]] = rule["action"]
+        # Where rules match at the same position, the alternative listed
+        # first wins, so higher-priority actions go first
+        ordered = sorted(rules, key=lambda rule: ACTION_PRIORITY.index(rule["action"]))
+        for index, rule in enumerate(ordered):
+            pattern = rule["regex"] if "regex" in rule else re.escape(rule["phrase"].lower())
+            self._group_rules[f"r{index}"] = (rule["id"], ACTION_PRIORITY.index(rule["action"]))
+            # An empty marker group rather than a group around the rule:
+            # wrapping every rule in a capture makes the scan ~15x slower
+            alternatives.append(f"(?:{pattern})(?P<r{index}>)")
+        self._pattern = re.compile("|".join(alternatives)) if alternatives else None
+
+    @classmethod
+    def from_file(cls, path: str = RULES_PATH) -> "GuardrailEngine":
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data["rules"], data.get("version", 0))
+
+    def check(self, text: str) -> Verdict:
+        """Classify one message; ``rule_ids`` lists the rules that fired"""
+        if not text or len(text.strip()) < 3:
+            return Verdict(NONSENSE, ["nonsense.too_short"])
+        if _NO_WORDS.fullmatch(text):
+            return Verdict(NONSENSE, ["nonsense.no_words"])
+        if self._pattern is None:
+            return Verdict()
+        text = text.lower()
+        search = self._pattern.search
+        match = search(text)
+        if match is None:
+            return Verdict()
+        rule_ids = []
+        rank = len(ACTION_PRIORITY)
+        # finditer only yields non-overlapping matches, which would hide
+        # e.g. "women are superior" inside "joke about women are superior"
+        while match is not None:
+            rule_id, rule_rank = self._group_rules[match.lastgroup]
+            if rule_id not in rule_ids:
+                rule_ids.append(rule_id)
+                rank = min(rank, rule_rank)
+            match = search(text, match.start() + 1)
+        return Verdict(ACTION_PRIORITY[rank], rule_ids)
+
+
+guardrails = GuardrailEngine.from_file()
+
+
+def check_corpus(engine: GuardrailEngine, path: str = CORPUS_PATH) -> bool:
+    with open(path, "r", encoding="utf-8") as f:
+        corpus = json.load(f)
+    ok = True
+    for query in corpus["allowed"]:
+        verdict = engine.check(query)
+        if not verdict.allowed:
+            ok = False
+            print(f"  FAIL allowed query blocked: {query!r} -> {verdict}")
+    for case in corpus["blocked"]:
+        verdict = engine.check(case["query"])
+        if verdict.action != case["action"] or case["rule"] not in verdict.rule_ids:
+            ok = False
+            print(f"  FAIL {case['query']!r}: expected {case['action']}/{case['rule']}, got {verdict}")
+    total = len(corpus["allowed"]) + len(corpus["blocked"])
+    print(f"corpus: {total} queries, {'all pass' if ok else 'failures above'}")
+    return ok
+
+
+def legacy_check(query: str, phrases: List[str], patterns: List[str]) -> bool:
+    """The per-rule loops this engine replaced, kept for the benchmark"""
+    if not query or len(query.strip()) < 3 or re.fullmatch(r"[\W_]+", query):
+        return True
+    query_lower = query.lower()
+    for phrase in phrases:
+        if phrase in query_lower:
+            return True
+    for pattern in patterns:
+        if re.search(pattern, query_lower):
+            return True
+    return False
+
+
+def run_benchmark(engine: GuardrailEngine, path: str = RULES_PATH, repeat: int = 2000):
+    """Engine vs the per-rule loops it replaced.
+
+    Allowed queries, the common case, are faster. Blocked queries are
+    slower: the loops return at the first phrase that hits, while the
+    engine scans the whole message to list every rule that fired.
+    """
+    import time
+
+    with open(path, "r", encoding="utf-8") as f:
+        rules = json.load(f)["rules"]
+    phrases = [rule["phrase"].lower() for rule in rules if "phrase" in rule]
+    patterns = [rule["regex"] for rule in rules if "regex" in rule]
+    with open(CORPUS_PATH, "r", encoding="utf-8") as f:
+        corpus = json.load(f)
+
+    def per_query(check, queries):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for query in queries:
+                check(query)
+        return (time.perf_counter() - start) / (repeat * len(queries)) * 1e6
+
+    print(f"{len(rules)} rules, us/query      per-rule loops   engine")
+    for name, queries in (("allowed", corpus["allowed"]),
+                          ("blocked", [case["query"] for case in corpus["blocked"]])):
+        legacy = per_query(lambda query: legacy_check(query, phrases, patterns), queries)
+        combined = per_query(engine.check, queries)
+        print(f"{name:<26} {legacy:>14.2f} {combined:>8.2f}")
+    print("(blocked: the loops stop at the first hit; the engine reports every rule that fired)")
+
+
+if __name__ == "__main__":
+    passed = check_corpus(guardrails)
+    run_benchmark(guardrails)
+    sys.exit(0 if passed else 1)
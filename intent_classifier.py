@@ -0,0 +1,269 @@
+"""Career intent classifier: hashed n-gram features + softmax regression.
+
+Trained in NumPy from intent_examples.json the first time it is used
+(tens of milliseconds); the weights are cached in ``INDEX_DIR`` next to the
+knowledge base index and reused while the examples are unchanged.
+
+    python intent_classifier.py     # held-out accuracy + latency
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import zipfile
+import zlib
+from collections import Counter, OrderedDict
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from retrieval import INDEX_DIR
+
+EXAMPLES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "intent_examples.json")
+FEATURE_DIM = 2 ** 14
+# Below this probability the query is treated as having no specific intent
+MIN_CONFIDENCE = float(os.getenv("ASHA_INTENT_CONFIDENCE", "0.5"))
+# Canned replies need a surer prediction, and the query must also name the
+# topic (TEMPLATE_KEYWORDS); anything less is answered by Gemini
+TEMPLATE_CONFIDENCE = float(os.getenv("ASHA_TEMPLATE_CONFIDENCE", "0.8"))
+TEMPLATE_KEYWORDS = {
+    "scholarship": re.compile(r"\b(scholarships?|fellowships?|bursar(y|ies)|stipends?|tuition|financial aid|"
+                              r"grants?|fully funded|fund(ing|ed)?\b.*\b(study|studies|education|masters|"
+                              r"mba|phd|degree|course))\b"),
+}
+NO_INTENT = "none"
+MODEL_VERSION = 1
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+@lru_cache(maxsize=65536)
+def _gram_id(gram: str) -> int:
+    # crc32 rather than hash(): ids must match the weights cached on disk
+    return zlib.crc32(gram.encode()) % FEATURE_DIM
+
+
+def features(text: str) -> List[int]:
+    """Hashed ids of word unigrams, bigrams and in-word character trigrams"""
+    words = _WORD.findall(text.lower())
+    grams = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    for word in words:
+        padded = f"<{word}>"
+        grams += [padded[i:i + 3] for i in range(len(padded) - 2)]
+    return [_gram_id(gram) for gram in grams]
+
+
+def vectorize(texts: Sequence[str]) -> np.ndarray:
+    matrix = np.zeros((len(texts), FEATURE_DIM), dtype=np.float32)
+    for row, text in enumerate(texts):
+        ids = features(text)
+        if ids:
+            np.add.at(matrix[row], ids, 1.0)
+            matrix[row] /= np.linalg.norm(matrix[row])
+    return matrix
+
+
+class IntentClassifier:
+    def __init__(self, examples_path: str = EXAMPLES_PATH, index_dir: str = INDEX_DIR,
+                 min_confidence: float = MIN_CONFIDENCE, cache_size: int = 1024):
+        self.examples_path = examples_path
+        self.index_dir = index_dir
+        self.min_confidence = min_confidence
+        self.cache_size = cache_size
+        self.labels = None
+        self.weights = None
+        self.bias = None
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _ensure_loaded(self):
+        if self.weights is not None:
+            return
+        with self._lock:
+            if self.weights is not None:
+                return
+            with open(self.examples_path, "r", encoding="utf-8") as f:
+                examples = json.load(f)["train"]
+            payload = json.dumps([MODEL_VERSION, FEATURE_DIM, examples], sort_keys=True)
+            digest = hashlib.sha256(payload.encode()).hexdigest()[:16]
+            path = os.path.join(self.index_dir, f"intent-{digest}.npz")
+            try:
+                with np.load(path) as data:
+                    labels, weights, bias = list(data["labels"]), data["weights"], data["bias"]
+            except (OSError, KeyError, ValueError, EOFError, zipfile.BadZipFile):
+                # Missing, or half-written by another process that is training too
+                labels, weights, bias = self._train(examples)
+                self._persist(path, labels, weights, bias)
+            self.labels, self.bias, self.weights = [str(label) for label in labels], bias, weights
+
+    @staticmethod
+    def _persist(path: str, labels: List[str], weights: np.ndarray, bias: np.ndarray):
+        """Write the model to a temp file and rename it, so readers never see it half-written"""
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp_path, "wb") as f:
+                np.savez(f, labels=np.array(labels), weights=weights, bias=bias)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Could not cache intent model: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    @staticmethod
+    def _train(examples: Dict[str, List[str]], epochs: int = 300, learning_rate: float = 2.0,
+               l2: float = 1e-4):
+        """Full-batch gradient descent on softmax cross-entropy"""
+        labels = sorted(examples)
+        texts = [text for label in labels for text in examples[label]]
+        targets = np.array([labels.index(label) for label in labels for _ in examples[label]])
+        # Train only on the hashed columns the examples use; the rest stay zero
+        full = vectorize(texts)
+        used = np.flatnonzero(full.any(axis=0))
+        x = full[:, used]
+        y = np.eye(len(labels), dtype=np.float32)[targets]
+        weights = np.zeros((len(used), len(labels)), dtype=np.float32)
+        bias = np.zeros(len(labels), dtype=np.float32)
+        for _ in range(epochs):
+            logits = x @ weights + bias
+            logits -= logits.max(axis=1, keepdims=True)
+            probs = np.exp(logits)
+            probs /= probs.sum(axis=1, keepdims=True)
+            grad = (probs - y) / len(texts)
+            weights -= learning_rate * (x.T @ grad + l2 * weights)
+            bias -= learning_rate * grad.sum(axis=0)
+        full_weights = np.zeros((FEATURE_DIM, len(labels)), dtype=np.float32)
+        full_weights[used] = weights
+        return labels, full_weights, bias
+
+    def _probabilities(self, texts: Sequence[str]) -> np.ndarray:
+        self._ensure_loaded()
+        # Sparse product: gather the weight rows of every text's features at once
+        ids, values, starts = [], [], []
+        for text in texts:
+            starts.append(len(ids))
+            counts = Counter(features(text)) or Counter({0: 0})
+            norm = sum(count * count for count in counts.values()) ** 0.5 or 1.0
+            ids.extend(counts)
+            values.extend(count / norm for count in counts.values())
+        contributions = self.weights[ids] * np.asarray(values, dtype=np.float32)[:, None]
+        logits = np.add.reduceat(contributions, starts, axis=0) + self.bias
+        logits -= logits.max(axis=1, keepdims=True)
+        probs = np.exp(logits)
+        return probs / probs.sum(axis=1, keepdims=True)
+
+    def _decide(self, probs: np.ndarray) -> Tuple[Optional[str], float]:
+        best = int(np.argmax(probs))
+        label, confidence = self.labels[best], float(probs[best])
+        if label == NO_INTENT or confidence < self.min_confidence:
+            return None, confidence
+        return label, confidence
+
+    def classify_batch(self, texts: Sequence[str]) -> List[Tuple[Optional[str], float]]:
+        """(intent or None, probability) per text in one matrix product; for scoring logs"""
+        if not texts:
+            return []
+        return [self._decide(row) for row in self._probabilities(texts)]
+
+    def classify(self, text: str) -> Tuple[Optional[str], float]:
+        key = " ".join(_WORD.findall(text.lower()))
+        with self._lock:
+            if key in self._cache:
+                self.hits += 1
+                self._cache.move_to_end(key)
+                return self._cache[key]
+            self.misses += 1
+        result = self.classify_batch([text])[0]
+        with self._lock:
+            self._cache[key] = result
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return result
+
+    def predict(self, query: str, context: Optional[Sequence[Dict]] = None) -> Optional[str]:
+        """Intent of ``query``; an unclear follow-up inherits the previous question's intent"""
+        intent, _ = self.classify(query)
+        if intent is None and context and len(_WORD.findall(query.lower())) <= 6:
+            if self.classify(context[-1]["user"])[0] is not None:
+                return self.classify(f"{context[-1]['user']} {query}")[0]
+        return intent
+
+    def template_intent(self, query: str) -> Optional[str]:
+        """Intent of ``query`` when it is certain enough to serve a canned reply, else None"""
+        intent, confidence = self.classify(query)
+        keywords = TEMPLATE_KEYWORDS.get(intent)
+        if keywords is None or confidence < TEMPLATE_CONFIDENCE or not keywords.search(query.lower()):
+            return None
+        return intent
+
+
+intent_classifier = IntentClassifier()
+
+
+def legacy_intent(query: str) -> Optional[str]:
+    """The keyword cascade this classifier replaced, kept for comparison"""
+    query_lower = query.lower()
+    if any(word in query_lower for word in ["resume", "cv", "curriculum vitae", "build resume"]):
+        return "resume_building"
+    if any(word in query_lower for word in ["learn", "roadmap", "path", "how to start", "career change"]):
+        return "roadmap"
+    if any(word in query_lower for word in ["job", "opportunity", "hiring", "career", "work", "employment"]):
+        return "job_search"
+    if any(word in query_lower for word in ["scholarship", "funding", "grant", "financial aid"]):
+        return "scholarship"
+    return None
+
+
+def run_benchmark(repeat: int = 200) -> bool:
+    with open(EXAMPLES_PATH, "r", encoding="utf-8") as f:
+        examples = json.load(f)
+    test = examples["test"]
+    texts = [text for label in test for text in test[label]]
+    expected = [None if label == NO_INTENT else label for label in test for _ in test[label]]
+
+    start = time.perf_counter()
+    classifier = IntentClassifier()
+    classifier._ensure_loaded()
+    print(f"model ready in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+    predicted = [intent for intent, _ in classifier.classify_batch(texts)]
+    legacy = [legacy_intent(text) for text in texts]
+    for text, want, got, old in zip(texts, expected, predicted, legacy):
+        if got != want or old != want:
+            print(f"  {text[:45]!r:<48} expected {want}, model {got}, keywords {old}")
+    accuracy = sum(a == b for a, b in zip(predicted, expected)) / len(texts)
+    legacy_accuracy = sum(a == b for a, b in zip(legacy, expected)) / len(texts)
+    print(f"held-out accuracy: model {accuracy:.0%}, keyword cascade {legacy_accuracy:.0%} ({len(texts)} queries)")
+
+    # Queries that must never get a canned reply, and ones that should
+    ok = True
+    for intent, queries in examples["template_negatives"].items():
+        for query in queries:
+            if classifier.template_intent(query) == intent:
+                ok = False
+                print(f"  {query[:45]!r:<48} would get the {intent} template")
+        served = sum(classifier.template_intent(query) == intent for query in test[intent])
+        print(f"{intent} template: {served}/{len(test[intent])} held-out {intent} queries, "
+              f"{len(queries)} negatives {'all passed to Gemini' if ok else 'LEAKED (above)'}")
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        classifier.classify_batch(texts)
+    batch = (time.perf_counter() - start) / (repeat * len(texts))
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for text in texts:
+            classifier.classify(text)
+    cached = (time.perf_counter() - start) / (repeat * len(texts))
+    print(f"classify_batch: {batch * 1e6:.0f} us/query, classify (LRU hit): {cached * 1e6:.1f} us/query")
+    return ok
+
+
+if __name__ == "__main__":
+    import sys
+
+    sys.exit(0 if run_benchmark() else 1)
@@ -0,0 +1,227 @@
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Optional
+
+MAX_WORKERS = int(os.getenv("ASHA_LLM_WORKERS", "8"))
+JOB_TIMEOUT = float(os.getenv("ASHA_LLM_JOB_TIMEOUT", "60"))
+# Finished jobs are kept this long for the session that submitted them to collect
+JOB_RETENTION = 300
+# How often the watchdog looks for running jobs past their deadline
+WATCHDOG_INTERVAL = 0.1
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+TIMED_OUT = "timed_out"
+FINISHED = (DONE, FAILED, CANCELLED, TIMED_OUT)
+
+
+class LLMJob:
+    """State of one background LLM call; ``text`` grows as chunks arrive"""
+
+    def __init__(self, job_id: str, timeout: float, owner: Optional[str] = None):
+        self.id = job_id
+        self.owner = owner
+        self.timeout = timeout
+        self.status = QUEUED
+        self.text = ""
+        self.error = None
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self._done = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def is_finished(self) -> bool:
+        return self.status in FINISHED
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Block until the job finishes; False if ``timeout`` ran out first"""
+        return self._done.wait(timeout)
+
+
+class LLMJobRunner:
+    """Runs streaming LLM calls on a shared thread pool, tracked by job id.
+
+    The Streamlit script submits a job and returns; later runs read
+    ``get(job_id).text`` to show progress. ``cancel`` finishes a job at
+    once and a watchdog thread times jobs out at their deadline, whether
+    or not a chunk has arrived; the worker drops whatever the stream
+    yields afterwards and closes it, abandoning the underlying request.
+    """
+
+    def __init__(self, max_workers: int = MAX_WORKERS, timeout: float = JOB_TIMEOUT,
+                 retention: float = JOB_RETENTION):
+        self.timeout = timeout
+        self.retention = retention
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm-worker")
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        threading.Thread(target=self._watchdog, name="llm-watchdog", daemon=True).start()
+
+    def submit(self, stream_factory: Callable[[], Iterable[str]], timeout: Optional[float] = None,
+               owner: Optional[str] = None) -> str:
+        """Queue ``stream_factory()`` and return the job id"""
+        job = LLMJob(uuid.uuid4().hex, timeout or self.timeout, owner)
+        with self._lock:
+            self._prune()
+            self._jobs[job.id] = job
+        self._executor.submit(self._run, job, stream_factory)
+        return job.id
+
+    def get(self, job_id: str) -> Optional[LLMJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> bool:
+        job = self.get(job_id)
+        if job is None:
+            return False
+        return self._finish(job, CANCELLED)
+
+    def forget(self, job_id: str):
+        """Drop a finished job once its result has been collected"""
+        with self._lock:
+            self._jobs.pop(job_id, None)
+
+    def _run(self, job: LLMJob, stream_factory):
+        with job._lock:
+            if job.is_finished:
+                # Cancelled while queued
+                return
+            job.status = RUNNING
+            job.started = time.time()
+        stream = None
+        try:
+            stream = iter(stream_factory())
+            for chunk in stream:
+                with job._lock:
+                    if job.is_finished:
+                        # Cancelled or timed out while waiting for this chunk
+                        return
+                    job.text += chunk
+            self._finish(job, DONE)
+        except Exception as e:
+            self._finish(job, FAILED, str(e))
+        finally:
+            close = getattr(stream, "close", None)
+            if close:
+                close()
+
+    def _finish(self, job: LLMJob, status: str, error: Optional[str] = None) -> bool:
+        """Set the final status once; False if the job had already finished"""
+        with job._lock:
+            if job.is_finished:
+                return False
+            job.status = status
+            job.error = error
+            job.finished = time.time()
+        job._done.set()
+        return True
+
+    def _watchdog(self):
+        while not self._closed.wait(WATCHDOG_INTERVAL):
+            now = time.time()
+            with self._lock:
+                running = [job for job in self._jobs.values() if job.status == RUNNING]
+            for job in running:
+                if now > job.started + job.timeout:
+                    self._finish(job, TIMED_OUT)
+
+    def _prune(self):
+        cutoff = time.time() - self.retention
+        for job_id in [job_id for job_id, job in self._jobs.items()
+                       if job.finished is not None and job.finished < cutoff]:
+            del self._jobs[job_id]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            jobs = list(self._jobs.values())
+        counts = {status: 0 for status in (QUEUED, RUNNING) + FINISHED}
+        for job in jobs:
+            counts[job.status] += 1
+        return counts
+
+    def shutdown(self):
+        with self._lock:
+            jobs = list(self._jobs.values())
+        for job in jobs:
+            self._finish(job, CANCELLED)
+        self._closed.set()
+        self._executor.shutdown(wait=False)
+
+
+def run_benchmark(llm_seconds: float = 2.0, poll_interval: float = 0.25, clicks: int = 8):
+    """Delay before a click is handled while an answer is being generated.
+
+    Models one session: the inline path handles the click only after the
+    blocking call returns, while with the runner the script is polling and
+    Streamlit interrupts it at the next poll.
+    """
+    import random
+    import statistics
+
+    def slow_stream():
+        for _ in range(20):
+            time.sleep(llm_seconds / 20)
+            yield "word "
+
+    def click_latency(busy):
+        clicked = threading.Event()
+        handled = []
+        click_at = random.uniform(0.1, llm_seconds * 0.9)
+        threading.Timer(click_at, lambda: (handled.append(time.perf_counter()), clicked.set())).start()
+        busy(clicked)
+        clicked.wait()
+        return time.perf_counter() - handled[0]
+
+    def inline(clicked):
+        "".join(slow_stream())
+
+    runner = LLMJobRunner()
+
+    def with_runner(clicked):
+        job = runner.get(runner.submit(slow_stream))
+        while not job.is_finished and not clicked.is_set():
+            time.sleep(poll_interval)
+
+    for name, busy in (("inline", inline), ("job runner", with_runner)):
+        latencies = [click_latency(busy) for _ in range(clicks)]
+        print(f"{name:<12} click handled after: median {statistics.median(latencies) * 1000:>7.0f} ms, "
+              f"max {max(latencies) * 1000:>7.0f} ms")
+
+    job_id = runner.submit(slow_stream)
+    time.sleep(0.2)
+    runner.cancel(job_id)
+    runner.get(job_id).wait(1)
+    print(f"cancelled job status: {runner.get(job_id).status}")
+    job_id = runner.submit(slow_stream, timeout=0.3)
+    runner.get(job_id).wait(llm_seconds + 1)
+    print(f"job with 0.3 s timeout: {runner.get(job_id).status}")
+
+    def slow_first_chunk():
+        # Gemini still queued or retrying: nothing arrives for 3 s
+        time.sleep(3)
+        yield "late "
+
+    job_id = runner.submit(slow_first_chunk)
+    time.sleep(0.1)
+    runner.cancel(job_id)
+    job = runner.get(job_id)
+    print(f"cancel before the first chunk: {job.status} {(job.finished - job.started) * 1000:.0f} ms after start")
+    job = runner.get(runner.submit(slow_first_chunk, timeout=0.5))
+    job.wait(4)
+    print(f"0.5 s timeout before the first chunk: {job.status} {(job.finished - job.started) * 1000:.0f} ms "
+          f"after start, text {job.text!r}")
+    runner.shutdown()
+
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,212 @@
+"""Load test: concurrent simulated users driving app.py through AppTest.
+
+Each user logs in (the OAuth flow is bypassed through session state), then
+asks questions taken from the saved user_data_*.json histories, clicks quick
+actions, starts new chats and switches between them. Gemini is replaced by
+fake_gemini with a configurable reply time and storage goes to a temporary
+SQLite database, so the whole pipeline runs without credentials:
+
+    python load_test.py --users 8 --actions 12 --llm-latency 1.0
+
+Reports p50/p95/p99 per user action and per pipeline stage (see metrics.py),
+throughput, and memory held per session.
+"""
+import argparse
+import random
+import resource
+import sys
+import threading
+import time
+from unittest.mock import MagicMock
+
+from rerun_harness import APP, SEND_BUTTON, patch_streamlit, run, setup
+
+from streamlit.runtime import Runtime
+from streamlit.runtime.caching.storage.dummy_cache_storage import MemoryCacheStorageManager
+from streamlit.runtime.media_file_manager import MediaFileManager
+from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+from streamlit.testing.v1 import AppTest
+
+import user_data_manager
+from fake_gemini import FakeGeminiModel, REPLY
+from gemini_client import GeminiPool
+from metrics import metrics
+from resilience import ResilientCaller, TokenBucket
+from retrieval import _history_queries
+from session_memory import deep_size, sessions
+
+FALLBACK_QUERIES = [
+    "How do I restart my career after a break?",
+    "Help me prepare for salary negotiation and know my worth in the market",
+    "Can you give me a roadmap to learn python?",
+    "What are good remote jobs for women in tech?",
+]
+# Relative frequency of each user action
+ACTION_WEIGHTS = {"ask": 0.55, "quick_action": 0.2, "switch_chat": 0.15, "new_chat": 0.1}
+PERCENTILES = (50, 95, 99)
+
+
+def share_mock_runtime():
+    """Let AppTest sessions run side by side.
+
+    AppTest in streamlit 1.28 installs a mock Runtime for each run and sets
+    it back to None when the run ends, which breaks any other session whose
+    script is still running. Fall back to one shared mock instead.
+    """
+    shared = MagicMock(spec=Runtime)
+    shared.media_file_mgr = MediaFileManager(MemoryMediaFileStorage("/mock/media"))
+    shared.cache_storage_manager = MemoryCacheStorageManager()
+    Runtime.instance = classmethod(lambda cls: cls._instance or shared)
+    Runtime.exists = classmethod(lambda cls: True)
+
+
+def percentile_row(samples):
+    ordered = sorted(samples)
+    return [ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))] for p in PERCENTILES]
+
+
+class SimulatedUser:
+    def __init__(self, index: int, queries, actions: int, think: float, seed: int, timeout: float):
+        self.index = index
+        self.queries = queries
+        self.actions = actions
+        self.think = think
+        self.timeout = timeout
+        self.rng = random.Random(seed * 1000 + index)
+        self.timings = {}
+        self.extra_runs = 0
+        self.errors = []
+        self.at = None
+
+    def _timed(self, name, action):
+        start = time.perf_counter()
+        action()
+        self.timings.setdefault(name, []).append(time.perf_counter() - start)
+        if self.at.exception:
+            raise RuntimeError(f"{name}: {self.at.exception[0].value}")
+
+    def run(self, node):
+        self.extra_runs += run(self.at, node)
+
+    def _buttons(self, prefix):
+        return [button for button in self.at.button if button.key and button.key.startswith(prefix)]
+
+    def ask(self):
+        question = self.rng.choice(self.queries)
+        self.at.text_area(key="chat_input").input(question)
+        self.run(self.at.button(key=SEND_BUTTON).click())
+
+    def quick_action(self):
+        self.run(self.rng.choice(self._buttons("quick_")).click())
+
+    def new_chat(self):
+        before = len(self.at.session_state["chat_store"])
+        self.run(self.at.button(key="new_chat_btn").click())
+        created = len(self.at.session_state["chat_store"]) - before
+        if created != 1:
+            raise RuntimeError(f"one New Chat click created {created} chats")
+
+    def switch_chat(self):
+        active = self.at.session_state["chat_store"].active_id
+        others = [b for b in self._buttons("load_chat_") if b.key != f"load_chat_{active}"]
+        if not others:
+            return self.ask()
+        self.run(self.rng.choice(others).click())
+
+    def __call__(self):
+        try:
+            self.at = AppTest.from_file(APP, default_timeout=self.timeout)
+            self.at.session_state["logged_in"] = True
+            self.at.session_state["page"] = "chat"
+            self.at.session_state["email"] = f"loadtest-{self.index}@example.com"
+            self._timed("open", self.at.run)
+            names, weights = zip(*ACTION_WEIGHTS.items())
+            for _ in range(self.actions):
+                time.sleep(self.rng.uniform(0, self.think))
+                name = self.rng.choices(names, weights)[0]
+                self._timed(name, getattr(self, name))
+        except Exception as e:
+            self.errors.append(f"user {self.index}: {type(e).__name__}: {e}")
+
+    def state_bytes(self) -> int:
+        return deep_size(self.at.session_state.filtered_state) if self.at is not None else 0
+
+
+def main() -> bool:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--users", type=int, default=8, help="concurrent sessions")
+    parser.add_argument("--actions", type=int, default=12, help="actions per session after opening the app")
+    parser.add_argument("--llm-latency", type=float, default=1.0, help="seconds per fake Gemini reply")
+    parser.add_argument("--think", type=float, default=0.5, help="max seconds a user waits between actions")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--timeout", type=float, default=120, help="seconds a single script run may take")
+    args = parser.parse_args()
+
+    share_mock_runtime()
+    patch_streamlit()
+    queries = [q.strip() for q in _history_queries() if q.strip()] or FALLBACK_QUERIES
+    model = FakeGeminiModel(latency=args.llm_latency / (len(REPLY.split()) + 1))
+    # The fake has no quota; keep the retry and breaker layers but not the rate limit
+    unlimited = ResilientCaller(limiter=TokenBucket(rate=1e6, capacity=10 ** 6))
+    user_data_manager.gemini_pool = GeminiPool(lambda: model, resilience=unlimited)
+    metrics.reset()
+
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    users = [SimulatedUser(i, queries, args.actions, args.think, args.seed, args.timeout)
+             for i in range(args.users)]
+    threads = [threading.Thread(target=user, name=f"user-{user.index}") for user in users]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    print(f"\n{args.users} users x {args.actions} actions, fake Gemini {args.llm_latency:.2f} s/reply, "
+          f"{len(queries)} distinct questions")
+    print(f"{'user action':<18} {'count':>6} " + " ".join(f"{f'p{p} (ms)':>10}" for p in PERCENTILES))
+    timings = {}
+    for user in users:
+        for name, samples in user.timings.items():
+            timings.setdefault(name, []).extend(samples)
+    for name, samples in sorted(timings.items()):
+        print(f"{name:<18} {len(samples):>6} " + " ".join(f"{v * 1000:>10.1f}" for v in percentile_row(samples)))
+
+    print(f"\n{'pipeline stage':<18} {'count':>6} " + " ".join(f"{f'p{p} (ms)':>10}" for p in PERCENTILES))
+    for stage in metrics.stages():
+        values = metrics.percentiles(stage, PERCENTILES)
+        print(f"{stage:<18} {metrics.observations(stage):>6} " + " ".join(f"{values[p] * 1000:>10.2f}" for p in PERCENTILES))
+
+    actions = sum(len(samples) for samples in timings.values())
+    answered = sum(len(timings.get(name, [])) for name in ("ask", "quick_action"))
+    sources = {source: int(metrics.counter("asha_messages_total", source=source))
+               for source in ("local", "intent", "cache", "llm", "offline", "error", "empty")}
+    print(f"\nthroughput: {actions / elapsed:.1f} actions/s, {answered / elapsed:.1f} messages/s "
+          f"over {elapsed:.1f} s")
+    print("answered from: " + ", ".join(f"{source} {count}" for source, count in sources.items() if count))
+    state_sizes = [user.state_bytes() for user in users]
+    print(f"session state: {sum(state_sizes) / len(state_sizes) / 1024:.1f} KiB/session on average, "
+          f"{max(state_sizes) / 1024:.1f} KiB largest")
+    totals = sessions.totals()
+    print(f"chat histories: {totals['loaded_chat_bytes'] / 1024:.1f} KiB loaded across {totals['count']} sessions, "
+          f"{totals['evictions']} evicted, {totals['page_ins']} paged back in")
+    print(f"process peak RSS grew {(rss_after - rss_before) / 1024:.1f} MiB "
+          f"({(rss_after - rss_before) / len(users):.0f} KiB/session, includes AppTest's own state)")
+    extra_runs = sum(user.extra_runs for user in users)
+    print(f"follow-up runs after st.rerun(): {extra_runs}")
+    errors = [error for user in users for error in user.errors]
+    for error in errors:
+        print(f"  ERROR {error}")
+    return not errors
+
+
+if __name__ == "__main__":
+    import shutil
+
+    directory = setup()
+    try:
+        passed = main()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    sys.exit(0 if passed else 1)
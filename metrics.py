@@ -0,0 +1,371 @@
+"""Timing spans and counters for the message pipeline, in Prometheus format.
+
+    with metrics.span("prompt_build"):
+        ...
+    metrics.incr("asha_llm_calls_total")
+
+Spans go into the ``asha_stage_seconds`` histogram, labelled by stage.
+Other per-request values go into histograms registered with
+``add_histogram`` and filled with ``record``.
+Nothing is sent anywhere unless an exporter is configured:
+
+    ASHA_METRICS_PORT=9108       serve /metrics (and any add_page views) over
+                                 HTTP on that port, on localhost only unless
+                                 ASHA_METRICS_HOST names another interface
+                                 (0.0.0.0 for all; /sessions lists users)
+    ASHA_METRICS_FILE=path.prom  rewrite the file every ASHA_METRICS_INTERVAL
+                                 seconds (node_exporter textfile collector)
+
+    python metrics.py     # overhead of a span, a counter and a whole message
+"""
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from typing import Callable, Dict, List
+
+METRICS_ENABLED = os.getenv("ASHA_METRICS", "1") != "0"
+METRICS_PORT = int(os.getenv("ASHA_METRICS_PORT", "0"))
+METRICS_HOST = os.getenv("ASHA_METRICS_HOST", "127.0.0.1")
+METRICS_FILE = os.getenv("ASHA_METRICS_FILE", "")
+METRICS_INTERVAL = float(os.getenv("ASHA_METRICS_INTERVAL", "15"))
+# Recent durations kept per stage for percentiles (see load_test.py)
+RECENT_SAMPLES = 4096
+BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+DESCRIPTIONS = {
+    "asha_stage_seconds": "Time spent in each stage of the message pipeline",
+    "asha_stage_errors_total": "Stages that ended with an exception",
+    "asha_messages_total": "User messages answered, by where the answer came from",
+    "asha_cache_hits_total": "Replies served from the response cache",
+    "asha_kb_hits_total": "Replies served from the knowledge base",
+    "asha_guardrail_blocks_total": "Messages stopped by a guardrail rule, by action",
+    "asha_llm_calls_total": "Gemini requests started",
+    "asha_prompt_tokens_total": "Estimated prompt tokens sent to Gemini",
+    "asha_prompt_tokens": "Estimated tokens of each prompt sent to Gemini",
+    "asha_response_tokens_total": "Estimated response tokens received from Gemini",
+    "asha_errors_total": "Errors while answering, by exception type",
+}
+
+
+def _label_key(labels: Dict) -> tuple:
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key: tuple, extra: str = "") -> str:
+    parts = [f'{name}="{str(value)}"' for name, value in key]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Span:
+    __slots__ = ("_metrics", "_stage", "_start")
+
+    def __init__(self, metrics, stage):
+        self._metrics = metrics
+        self._stage = stage
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._metrics.observe(self._stage, time.perf_counter() - self._start)
+        if exc_type is not None and exc_type is not GeneratorExit:
+            self._metrics.incr("asha_stage_errors_total", stage=self._stage)
+        return False
+
+
+class _NoSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+class Metrics:
+    def __init__(self, enabled: bool = METRICS_ENABLED, buckets=BUCKETS):
+        self.enabled = enabled
+        self.buckets = buckets
+        self._counters = {}
+        self._histograms = {}
+        self._recent = {}
+        # name -> (buckets, [bucket counts], [sum, count])
+        self._values = {}
+        self._collectors = []
+        self._pages = {}
+        self._lock = threading.Lock()
+
+    def span(self, stage: str):
+        """Context manager timing one stage into ``asha_stage_seconds``"""
+        return _Span(self, stage) if self.enabled else _NO_SPAN
+
+    def observe(self, stage: str, seconds: float):
+        if not self.enabled:
+            return
+        index = bisect_left(self.buckets, seconds)
+        with self._lock:
+            histogram = self._histograms.get(stage)
+            if histogram is None:
+                histogram = self._histograms[stage] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+                self._recent[stage] = deque(maxlen=RECENT_SAMPLES)
+            histogram[0][index] += 1
+            histogram[1] += seconds
+            histogram[2] += 1
+            self._recent[stage].append(seconds)
+
+    def add_histogram(self, name: str, buckets):
+        """Register ``name`` as a histogram with the given upper bounds"""
+        with self._lock:
+            self._values[name] = (tuple(buckets), [0] * (len(buckets) + 1), [0.0, 0])
+
+    def record(self, name: str, value: float):
+        """Add one observation to the histogram registered as ``name``"""
+        if not self.enabled:
+            return
+        with self._lock:
+            buckets, counts, totals = self._values[name]
+            counts[bisect_left(buckets, value)] += 1
+            totals[0] += value
+            totals[1] += 1
+
+    def incr(self, name: str, value: float = 1, **labels):
+        if not self.enabled:
+            return
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def add_collector(self, prefix: str, collect: Callable[[], Dict]):
+        """Export the numeric values of ``collect()`` as ``<prefix>_<key>`` gauges"""
+        self._collectors.append((prefix, collect))
+
+    def add_page(self, path: str, render: Callable[[], str]):
+        """Serve ``render()`` as plain text at ``path`` on the metrics port"""
+        self._pages[path] = render
+
+    def page(self, path: str):
+        """Text for ``path``, or None when nothing is served there"""
+        if path == "/metrics":
+            return self.render()
+        render = self._pages.get(path)
+        return render() if render else None
+
+    def counter(self, name: str, **labels) -> float:
+        with self._lock:
+            return self._counters.get((name, _label_key(labels)), 0)
+
+    def percentiles(self, stage: str, points=(50, 95, 99)) -> Dict[int, float]:
+        """Percentiles in seconds over the most recent samples of ``stage``"""
+        with self._lock:
+            samples = sorted(self._recent.get(stage, ()))
+        if not samples:
+            return {}
+        return {p: samples[min(len(samples) - 1, int(len(samples) * p / 100))] for p in points}
+
+    def observations(self, stage: str) -> int:
+        with self._lock:
+            histogram = self._histograms.get(stage)
+            return histogram[2] if histogram else 0
+
+    def stages(self) -> List[str]:
+        with self._lock:
+            return sorted(self._histograms)
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+            self._recent.clear()
+            for name, (buckets, _, _) in self._values.items():
+                self._values[name] = (buckets, [0] * (len(buckets) + 1), [0.0, 0])
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {stage: (list(h[0]), h[1], h[2]) for stage, h in self._histograms.items()}
+            values = {name: (buckets, list(counts), list(totals))
+                      for name, (buckets, counts, totals) in self._values.items()}
+        lines = []
+
+        def header(name, kind):
+            if name in DESCRIPTIONS:
+                lines.append(f"# HELP {name} {DESCRIPTIONS[name]}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        if histograms:
+            header("asha_stage_seconds", "histogram")
+        for stage, (counts, total, count) in sorted(histograms.items()):
+            key = (("stage", stage),)
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound!r}"'
+                lines.append(f"asha_stage_seconds_bucket{_format_labels(key, le)} {cumulative}")
+            lines.append(f"asha_stage_seconds_sum{_format_labels(key)} {total:.6f}")
+            lines.append(f"asha_stage_seconds_count{_format_labels(key)} {count}")
+
+        for name, (buckets, counts, (total, count)) in sorted(values.items()):
+            if not count:
+                continue
+            header(name, "histogram")
+            cumulative = 0
+            for bound, bucket_count in zip(buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound!r}"'
+                lines.append(f"{name}_bucket{{{le}}} {cumulative}")
+            lines.append(f"{name}_sum {total:g}")
+            lines.append(f"{name}_count {count}")
+
+        for name in sorted({name for name, _ in counters}):
+            header(name, "counter")
+            for (counter_name, key), value in sorted(counters.items()):
+                if counter_name == name:
+                    lines.append(f"{name}{_format_labels(key)} {value:g}")
+
+        for prefix, collect in self._collectors:
+            try:
+                values = collect()
+            except Exception as e:
+                print(f"Metrics collector {prefix} failed: {e}")
+                continue
+            for key, value in sorted(values.items()):
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    header(f"{prefix}_{key}", "gauge")
+                    lines.append(f"{prefix}_{key} {value:g}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+_exporter_lock = threading.Lock()
+_exporters_started = False
+
+
+def _write_file_forever(path: str, interval: float):
+    while True:
+        try:
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(metrics.render())
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Could not write metrics to {path}: {e}")
+        time.sleep(interval)
+
+
+def _serve_http(port: int, host: str = METRICS_HOST):
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            text = metrics.page(self.path.split("?")[0])
+            if text is None:
+                self.send_error(404)
+                return
+            body = text.encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    print(f"Metrics at http://{host}:{port}/metrics")
+    server.serve_forever()
+
+
+def start_exporters(port: int = METRICS_PORT, path: str = METRICS_FILE,
+                    interval: float = METRICS_INTERVAL, host: str = METRICS_HOST) -> bool:
+    """Start the configured HTTP and file exporters once per process"""
+    global _exporters_started
+    with _exporter_lock:
+        if _exporters_started or not metrics.enabled:
+            return False
+        _exporters_started = True
+    try:
+        if port:
+            threading.Thread(target=_serve_http, args=(port, host), name="metrics-http", daemon=True).start()
+        if path:
+            threading.Thread(target=_write_file_forever, args=(path, interval),
+                             name="metrics-file", daemon=True).start()
+    except Exception as e:
+        print(f"Metrics exporter not started: {e}")
+    return True
+
+
+def run_pipeline_overhead(repeat: int = 100):
+    """Per-message cost of ask_gemini_stream with metrics on and off (fake Gemini)"""
+    import contextlib
+    import io
+
+    import user_data_manager
+    from fake_gemini import FakeGeminiModel
+    # The instance user_data_manager uses (this file may be running as __main__)
+    from metrics import metrics as registry
+    from gemini_client import GeminiPool
+    from resilience import ResilientCaller, TokenBucket
+
+    model = FakeGeminiModel()
+    unlimited = ResilientCaller(limiter=TokenBucket(rate=1e6, capacity=1000000))
+    user_data_manager.gemini_pool = GeminiPool(lambda: model, resilience=unlimited)
+    queries = ["How do I negotiate my salary?", "Can you give me a roadmap to learn SQL?",
+               "What should I write in a cover letter for a returnship at a bank?"]
+    timings = {}
+    # The first round warms up imports, the intent model and the pool; it is not counted
+    for round_number, enabled in enumerate((True,) + (False, True) * 3):
+        registry.enabled = enabled
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            for i in range(repeat):
+                for query in queries:
+                    # Unique text so the response cache does not answer
+                    "".join(user_data_manager.ask_gemini_stream(f"{query} ({enabled} {i} {start})"))
+        elapsed = (time.perf_counter() - start) / (repeat * len(queries))
+        if round_number:
+            timings[enabled] = min(timings.get(enabled, elapsed), elapsed)
+    registry.enabled = METRICS_ENABLED
+    overhead = timings[True] - timings[False]
+    print(f"pipeline: {timings[False] * 1e6:.0f} us/message without metrics, {timings[True] * 1e6:.0f} us with "
+          f"({overhead * 1e6:+.0f} us, {overhead / timings[False]:+.1%}; best of 3 runs each)")
+    for stage in registry.stages():
+        p = registry.percentiles(stage)
+        print(f"  {stage:<16} p50 {p[50] * 1000:8.3f} ms   p95 {p[95] * 1000:8.3f} ms   p99 {p[99] * 1000:8.3f} ms")
+
+
+def run_benchmark(repeat: int = 200000):
+    """Cost of one span and one counter increment, enabled and disabled"""
+    for enabled in (True, False):
+        registry = Metrics(enabled=enabled)
+        start = time.perf_counter()
+        for _ in range(repeat):
+            with registry.span("bench"):
+                pass
+        span_cost = (time.perf_counter() - start) / repeat
+        start = time.perf_counter()
+        for _ in range(repeat):
+            registry.incr("asha_llm_calls_total")
+        incr_cost = (time.perf_counter() - start) / repeat
+        print(f"metrics {'on ' if enabled else 'off'}: span {span_cost * 1e6:.2f} us, "
+              f"counter {incr_cost * 1e6:.2f} us")
+    registry = Metrics()
+    with registry.span("render_check"):
+        registry.incr("asha_llm_calls_total")
+    start = time.perf_counter()
+    text = registry.render()
+    print(f"render: {(time.perf_counter() - start) * 1e6:.0f} us for {len(text.splitlines())} lines")
+
+
+if __name__ == "__main__":
+    run_benchmark()
+    run_pipeline_overhead()
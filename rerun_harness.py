@@ -0,0 +1,173 @@
+"""Counts script runs and LLM calls per user message with Streamlit's AppTest.
+
+The LLM is replaced by a stub and storage goes to a temporary SQLite
+database, so no credentials are needed:
+
+    python rerun_harness.py
+
+Exits non-zero if any message costs more than one LLM call, a
+duplicate submission reaches the LLM or one "New Chat" click does not
+create exactly one chat.
+"""
+import os
+import shutil
+import sys
+import tempfile
+
+import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+from streamlit.testing.v1 import AppTest
+
+APP = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+SEND_BUTTON = "FormSubmitter:chat_input_form-💜 Send Message"
+
+counts = {"runs": 0, "llm_calls": 0}
+
+
+def stub_stream(user_input, conversation_context=None, chat_key=None, profile=None):
+    counts["llm_calls"] += 1
+    for word in f"Here is some advice about: {user_input}".split():
+        yield word + " "
+
+
+_set_page_config = st.set_page_config
+
+
+def counting_set_page_config(*args, **kwargs):
+    # app.py calls this first thing on every script run
+    counts["runs"] += 1
+    return _set_page_config(*args, **kwargs)
+
+
+def setup() -> str:
+    """Point storage at a fresh temporary SQLite database; returns its directory.
+
+    Call before the first AppTest run: app.py reads these settings when it
+    first creates its storage client.
+    """
+    directory = tempfile.mkdtemp(prefix="asha-harness-")
+    os.environ["ASHA_STORAGE_BACKEND"] = "sqlite"
+    os.environ["ASHA_SQLITE_PATH"] = os.path.join(directory, "asha.db")
+    return directory
+
+
+_rerun = st.rerun
+
+
+def resetting_rerun():
+    # A browser sends no trigger values with the run st.rerun() asks for.
+    # AppTest reruns with the click still set, so the script would take the
+    # same branch again (one "New Chat" click making dozens of chats).
+    ctx = get_script_run_ctx()
+    if ctx is not None:
+        ctx.session_state._state._reset_triggers()
+    _rerun()
+
+
+def reset_triggers(at):
+    """Unclick every button in the last rendered page"""
+    for node in at._tree:
+        if hasattr(node, "_value") and getattr(node, "type", None) == "button":
+            node._value = False
+
+
+def run(at, node, attempts: int = 3):
+    """node.run(), then the follow-up run st.rerun() asked for.
+
+    AppTest in streamlit 1.28 does not wait for the run that st.rerun()
+    starts: depending on timing it stops with a KeyError or returns an
+    empty page. The browser would show the next run, so do that here.
+    Returns the number of extra runs.
+    """
+    extra = 0
+    try:
+        node.run()
+    except KeyError:
+        # The page still holds the click that was just handled
+        at._tree._runner = at
+        reset_triggers(at)
+        at.run()
+        extra += 1
+    while len(at.main) == 0 and not at.exception and extra < attempts:
+        reset_triggers(at)
+        at.run()
+        extra += 1
+    return extra
+
+
+def measure(name, action, results):
+    before = dict(counts)
+    action()
+    results.append((name, counts["runs"] - before["runs"], counts["llm_calls"] - before["llm_calls"]))
+
+
+def patch_streamlit():
+    """Count script runs and reset triggers on st.rerun() for every AppTest in this process"""
+    st.set_page_config = counting_set_page_config
+    st.rerun = resetting_rerun
+
+
+def main() -> bool:
+    import user_data_manager
+
+    user_data_manager.ask_gemini_stream = stub_stream
+    patch_streamlit()
+
+    at = AppTest.from_file(APP, default_timeout=60)
+    at.session_state["logged_in"] = True
+    at.session_state["page"] = "chat"
+    at.session_state["email"] = "harness@example.com"
+    results = []
+    measure("open chat page", at.run, results)
+
+    def send(text):
+        def action():
+            at.text_area(key="chat_input").input(text)
+            run(at, at.button(key=SEND_BUTTON).click())
+        return action
+
+    def quick_action():
+        button = next(b for b in at.button if b.key.startswith("quick_salary_"))
+        run(at, button.click())
+        return button
+
+    measure("first message (new chat)", send("How do I switch to data science?"), results)
+    measure("follow-up message", send("Which courses should I take?"), results)
+    clicked = []
+    measure("quick action", lambda: clicked.append(quick_action()), results)
+    measure("same quick action clicked again before rerender", lambda: run(at, clicked[0].click()), results)
+    measure("empty submission", send("   "), results)
+    history = at.session_state["chat_history"]
+
+    chats = []
+
+    def new_chat():
+        before = len(at.session_state["chat_store"])
+        run(at, at.button(key="new_chat_btn").click())
+        chats.append(len(at.session_state["chat_store"]) - before)
+
+    measure("new chat", new_chat, results)
+    measure("new chat again", new_chat, results)
+
+    print(f"{'action':<50} {'runs':>5} {'LLM calls':>10}")
+    for name, runs, llm_calls in results:
+        print(f"{name:<50} {runs:>5} {llm_calls:>10}")
+    print(f"\nmessages in history: {len(history)}, chats per click: {chats}, exceptions: {len(at.exception)}")
+
+    expected_calls = {"first message (new chat)": 1, "follow-up message": 1, "quick action": 1,
+                      "same quick action clicked again before rerender": 0, "empty submission": 0,
+                      "new chat": 0, "new chat again": 0}
+    ok = not at.exception and len(history) == 6 and chats == [1, 1]
+    for name, runs, llm_calls in results:
+        if name in expected_calls and llm_calls != expected_calls[name]:
+            ok = False
+    return ok
+
+
+if __name__ == "__main__":
+    directory = setup()
+    try:
+        passed = main()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    sys.exit(0 if passed else 1)
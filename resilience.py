@@ -0,0 +1,358 @@
+"""Retry, rate limiting and circuit breaking for calls to Gemini.
+
+``ResilientCaller`` wraps one call (or one stream) in three layers:
+
+* a token bucket sized to the API quota, so a burst of sessions waits a
+  little instead of being rejected with 429s;
+* jittered exponential retry for errors that are worth retrying (429,
+  500, 503, connection resets); a stream is only retried before its first
+  chunk, so the user never sees text twice;
+* a circuit breaker that opens after repeated failures, so during an
+  outage requests fail instantly and the app can fall back to the
+  knowledge base instead of waiting for a timeout.
+
+    python resilience.py     # fault-injection scenarios against fake_gemini
+"""
+import os
+import random
+import threading
+import time
+from typing import Callable, Dict, Iterable, Optional
+
+# Requests per minute the Gemini quota allows, and how many may burst at once
+RATE_PER_MINUTE = float(os.getenv("ASHA_GEMINI_RPM", "60"))
+BURST = int(os.getenv("ASHA_GEMINI_BURST", "10"))
+# Longest a request waits for a rate-limit token before giving up
+RATE_WAIT = float(os.getenv("ASHA_GEMINI_RATE_WAIT", "10"))
+MAX_ATTEMPTS = int(os.getenv("ASHA_GEMINI_ATTEMPTS", "3"))
+BASE_DELAY = float(os.getenv("ASHA_GEMINI_RETRY_DELAY", "0.5"))
+MAX_DELAY = 8.0
+FAILURE_THRESHOLD = int(os.getenv("ASHA_BREAKER_FAILURES", "5"))
+RESET_TIMEOUT = float(os.getenv("ASHA_BREAKER_RESET", "30"))
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Gemini is failing; the call was not attempted"""
+
+
+class RateLimitedError(Exception):
+    """No rate-limit token became available in time"""
+
+
+def status_code(error: Exception) -> Optional[int]:
+    """HTTP status of an API error, when it has one"""
+    code = getattr(error, "code", None)
+    if isinstance(code, int):
+        return code
+    code = getattr(error, "status_code", None)
+    return code if isinstance(code, int) else None
+
+
+def is_retryable(error: Exception) -> bool:
+    """True for errors a retry can fix: throttling, server errors, dropped connections"""
+    if isinstance(error, (CircuitOpenError, RateLimitedError, TimeoutError)):
+        # A timeout already used the whole request deadline
+        return False
+    if isinstance(error, ConnectionError):
+        return True
+    # google.api_core errors carry their HTTP status in .code, so the SDK
+    # need not be imported here (see startup_report.txt)
+    return status_code(error) in RETRYABLE_STATUS
+
+
+def counts_as_failure(error: Exception) -> bool:
+    """Whether ``error`` says Gemini is unhealthy (vs. a problem with this request)"""
+    return is_retryable(error) or isinstance(error, TimeoutError)
+
+
+class RetryPolicy:
+    def __init__(self, max_attempts: int = MAX_ATTEMPTS, base_delay: float = BASE_DELAY,
+                 max_delay: float = MAX_DELAY):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt: int) -> float:
+        """Full jitter: uniform in [0, base * 2**attempt], capped"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+
+class TokenBucket:
+    """Allows ``rate`` calls per second on average with bursts up to ``capacity``"""
+
+    def __init__(self, rate: float = RATE_PER_MINUTE / 60, capacity: int = BURST):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self.waited = 0.0
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, timeout: Optional[float] = RATE_WAIT) -> bool:
+        """Take one token, sleeping until one is free; False after ``timeout``"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = (1 - self._tokens) / self.rate
+            if deadline is not None and now + wait > deadline:
+                return False
+            self.waited += wait
+            time.sleep(wait)
+
+
+class CircuitBreaker:
+    """Opens after ``failure_threshold`` consecutive failures.
+
+    While open every call is refused. After ``reset_timeout`` seconds one
+    trial call is let through (half-open): success closes the breaker,
+    failure opens it again.
+    """
+
+    def __init__(self, failure_threshold: int = FAILURE_THRESHOLD, reset_timeout: float = RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.times_opened = 0
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = HALF_OPEN
+            if self.state == HALF_OPEN and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = CLOSED
+            self.failures = 0
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    self.times_opened += 1
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+
+    def release(self):
+        """A trial call ended without telling us anything (e.g. a bad request)"""
+        with self._lock:
+            self._trial_running = False
+
+
+class ResilientCaller:
+    def __init__(self, retry: Optional[RetryPolicy] = None, limiter: Optional[TokenBucket] = None,
+                 breaker: Optional[CircuitBreaker] = None, sleep: Callable[[float], None] = time.sleep):
+        self.retry = retry or RetryPolicy()
+        self.limiter = limiter or TokenBucket()
+        self.breaker = breaker or CircuitBreaker()
+        self._sleep = sleep
+        self.attempts = 0
+        self.retries = 0
+        self.rejected = 0
+
+    def _admit(self):
+        if not self.breaker.allow():
+            self.rejected += 1
+            raise CircuitOpenError("Gemini is unavailable; circuit breaker is open")
+        if not self.limiter.acquire():
+            self.breaker.release()
+            raise RateLimitedError("Gemini rate limit: no request slot became free in time")
+        self.attempts += 1
+
+    def _failed(self, error: Exception, attempt: int) -> bool:
+        """Record ``error``; True if the call should be tried again"""
+        if counts_as_failure(error):
+            self.breaker.record_failure()
+        else:
+            self.breaker.release()
+        if attempt + 1 >= self.retry.max_attempts or not is_retryable(error):
+            return False
+        self.retries += 1
+        self._sleep(self.retry.delay(attempt))
+        return True
+
+    def call(self, func: Callable):
+        """Return ``func()``, retrying retryable errors"""
+        attempt = 0
+        while True:
+            self._admit()
+            try:
+                result = func()
+            except Exception as e:
+                if not self._failed(e, attempt):
+                    raise
+                attempt += 1
+                continue
+            self.breaker.record_success()
+            return result
+
+    def stream(self, stream_factory: Callable[[], Iterable]):
+        """Yield from ``stream_factory()``; retried only until the first chunk arrives"""
+        attempt = 0
+        while True:
+            self._admit()
+            started = False
+            stream = None
+            try:
+                stream = iter(stream_factory())
+                for chunk in stream:
+                    started = True
+                    yield chunk
+            except GeneratorExit:
+                # The reader stopped early (e.g. the user pressed Stop)
+                if started:
+                    self.breaker.record_success()
+                else:
+                    self.breaker.release()
+                raise
+            except Exception as e:
+                if started:
+                    if counts_as_failure(e):
+                        self.breaker.record_failure()
+                    else:
+                        self.breaker.release()
+                    raise
+                if not self._failed(e, attempt):
+                    raise
+                attempt += 1
+                continue
+            finally:
+                close = getattr(stream, "close", None)
+                if close:
+                    close()
+            self.breaker.record_success()
+            return
+
+    def stats(self) -> Dict:
+        return {
+            "breaker_state": self.breaker.state,
+            "breaker_opened": self.breaker.times_opened,
+            "attempts": self.attempts,
+            "retries": self.retries,
+            "rejected": self.rejected,
+            "rate_limit_wait_s": round(self.limiter.waited, 3),
+        }
+
+
+def run_benchmark():
+    """Fault-injection scenarios against FakeGeminiModel through GeminiPool"""
+    from fake_gemini import FakeGeminiModel
+    from gemini_client import GeminiPool
+
+    def pool(model, timeout=1.0, **caller):
+        caller.setdefault("retry", RetryPolicy(base_delay=0.05))
+        caller.setdefault("limiter", TokenBucket(rate=1000, capacity=1000))
+        return GeminiPool(lambda: model, timeout=timeout, resilience=ResilientCaller(**caller))
+
+    def outcome(gemini, prompt="How do I prepare for interviews?"):
+        start = time.perf_counter()
+        try:
+            text = "".join(chunk.text for chunk in gemini.stream(prompt))
+            result = f"ok ({len(text)} chars)"
+        except Exception as e:
+            result = type(e).__name__
+        return result, (time.perf_counter() - start) * 1000
+
+    print(f"{'scenario':<46} {'result':<20} {'ms':>7} {'model calls':>12}")
+
+    def report(name, model, gemini, **kwargs):
+        result, ms = outcome(gemini, **kwargs)
+        print(f"{name:<46} {result:<20} {ms:>7.0f} {model.calls:>12}")
+        return result
+
+    ok = True
+    model = FakeGeminiModel(faults=["429", "503"])
+    ok &= report("429 then 503 then success", model, pool(model)).startswith("ok")
+    model = FakeGeminiModel(faults=["403"])
+    ok &= report("403 (not retried)", model, pool(model)) == "PermissionDenied"
+    model = FakeGeminiModel(faults=["midstream"])
+    ok &= report("fails after first chunk (not retried)", model, pool(model)) == "ServiceUnavailable"
+
+    model = FakeGeminiModel(faults=["hang"] * 100, latency=0.0)
+    gemini = pool(model, timeout=0.5, breaker=CircuitBreaker(failure_threshold=3, reset_timeout=0.5))
+    for i in range(3):
+        report(f"outage, request {i + 1} (waits for timeout)", model, gemini)
+    ok &= report("outage, breaker open (fails fast)", model, gemini) == "CircuitOpenError"
+    model.faults.clear()
+    time.sleep(0.5)
+    ok &= report("after reset timeout (half-open trial)", model, gemini).startswith("ok")
+    ok &= gemini.resilience.breaker.state == CLOSED
+
+    # A half-open trial stream that breaks mid-way on a non-failure error
+    # must free the trial slot, or the breaker would refuse calls for good
+    def bad_after_first_chunk():
+        yield "partial"
+        raise ValueError("malformed chunk")
+
+    caller = ResilientCaller(limiter=TokenBucket(rate=1000, capacity=1000),
+                             breaker=CircuitBreaker(failure_threshold=1, reset_timeout=0.0))
+    caller.breaker.record_failure()
+    try:
+        list(caller.stream(bad_after_first_chunk))
+    except ValueError:
+        pass
+    try:
+        admitted = caller.call(lambda: "ok") == "ok"
+    except CircuitOpenError:
+        admitted = False
+    print(f"{'non-failure error mid-stream in half-open trial':<46} "
+          f"{'next call admitted' if admitted else 'next call REJECTED'}")
+    ok &= admitted
+
+    # Success rate under random faults, without and with retries
+    for attempts in (1, MAX_ATTEMPTS):
+        random.seed(7)
+        model = FakeGeminiModel(fault_rate=0.3)
+        gemini = pool(model, retry=RetryPolicy(max_attempts=attempts, base_delay=0.001),
+                      breaker=CircuitBreaker(failure_threshold=1000))
+        results = [outcome(gemini)[0] for _ in range(200)]
+        success = sum(result.startswith("ok") for result in results) / len(results)
+        print(f"30% injected 429/503, {attempts} attempt(s): {success:.0%} of 200 requests answered")
+
+    limiter = TokenBucket(rate=20, capacity=5)
+    model = FakeGeminiModel()
+    gemini = pool(model, limiter=limiter)
+    threads = [threading.Thread(target=outcome, args=(gemini,)) for _ in range(25)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    print(f"token bucket 20/s, burst 5: 25 concurrent requests took {elapsed:.2f} s "
+          f"({25 / elapsed:.0f} req/s)")
+    print("all scenarios behaved as expected" if ok else "UNEXPECTED results above")
+    return ok
+
+
+if __name__ == "__main__":
+    import sys
+
+    sys.exit(0 if run_benchmark() else 1)
@@ -0,0 +1,173 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Collapse whitespace and case so trivially different prompts share a key"""
+    return re.sub(r"\s+", " ", prompt).strip().casefold()
+
+
+def standalone_key(query: str, profile: Dict) -> str:
+    """Cache text for a question answered without conversation context.
+
+    Stands in for the prompt: the reply depends only on the query and the
+    profile it was written for, so any chat asking it can reuse the entry.
+    """
+    return json.dumps({"query": normalize_prompt(query), "profile": profile}, sort_keys=True)
+
+
+def make_cache_key(prompt: str, safety_settings: Optional[List[Dict]] = None) -> str:
+    """Hash of the normalized prompt plus the safety settings it was sent with"""
+    payload = json.dumps([normalize_prompt(prompt), safety_settings], sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class SQLiteCacheTier:
+    """On-disk cache tier shared by every process pointing at the same file"""
+
+    def __init__(self, path: str, max_entries: int = 5000):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+        self._conn.commit()
+
+    def get(self, key: str, ttl_seconds: float) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if now - row[1] > ttl_seconds:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            return row[0]
+
+    def set(self, key: str, value: str):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, created, accessed) VALUES (?, ?, ?, ?)",
+                (key, value, now, now)
+            )
+            # Size-based eviction: drop the least recently used overflow.
+            self._conn.execute(
+                "DELETE FROM responses WHERE key IN ("
+                "SELECT key FROM responses ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+
+
+class ResponseCache:
+    """Two-tier LLM response cache: in-process LRU in front of an optional disk tier.
+
+    Entries expire ``ttl_seconds`` after they were generated. The memory tier
+    holds at most ``max_entries`` and evicts the least recently used one.
+    """
+
+    def __init__(self, max_entries: int = 256, ttl_seconds: float = 3600,
+                 disk_tier: Optional[SQLiteCacheTier] = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.disk_tier = disk_tier
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, prompt: str, safety_settings: Optional[List[Dict]] = None) -> Optional[str]:
+        key = make_cache_key(prompt, safety_settings)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, created = entry
+                if now - created <= self.ttl_seconds:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+
+        value = self.disk_tier.get(key, self.ttl_seconds) if self.disk_tier else None
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._store(key, value, now)
+        return value
+
+    def set(self, prompt: str, value: str, safety_settings: Optional[List[Dict]] = None):
+        key = make_cache_key(prompt, safety_settings)
+        with self._lock:
+            self._store(key, value, time.time())
+        if self.disk_tier:
+            self.disk_tier.set(key, value)
+
+    def _store(self, key, value, created):
+        self._entries[key] = (value, created)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self.disk_tier:
+            self.disk_tier.clear()
+
+    def stats(self) -> Dict:
+        """Hit/miss counters for monitoring"""
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+            }
+
+
+def create_default_cache() -> ResponseCache:
+    """Build the process-wide cache from ASHA_CACHE_* environment variables"""
+    db_path = os.getenv("ASHA_CACHE_DB")
+    disk_tier = SQLiteCacheTier(db_path) if db_path else None
+    return ResponseCache(
+        max_entries=int(os.getenv("ASHA_CACHE_SIZE", "256")),
+        ttl_seconds=float(os.getenv("ASHA_CACHE_TTL", "3600")),
+        disk_tier=disk_tier,
+    )
+
+
+response_cache = create_default_cache()
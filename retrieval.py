@@ -0,0 +1,273 @@
+import glob
+import hashlib
+import json
+import os
+import re
+import time
+import numpy as np
+from knowledgebase import asha_topics
+
+# Next to this file rather than the working directory, which depends on
+# where streamlit was started and may not be writable
+INDEX_DIR = os.getenv("ASHA_INDEX_DIR",
+                      os.path.join(os.path.dirname(os.path.abspath(__file__)), ".asha_index"))
+SIMILARITY_THRESHOLD = float(os.getenv("ASHA_KB_THRESHOLD", "0.3"))
+# Distinct query terms the best document must feature before it is served
+# without Gemini; one shared word ("resume", "work") says little about topic.
+# A term counts when its weight is at least MIN_TERM_WEIGHT of the document's
+# strongest term, so a passing mention in the answer text does not.
+MIN_MATCHED_TERMS = int(os.getenv("ASHA_KB_MIN_TERMS", "2"))
+MIN_TERM_WEIGHT = 0.6
+INDEX_VERSION = 1
+
+STOPWORDS = {
+    "a", "about", "after", "all", "am", "an", "and", "any", "are", "as", "at", "be",
+    "but", "by", "can", "could", "do", "does", "for", "from", "get", "give", "have",
+    "how", "i", "if", "in", "into", "is", "it", "its", "just", "like", "me", "my",
+    "of", "on", "or", "please", "should", "show", "so", "some", "tell", "that", "the",
+    "their", "them", "there", "they", "this", "to", "u", "up", "us", "want", "was",
+    "we", "what", "when", "where", "which", "who", "why", "will", "with", "would",
+    "you", "your",
+}
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str):
+    """Lowercase word tokens, stopwords dropped, cut to a 6 char stem.
+
+    The truncation is a cheap stand-in for stemming: "negotiate" and
+    "negotiation", "mentor" and "mentorship" land on the same term.
+    """
+    return [word[:6] for word in _TOKEN_RE.findall(text.lower()) if word not in STOPWORDS]
+
+
+class KnowledgeIndex:
+    """TF-IDF vector index over a keyword -> answer corpus.
+
+    Each document row of the float32 matrix is scaled so its strongest term
+    is 1, and a query scores the idf-weighted share of its terms a document
+    covers, which gives a 0..1 similarity to threshold on. The matrix is
+    written to ``INDEX_DIR`` once per corpus version and memory-mapped on
+    later starts, so the cost of building it is paid once per deployment.
+    """
+
+    def __init__(self, corpus: dict, index_dir: str = INDEX_DIR,
+                 threshold: float = SIMILARITY_THRESHOLD, keyword_weight: int = 3,
+                 min_terms: int = MIN_MATCHED_TERMS):
+        self.corpus = corpus
+        self.index_dir = index_dir
+        self.threshold = threshold
+        self.min_terms = min_terms
+        self.keyword_weight = keyword_weight
+        self.keys = list(corpus)
+        self.vocab = None
+        self.idf = None
+        self.matrix = None
+
+    def _digest(self):
+        payload = json.dumps([INDEX_VERSION, self.keyword_weight, self.corpus], sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+    def _document_tokens(self, key):
+        return tokenize(key) * self.keyword_weight + tokenize(self.corpus[key])
+
+    def _ensure_loaded(self):
+        if self.matrix is not None:
+            return
+        digest = self._digest()
+        matrix_path = os.path.join(self.index_dir, f"{digest}.npy")
+        meta_path = os.path.join(self.index_dir, f"{digest}.json")
+        if os.path.exists(matrix_path) and os.path.exists(meta_path):
+            try:
+                with open(meta_path, 'r') as f:
+                    meta = json.load(f)
+                self.vocab = meta["vocab"]
+                self.idf = np.asarray(meta["idf"], dtype=np.float32)
+                self.matrix = np.load(matrix_path, mmap_mode='r')
+                if meta["keys"] != self.keys or self.matrix.shape != (len(self.keys), len(self.vocab)):
+                    raise ValueError(f"matrix shape {self.matrix.shape} does not match its vocab")
+                return
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Knowledge index cache unreadable, rebuilding: {e}")
+                self.matrix = None
+        self._build()
+        self._persist(matrix_path, meta_path)
+
+    def _build(self):
+        documents = [self._document_tokens(key) for key in self.keys]
+        self.vocab = {}
+        for tokens in documents:
+            for token in tokens:
+                self.vocab.setdefault(token, len(self.vocab))
+
+        doc_freq = np.zeros(len(self.vocab), dtype=np.float32)
+        matrix = np.zeros((len(documents), len(self.vocab)), dtype=np.float32)
+        for row, tokens in enumerate(documents):
+            for token in tokens:
+                matrix[row, self.vocab[token]] += 1
+            doc_freq[matrix[row] > 0] += 1
+
+        self.idf = np.log((1 + len(documents)) / (1 + doc_freq)).astype(np.float32) + 1
+        # Sublinear tf keeps long answers from drowning out the keyword.
+        np.log1p(matrix, out=matrix)
+        matrix *= self.idf
+        peaks = matrix.max(axis=1, keepdims=True)
+        peaks[peaks == 0] = 1
+        self.matrix = matrix / peaks
+
+    def _persist(self, matrix_path, meta_path):
+        """Write both files under temp names and rename them, the meta last.
+
+        A reader only trusts the matrix once the meta exists, so a crash or
+        a concurrent start never pairs a matrix with the wrong vocab.
+        """
+        suffix = f".{os.getpid()}.tmp"
+        try:
+            os.makedirs(self.index_dir, exist_ok=True)
+            with open(matrix_path + suffix, 'wb') as f:
+                np.save(f, self.matrix)
+            with open(meta_path + suffix, 'w') as f:
+                json.dump({"keys": self.keys, "vocab": self.vocab, "idf": self.idf.tolist()}, f)
+            os.replace(matrix_path + suffix, matrix_path)
+            os.replace(meta_path + suffix, meta_path)
+        except OSError as e:
+            print(f"Knowledge index not persisted: {e}")
+            for path in (matrix_path + suffix, meta_path + suffix):
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def _term_ids(self, query: str):
+        """Vocabulary id -> count of the query's known terms"""
+        self._ensure_loaded()
+        term_ids = {}
+        for token in tokenize(query):
+            term_id = self.vocab.get(token)
+            if term_id is not None:
+                term_ids[term_id] = term_ids.get(term_id, 0) + 1
+        return term_ids
+
+    def search(self, query: str, top_k: int = 1):
+        """Return up to ``top_k`` ``(keyword, similarity)`` pairs, best first."""
+        term_ids = self._term_ids(query)
+        if not term_ids or not len(self.keys):
+            return []
+
+        ids = np.fromiter(term_ids, dtype=np.int64)
+        weights = np.log1p(np.fromiter(term_ids.values(), dtype=np.float32)) * self.idf[ids]
+        # Unknown query terms still count towards the total, so a question
+        # that is mostly about something else scores low.
+        unknown = len(tokenize(query)) - sum(term_ids.values())
+        total = float(weights.sum()) + unknown * float(self.idf.max())
+        scores = np.asarray(self.matrix[:, ids] @ weights) / total
+
+        best = np.argsort(scores)[::-1][:top_k]
+        return [(self.keys[i], float(scores[i])) for i in best if scores[i] > 0]
+
+    def matched_terms(self, query: str, keyword: str) -> int:
+        """How many distinct query terms the document for ``keyword`` features"""
+        ids = list(self._term_ids(query))
+        if not ids:
+            return 0
+        return int(np.count_nonzero(self.matrix[self.keys.index(keyword), ids] >= MIN_TERM_WEIGHT))
+
+    def answer(self, query: str):
+        """Return the best answer if it clears the similarity threshold and
+        shares at least ``min_terms`` terms with the query, else None."""
+        results = self.search(query)
+        if (results and results[0][1] >= self.threshold
+                and self.matched_terms(query, results[0][0]) >= self.min_terms):
+            return self.corpus[results[0][0]]
+        return None
+
+
+knowledge_index = KnowledgeIndex(asha_topics)
+
+
+def _history_queries(pattern="user_data_*.json"):
+    queries = []
+    for path in sorted(glob.glob(pattern)):
+        with open(path, 'r') as f:
+            data = json.load(f)
+        histories = [data.get("chat_history", [])]
+        histories += [chat.get("history", []) for chat in data.get("all_chats", {}).values()]
+        for history in histories:
+            queries += [message for role, message in history if role == "user"]
+    return queries
+
+
+# Short or off-topic queries that share a single word with a document; they
+# must go to Gemini rather than get that document's canned answer
+PROBES = {
+    "tips for remote work": None,
+    "remote work": None,
+    "resume": None,
+    "salary": None,
+    "how do I negotiate my salary": "negotiate salary",
+    "work life balance tips": "work-life balance",
+}
+
+
+def check_probes(index) -> bool:
+    ok = True
+    for query, expected in PROBES.items():
+        answer = index.answer(query)
+        results = index.search(query)
+        keyword, score = results[0] if results else ("-", 0.0)
+        served = keyword if answer is not None else None
+        ok &= served == expected
+        print(f"{'ok  ' if served == expected else 'FAIL'} {score:.2f} {keyword:<26} {query!r} "
+              f"-> {served or 'Gemini'}")
+    return ok
+
+
+def run_benchmark(repeat=50):
+    """Hit rate and latency of local answers over the stored chat histories.
+
+    Local answers come from an exact topic keyword (topic_matcher) first and
+    the index second, as in user_data_manager.get_local_reply.
+    """
+    from topic_matcher import asha_matcher
+
+    queries = _history_queries()
+    if not queries:
+        print("No user_data_*.json histories found.")
+        return
+
+    start = time.perf_counter()
+    index = KnowledgeIndex(asha_topics, index_dir=INDEX_DIR)
+    index._ensure_loaded()
+    print(f"index ready in {(time.perf_counter() - start) * 1000:.1f} ms "
+          f"({len(index.keys)} docs, {len(index.vocab)} terms)")
+
+    probes_ok = check_probes(index)
+    print()
+
+    keyword_hits = index_hits = 0
+    for query in queries:
+        results = index.search(query)
+        keyword, score = results[0] if results else ("-", 0.0)
+        topic = asha_matcher.find_keyword(query)
+        if topic is not None:
+            keyword_hits += 1
+            print(f"KEY       {topic:<26} {query[:60]!r}")
+            continue
+        answered = index.answer(query) is not None
+        index_hits += answered
+        print(f"{'HIT ' if answered else 'miss'} {score:.2f} {keyword:<26} {query[:60]!r}")
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for query in queries:
+            asha_matcher.find(query) or index.answer(query)
+    latency_us = (time.perf_counter() - start) / (repeat * len(queries)) * 1e6
+    hits = keyword_hits + index_hits
+    print(f"\nhit rate: {hits}/{len(queries)} ({hits / len(queries):.0%}; {keyword_hits} by keyword, "
+          f"{index_hits} by index), mean lookup: {latency_us:.1f} us")
+    return probes_ok
+
+
+if __name__ == "__main__":
+    import sys
+
+    sys.exit(0 if run_benchmark() is not False else 1)
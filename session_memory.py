@@ -0,0 +1,163 @@
+"""Memory held by each Streamlit session, accounted for the whole process.
+
+app.py tracks its session here on every save. Sessions are held by weak
+reference to their ChatStore, so a closed or logged-out session drops out
+on its own. ``report()`` lists the bytes each session holds, largest first;
+with ASHA_METRICS_PORT set it is served at /sessions next to /metrics and
+the totals are exported as ``asha_sessions_*`` gauges.
+
+    python session_memory.py     # many long chats, with and without the budget
+"""
+import os
+import sys
+import threading
+import time
+import weakref
+from typing import Dict, List, Optional
+
+# Seconds between full measurements of one session's state (a deep walk)
+MEASURE_INTERVAL = float(os.getenv("ASHA_SESSION_MEASURE_INTERVAL", "30"))
+
+
+def deep_size(obj, seen=None) -> int:
+    """Approximate bytes reachable from ``obj`` (containers and object attributes)"""
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_size(k, seen) + deep_size(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_size(item, seen) for item in obj)
+    elif hasattr(obj, "__dict__") and not isinstance(obj, type):
+        size += deep_size(vars(obj), seen)
+    return size
+
+
+def mask_email(email: Optional[str]) -> str:
+    """``a***@example.com``; the report is an ops view, not a user list"""
+    if not email or "@" not in email:
+        return "(anonymous)"
+    name, domain = email.split("@", 1)
+    return f"{name[:1]}***@{domain}"
+
+
+class SessionRegistry:
+    """Last known memory use of every live session in this process.
+
+    Figures are taken in the session's own thread when it calls ``track``,
+    so reading them from the exporter thread never walks live state.
+    """
+
+    def __init__(self, measure_interval: float = MEASURE_INTERVAL):
+        self.measure_interval = measure_interval
+        self._sessions = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def track(self, store, email: Optional[str], state: Optional[Dict] = None):
+        """Record ``store``'s chat figures; ``state`` is walked at most once per interval"""
+        now = time.time()
+        with self._lock:
+            previous = self._sessions.get(store)
+        info = dict(previous) if previous else {"state_bytes": 0, "measured": 0.0}
+        info.update(store.memory_stats())
+        info["email"] = email
+        info["updated"] = now
+        if state is not None and now - info["measured"] >= self.measure_interval:
+            info["state_bytes"] = deep_size(state)
+            info["measured"] = now
+        with self._lock:
+            self._sessions[store] = info
+
+    def forget(self, store):
+        with self._lock:
+            self._sessions.pop(store, None)
+
+    def snapshot(self) -> List[Dict]:
+        with self._lock:
+            return sorted((dict(info) for info in self._sessions.values()),
+                          key=lambda info: max(info["state_bytes"], info["loaded_bytes"]), reverse=True)
+
+    def totals(self) -> Dict:
+        sessions = self.snapshot()
+        return {
+            "count": len(sessions),
+            "state_bytes": sum(info["state_bytes"] for info in sessions),
+            "state_bytes_max": max((info["state_bytes"] for info in sessions), default=0),
+            "loaded_chat_bytes": sum(info["loaded_bytes"] for info in sessions),
+            "loaded_chats": sum(info["loaded_chats"] for info in sessions),
+            "evictions": sum(info["evictions"] for info in sessions),
+            "page_ins": sum(info["page_ins"] for info in sessions),
+        }
+
+    def report(self) -> str:
+        """Plain-text table of bytes per session, largest first"""
+        now = time.time()
+        lines = [f"{'session':<28} {'state KiB':>10} {'chats KiB':>10} {'loaded':>9} "
+                 f"{'evicted':>8} {'paged in':>9} {'idle s':>7}"]
+        for info in self.snapshot():
+            lines.append(f"{mask_email(info['email']):<28} {info['state_bytes'] / 1024:>10.1f} "
+                         f"{info['loaded_bytes'] / 1024:>10.1f} "
+                         f"{info['loaded_chats']:>4}/{info['chats']:<4} {info['evictions']:>8} "
+                         f"{info['page_ins']:>9} {now - info['updated']:>7.0f}")
+        totals = self.totals()
+        lines.append(f"{totals['count']} sessions, {totals['state_bytes'] / 1024:.1f} KiB of session state, "
+                     f"{totals['loaded_chat_bytes'] / 1024:.1f} KiB of loaded chats")
+        return "\n".join(lines) + "\n"
+
+
+sessions = SessionRegistry()
+
+
+def run_benchmark(chats: int = 40, messages: int = 60, budget_kb: int = 256):
+    """One user opening every one of many long chats, without and with a budget"""
+    import tempfile
+
+    from chat_store import ChatStore
+    from storage import SQLiteBackend
+
+    answer = ("Start with the basics, then build one small project per stage. " * 25).strip()
+    history = [("user", f"Question {i} about my career?") if i % 2 == 0 else ("assistant", answer)
+               for i in range(messages)]
+    with tempfile.TemporaryDirectory() as directory:
+        backend = SQLiteBackend(os.path.join(directory, "bench.db"))
+        email = "bench@example.com"
+        for i in range(chats):
+            backend.save_chat(email, f"chat-{i}", {"title": f"Chat {i}", "created": f"2024-01-{i % 28 + 1:02d}",
+                                                   "last_updated": f"2024-02-{i % 28 + 1:02d}",
+                                                   "history": [list(message) for message in history]})
+        backend.flush()
+        print(f"{chats} chats x {messages} messages ({len(answer)}-char answers), budget {budget_kb} KiB")
+        stores = []
+        for budget in (None, budget_kb * 1024):
+            store = ChatStore.from_metadata(backend.list_chats(email),
+                                            loader=lambda chat_id: backend.load_chat(email, chat_id))
+            start = time.perf_counter()
+            for i in range(chats):
+                store.switch(f"chat-{i}")
+                if budget is not None:
+                    store.evict(lambda chat: backend.save_chat(email, chat.id, chat.to_dict()), budget)
+            first_pass = (time.perf_counter() - start) / chats
+            # Reopen the oldest chats: evicted ones are paged back in from storage
+            start = time.perf_counter()
+            for i in range(chats // 2):
+                store.switch(f"chat-{i}")
+                if budget is not None:
+                    store.evict(lambda chat: backend.save_chat(email, chat.id, chat.to_dict()), budget)
+            reopen = (time.perf_counter() - start) / (chats // 2)
+            sessions.track(store, email, {"chat_store": store})
+            stats = store.memory_stats()
+            label = "no budget" if budget is None else "budget"
+            print(f"{label:<10} loaded {stats['loaded_chats']:>3}/{stats['chats']} chats, "
+                  f"{stats['loaded_bytes'] / 1024:>7.1f} KiB estimated, {deep_size(store) / 1024:>7.1f} KiB measured, "
+                  f"{stats['evictions']} evictions, {stats['page_ins']} page-ins; "
+                  f"open {first_pass * 1000:.2f} ms, reopen {reopen * 1000:.2f} ms")
+            # Each pass is a separate session; both stay alive for the report
+            stores.append(store)
+        backend.close()
+    print(sessions.report(), end="")
+
+
+if __name__ == "__main__":
+    run_benchmark()
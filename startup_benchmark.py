@@ -0,0 +1,81 @@
+"""Cold-start import cost of the app modules.
+
+Each module is imported in a fresh interpreter so nothing is shared
+between runs. Run from the repository root:
+
+    python startup_benchmark.py [module ...]
+    python startup_benchmark.py --importtime app > startup_report.txt
+
+The second form writes the ``-X importtime`` breakdown that is checked in
+as startup_report.txt; a diff of that file shows which import regressed.
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+
+DEFAULT_MODULES = ["user_data_manager", "app"]
+
+_TIMER = (
+    "import time; start = time.perf_counter(); import {module}; "
+    "print(time.perf_counter() - start)"
+)
+
+
+def measure_import(module: str, runs: int = 5):
+    """Seconds spent importing ``module`` in each of ``runs`` fresh processes"""
+    timings = []
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, "-c", _TIMER.format(module=module)],
+            capture_output=True, text=True
+        )
+        if result.returncode != 0:
+            raise RuntimeError(f"import {module} failed:\n{result.stderr}")
+        timings.append(float(result.stdout.strip().splitlines()[-1]))
+    return timings
+
+
+def importtime_report(module: str, top: int = 25):
+    """Slowest imports (cumulative) from ``python -X importtime -c 'import module'``"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        rows.append((int(cumulative_us), int(self_us), name.strip()))
+    if not rows:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr}")
+
+    rows.sort(reverse=True)
+    lines = [f"-X importtime report for `import {module}`",
+             f"{'cumulative (ms)':>16} {'self (ms)':>10}  module"]
+    lines += [f"{cumulative / 1000:>16.1f} {self_time / 1000:>10.1f}  {name}"
+              for cumulative, self_time, name in rows[:top]]
+    return "\n".join(lines)
+
+
+def run_benchmark(modules=None, runs: int = 5):
+    print(f"{'module':<20} {'median (ms)':>12} {'min (ms)':>10} {'max (ms)':>10}")
+    for module in modules or DEFAULT_MODULES:
+        timings = measure_import(module, runs)
+        print(f"{module:<20} {statistics.median(timings) * 1000:>12.1f} "
+              f"{min(timings) * 1000:>10.1f} {max(timings) * 1000:>10.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("modules", nargs="*", help=f"modules to import (default: {DEFAULT_MODULES})")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--importtime", action="store_true", help="print the -X importtime breakdown")
+    args = parser.parse_args()
+
+    run_benchmark(args.modules or None, args.runs)
+    if args.importtime:
+        for module in args.modules or DEFAULT_MODULES:
+            print()
+            print(importtime_report(module))
@@ -0,0 +1,764 @@
+import bisect
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from typing import Dict, List, Optional, Tuple
+from write_behind import MAX_BATCH_SIZE, WriteBehindQueue, merge_fields
+
+# Same value as firestore.Query.DESCENDING, without importing the SDK here
+DESCENDING = "DESCENDING"
+
+
+def conversation_key(conversation: Dict) -> Tuple[str, str]:
+    """Sort key of a logged conversation; session_id breaks timestamp ties"""
+    return conversation.get('timestamp', ''), conversation.get('session_id', '')
+
+
+def history_digests(history: List, prefix_length: int):
+    """SHA-256 of ``history[:prefix_length]`` and of the whole history, in one pass"""
+    digest = hashlib.sha256()
+    prefix = None
+    for position, (role, content) in enumerate(history):
+        if position == prefix_length:
+            prefix = digest.hexdigest()
+        digest.update(f"{len(role)}:{role}{len(content)}:{content}".encode())
+    full = digest.hexdigest()
+    return prefix or full, full
+
+
+def chat_metadata(chat_id: str, chat: Dict) -> Dict:
+    """The sidebar view of a chat: everything except its history"""
+    metadata = {key: value for key, value in chat.items() if key != "history"}
+    metadata["chat_id"] = chat_id
+    metadata["message_count"] = len(chat.get("history", []))
+    return metadata
+
+
+class StorageBackend:
+    """Interface of the storage engines behind UserDataManager.
+
+    A backend stores three kinds of records per user email:
+
+    * the user document (profile fields, ``save_user``/``load_user``)
+    * the append-only conversation log, ordered by its ISO ``timestamp``
+      and then ``session_id`` (see ``conversation_key``)
+    * chats: ``{"title", "created", "last_updated", "terms", "history"}`` keyed
+      by id; ``list_chats`` returns every field but the history
+
+    Chat histories only ever grow or get cleared, which lets engines that
+    store messages separately write just the new tail on ``save_chat``.
+    """
+
+    name = "base"
+
+    def save_user(self, email: str, user_data: Dict) -> bool:
+        raise NotImplementedError
+
+    def load_user(self, email: str) -> Optional[Dict]:
+        raise NotImplementedError
+
+    def delete_user(self, email: str) -> bool:
+        """Remove the user document, conversation log and chats"""
+        raise NotImplementedError
+
+    def append_conversation(self, email: str, conversation: Dict) -> bool:
+        raise NotImplementedError
+
+    def query_conversations(self, email: str, since: str, before: Optional[Tuple[str, str]] = None,
+                            limit: Optional[int] = None) -> List[Dict]:
+        """Conversations newer than ``since``, the newest ``limit`` of them, oldest first.
+
+        ``before`` is the ``conversation_key`` of a row already seen; only
+        rows that sort before it are returned, so rows sharing its
+        timestamp are neither skipped nor repeated.
+        """
+        raise NotImplementedError
+
+    def compact_conversations(self, email: str, keep: int):
+        """Drop all but the newest ``keep`` conversations"""
+        raise NotImplementedError
+
+    def save_chat(self, email: str, chat_id: str, chat: Dict) -> bool:
+        raise NotImplementedError
+
+    def load_chat(self, email: str, chat_id: str) -> Optional[Dict]:
+        raise NotImplementedError
+
+    def list_chats(self, email: str) -> List[Dict]:
+        """Chat metadata (no histories), most recently updated first"""
+        raise NotImplementedError
+
+    def delete_chat(self, email: str, chat_id: str) -> bool:
+        raise NotImplementedError
+
+    def flush(self) -> int:
+        """Commit buffered writes; returns how many were written"""
+        return 0
+
+    def close(self):
+        self.flush()
+
+
+class JsonFileBackend(StorageBackend):
+    """Files under ``path``, named by the MD5 of the email.
+
+    ``<md5>.json`` is the user document, ``<md5>.conversations.jsonl`` the
+    conversation log, ``<md5>.chats.json`` the chat metadata and
+    ``<md5>.chats/<chat_id>.json`` one file per chat.
+    """
+
+    name = "json"
+
+    def __init__(self, path: str = "user_data"):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+        # email -> ([conversation keys], [byte offsets], (size, mtime)) of the conversation log
+        self._log_index = {}
+
+    def _file(self, email: str, suffix: str) -> str:
+        return os.path.join(self.path, hashlib.md5(email.encode()).hexdigest() + suffix)
+
+    def _lock(self, email: str) -> threading.Lock:
+        with self._locks_guard:
+            return self._locks.setdefault(email, threading.RLock())
+
+    @staticmethod
+    def _write_json(path: str, data):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _file_stat(path: str):
+        """(size, mtime) of ``path``, or None if it does not exist"""
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return stat.st_size, stat.st_mtime_ns
+
+    @staticmethod
+    def _read_json(path: str):
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r') as f:
+            return json.load(f)
+
+    def save_user(self, email: str, user_data: Dict) -> bool:
+        try:
+            with self._lock(email):
+                self._write_json(self._file(email, ".json"), user_data)
+            return True
+        except Exception as e:
+            print(f"Local save error: {e}")
+            return False
+
+    def load_user(self, email: str) -> Optional[Dict]:
+        try:
+            return self._read_json(self._file(email, ".json"))
+        except Exception as e:
+            print(f"Local load error: {e}")
+            return None
+
+    def delete_user(self, email: str) -> bool:
+        try:
+            with self._lock(email):
+                for chat in self.list_chats(email):
+                    self.delete_chat(email, chat["chat_id"])
+                for suffix in (".json", ".conversations.jsonl", ".chats.json"):
+                    if os.path.exists(self._file(email, suffix)):
+                        os.remove(self._file(email, suffix))
+                if os.path.isdir(self._file(email, ".chats")):
+                    os.rmdir(self._file(email, ".chats"))
+                self._log_index.pop(email, None)
+            return True
+        except Exception as e:
+            print(f"Local delete error: {e}")
+            return False
+
+    def append_conversation(self, email: str, conversation: Dict) -> bool:
+        """Append a single JSON line to the user's conversation log"""
+        try:
+            line = (json.dumps(conversation) + "\n").encode()
+            path = self._file(email, ".conversations.jsonl")
+            with self._lock(email):
+                index = self._log_index.pop(email, None)
+                if index is not None and index[2] != self._file_stat(path):
+                    # Another process appended or compacted since the index was built
+                    index = None
+                with open(path, 'a+b') as f:
+                    offset = f.seek(0, os.SEEK_END)
+                    if offset:
+                        f.seek(offset - 1)
+                        if f.read(1) != b"\n":
+                            # Finish a torn line so this record starts on its own
+                            f.write(b"\n")
+                            offset += 1
+                    f.write(line)
+                stat = self._file_stat(path)
+                if index is not None and stat[0] == offset + len(line):
+                    keys, offsets, _ = index
+                    key = conversation_key(conversation)
+                    # Usually the newest key; equal timestamps may sort earlier
+                    position = bisect.bisect_right(keys, key)
+                    keys.insert(position, key)
+                    offsets.insert(position, offset)
+                    self._log_index[email] = (keys, offsets, stat)
+            return True
+        except Exception as e:
+            print(f"Local conversation save error: {e}")
+            return False
+
+    def _get_log_index(self, email: str):
+        """Sorted conversation keys and line offsets of the log; call with the lock held.
+
+        The log is only ever appended to, so file order is timestamp order
+        (ties are sorted by session_id) and the index is built with one
+        scan and then kept up to date by
+        ``append_conversation``. It is rebuilt when the file's size or mtime
+        no longer match, i.e. another process appended or compacted.
+        """
+        path = self._file(email, ".conversations.jsonl")
+        stat = self._file_stat(path)
+        index = self._log_index.get(email)
+        if index is not None and index[2] == stat:
+            return index
+        rows = []
+        if stat is not None:
+            with open(path, 'rb') as f:
+                offset = 0
+                for line in f:
+                    try:
+                        rows.append((conversation_key(json.loads(line)), offset))
+                    except ValueError:
+                        # A torn line from an interrupted write
+                        pass
+                    offset += len(line)
+        rows.sort(key=lambda row: row[0])
+        index = self._log_index[email] = ([key for key, _ in rows], [offset for _, offset in rows], stat)
+        return index
+
+    def query_conversations(self, email: str, since: str, before: Optional[Tuple[str, str]] = None,
+                            limit: Optional[int] = None) -> List[Dict]:
+        with self._lock(email):
+            keys, offsets, _ = self._get_log_index(email)
+            lo = bisect.bisect_right(keys, since, key=lambda key: key[0])
+            hi = bisect.bisect_left(keys, tuple(before)) if before else len(keys)
+            if limit is not None:
+                lo = max(lo, hi - limit)
+            if lo >= hi:
+                return []
+            conversations = []
+            with open(self._file(email, ".conversations.jsonl"), 'rb') as f:
+                # Seek to each indexed row; torn lines between them are skipped
+                for offset in offsets[lo:hi]:
+                    f.seek(offset)
+                    conversations.append(json.loads(f.readline()))
+        return conversations
+
+    def compact_conversations(self, email: str, keep: int):
+        path = self._file(email, ".conversations.jsonl")
+        with self._lock(email):
+            if not os.path.exists(path):
+                return
+            with open(path, 'r') as f:
+                lines = f.readlines()
+            if len(lines) <= keep:
+                return
+            tmp_path = path + ".tmp"
+            with open(tmp_path, 'w') as f:
+                # lines[-0:] would be every line
+                f.writelines(lines[len(lines) - keep:] if keep > 0 else [])
+            os.replace(tmp_path, path)
+            self._log_index.pop(email, None)
+
+    def _chat_file(self, email: str, chat_id: str) -> str:
+        return os.path.join(self._file(email, ".chats"), f"{chat_id}.json")
+
+    def save_chat(self, email: str, chat_id: str, chat: Dict) -> bool:
+        try:
+            with self._lock(email):
+                os.makedirs(self._file(email, ".chats"), exist_ok=True)
+                self._write_json(self._chat_file(email, chat_id), chat)
+                index = self._read_json(self._file(email, ".chats.json")) or {}
+                index[chat_id] = chat_metadata(chat_id, chat)
+                self._write_json(self._file(email, ".chats.json"), index)
+            return True
+        except Exception as e:
+            print(f"Local chat save error: {e}")
+            return False
+
+    def load_chat(self, email: str, chat_id: str) -> Optional[Dict]:
+        try:
+            return self._read_json(self._chat_file(email, chat_id))
+        except Exception as e:
+            print(f"Local chat load error: {e}")
+            return None
+
+    def list_chats(self, email: str) -> List[Dict]:
+        try:
+            index = self._read_json(self._file(email, ".chats.json")) or {}
+        except Exception as e:
+            print(f"Local chat list error: {e}")
+            return []
+        return sorted(index.values(), key=lambda chat: chat.get("last_updated", ""), reverse=True)
+
+    def delete_chat(self, email: str, chat_id: str) -> bool:
+        try:
+            with self._lock(email):
+                if os.path.exists(self._chat_file(email, chat_id)):
+                    os.remove(self._chat_file(email, chat_id))
+                index = self._read_json(self._file(email, ".chats.json")) or {}
+                if index.pop(chat_id, None) is None:
+                    return False
+                self._write_json(self._file(email, ".chats.json"), index)
+            return True
+        except Exception as e:
+            print(f"Local chat delete error: {e}")
+            return False
+
+
+class FirestoreBackend(StorageBackend):
+    """``users/{email}`` documents with ``conversations`` and ``chats`` subcollections.
+
+    A chat document holds the metadata; its turns are documents in a
+    ``messages`` subcollection, so a long chat never nears Firestore's
+    1 MiB document limit. Like SQLiteBackend, the chat document keeps a
+    digest of its stored messages and ``save_chat`` writes only the new
+    ones, rewriting from the start when the history no longer matches.
+
+    User document saves go through a WriteBehindQueue. Every other call
+    falls back to ``fallback`` (local files) when Firestore errors, and
+    while the queue's commits are failing, user saves are written to the
+    fallback as well so they are not only in memory.
+    """
+
+    name = "firestore"
+
+    def __init__(self, db, fallback: Optional[StorageBackend] = None, write_window: float = 0.5):
+        self.db = db
+        self.fallback = fallback
+        self.write_queue = WriteBehindQueue(db, window=write_window)
+
+    def _user_ref(self, email: str):
+        return self.db.collection('users').document(email)
+
+    def save_user(self, email: str, user_data: Dict) -> bool:
+        self.write_queue.put('users', email, user_data)
+        if not self.write_queue.failures:
+            return True
+        # Firestore is rejecting commits; the queue keeps retrying with backoff
+        return self.fallback.save_user(email, user_data) if self.fallback else False
+
+    def load_user(self, email: str) -> Optional[Dict]:
+        # Writes still sitting in the queue take precedence
+        pending = self.write_queue.pending('users', email)
+        try:
+            doc = self._user_ref(email).get()
+            if doc.exists:
+                return merge_fields(doc.to_dict(), pending or {})
+            return pending
+        except Exception as e:
+            print(f"Firebase load error: {e}")
+            return pending or (self.fallback.load_user(email) if self.fallback else None)
+
+    def delete_user(self, email: str) -> bool:
+        self.flush()
+        if self.fallback:
+            self.fallback.delete_user(email)
+        try:
+            for chat in self._user_ref(email).collection('chats').stream():
+                for message in chat.reference.collection('messages').stream():
+                    message.reference.delete()
+            for name in ('conversations', 'chats'):
+                for doc in self._user_ref(email).collection(name).stream():
+                    doc.reference.delete()
+            self._user_ref(email).delete()
+            return True
+        except Exception as e:
+            print(f"Firebase delete error: {e}")
+            return False
+
+    def append_conversation(self, email: str, conversation: Dict) -> bool:
+        try:
+            (self._user_ref(email).collection('conversations')
+             .document(conversation['session_id']).set(conversation))
+            return True
+        except Exception as e:
+            print(f"Firebase conversation save error: {e}")
+            return self.fallback.append_conversation(email, conversation) if self.fallback else False
+
+    def query_conversations(self, email: str, since: str, before: Optional[Tuple[str, str]] = None,
+                            limit: Optional[int] = None) -> List[Dict]:
+        try:
+            query = self._user_ref(email).collection('conversations').where('timestamp', '>', since)
+            if limit is None and not before:
+                query = query.order_by('timestamp').order_by('session_id')
+                return [doc.to_dict() for doc in query.stream()]
+            query = (query.order_by('timestamp', direction=DESCENDING)
+                     .order_by('session_id', direction=DESCENDING))
+            if before:
+                query = query.start_after({'timestamp': before[0], 'session_id': before[1]})
+            if limit is not None:
+                query = query.limit(limit)
+            return [doc.to_dict() for doc in query.stream()][::-1]
+        except Exception as e:
+            print(f"Firebase conversation load error: {e}")
+            return self.fallback.query_conversations(email, since, before, limit) if self.fallback else []
+
+    def compact_conversations(self, email: str, keep: int):
+        try:
+            stale = (self._user_ref(email).collection('conversations')
+                     .order_by('timestamp', direction=DESCENDING)
+                     .offset(keep)
+                     .stream())
+            for doc in stale:
+                doc.reference.delete()
+        except Exception as e:
+            print(f"Firebase compaction error: {e}")
+            if self.fallback:
+                self.fallback.compact_conversations(email, keep)
+
+    def _chat_ref(self, email: str, chat_id: str):
+        return self._user_ref(email).collection('chats').document(chat_id)
+
+    @staticmethod
+    def _message_id(position: int) -> str:
+        # Zero-padded so the ids sort in message order
+        return f"{position:06d}"
+
+    def _commit(self, operations: List[Tuple]):
+        """Run ``(reference, data)`` sets and ``(reference, None)`` deletes in batches"""
+        for start in range(0, len(operations), MAX_BATCH_SIZE):
+            batch = self.db.batch()
+            for reference, data in operations[start:start + MAX_BATCH_SIZE]:
+                if data is None:
+                    batch.delete(reference)
+                else:
+                    batch.set(reference, data)
+            batch.commit()
+
+    def save_chat(self, email: str, chat_id: str, chat: Dict) -> bool:
+        history = chat.get("history", [])
+        reference = self._chat_ref(email, chat_id)
+        try:
+            snapshot = reference.get()
+            stored_chat = snapshot.to_dict() if snapshot.exists else {}
+            # Chats saved with their history inline have no digest and are rewritten
+            stored = stored_chat.get("message_count", 0) if "history_digest" in stored_chat else 0
+            prefix_digest, digest = history_digests(history, stored)
+            stale = 0
+            if stored and (len(history) < stored or stored_chat["history_digest"] != prefix_digest):
+                # The chat was cleared, popped or rewritten; start its messages over
+                stale, stored = stored, 0
+            messages = reference.collection('messages')
+            operations = [(messages.document(self._message_id(position)), None)
+                          for position in range(len(history), stale)]
+            operations += [(messages.document(self._message_id(position)),
+                            {"position": position, "role": role, "content": content})
+                           for position, (role, content) in enumerate(history[stored:], start=stored)]
+            document = {key: value for key, value in chat.items() if key != "history"}
+            document.update(message_count=len(history), history_digest=digest)
+            # The chat document goes last: if a batch fails, its digest still matches what was stored
+            operations.append((reference, document))
+            self._commit(operations)
+            return True
+        except Exception as e:
+            print(f"Firebase chat save error: {e}")
+            return self.fallback.save_chat(email, chat_id, chat) if self.fallback else False
+
+    def load_chat(self, email: str, chat_id: str) -> Optional[Dict]:
+        reference = self._chat_ref(email, chat_id)
+        try:
+            doc = reference.get()
+            if not doc.exists:
+                return None
+            chat = doc.to_dict()
+            if "history" in chat:
+                turns = chat["history"]
+            else:
+                turns = [message.to_dict() for message in
+                         reference.collection('messages').order_by('position').stream()]
+        except Exception as e:
+            print(f"Firebase chat load error: {e}")
+            return self.fallback.load_chat(email, chat_id) if self.fallback else None
+        chat.pop("message_count", None)
+        chat.pop("history_digest", None)
+        chat["history"] = [[turn["role"], turn["content"]] for turn in turns]
+        return chat
+
+    def list_chats(self, email: str) -> List[Dict]:
+        query = (self._user_ref(email).collection('chats')
+                 .select(['title', 'created', 'last_updated', 'message_count', 'terms'])
+                 .order_by('last_updated', direction=DESCENDING))
+        chats = []
+        try:
+            for doc in query.stream():
+                metadata = doc.to_dict()
+                metadata["chat_id"] = doc.id
+                chats.append(metadata)
+        except Exception as e:
+            print(f"Firebase chat list error: {e}")
+            return self.fallback.list_chats(email) if self.fallback else []
+        return chats
+
+    def delete_chat(self, email: str, chat_id: str) -> bool:
+        """True if Firestore or the fallback had the chat"""
+        reference = self._chat_ref(email, chat_id)
+        deleted = False
+        try:
+            # The one read: the message count names the message documents to delete
+            snapshot = reference.get()
+            if snapshot.exists:
+                messages = reference.collection('messages')
+                self._commit([(messages.document(self._message_id(position)), None)
+                              for position in range(snapshot.to_dict().get("message_count", 0))]
+                             + [(reference, None)])
+                deleted = True
+        except Exception as e:
+            print(f"Firebase chat delete error: {e}")
+        if self.fallback and self.fallback.delete_chat(email, chat_id):
+            deleted = True
+        return deleted
+
+    def flush(self) -> int:
+        return self.write_queue.flush()
+
+    def close(self):
+        self.write_queue.close()
+
+
+class SQLiteBackend(StorageBackend):
+    """Single-file SQLite database in WAL mode.
+
+    WAL lets readers on other connections (threads, or other processes on
+    the same node) proceed while a write is in progress. Chats and their
+    messages live in separate indexed tables, so listing chats never reads
+    a message, and saving a chat only inserts its new messages. Each chat
+    row keeps a digest of its stored messages; when the saved history does
+    not start with them (a message was popped or replaced), the chat's
+    messages are rewritten instead.
+    """
+
+    name = "sqlite"
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS users (
+        email TEXT PRIMARY KEY,
+        data TEXT NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS conversations (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        email TEXT NOT NULL,
+        timestamp TEXT NOT NULL,
+        data TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS conversations_by_time ON conversations (email, timestamp);
+    CREATE TABLE IF NOT EXISTS chats (
+        email TEXT NOT NULL,
+        chat_id TEXT NOT NULL,
+        title TEXT,
+        created TEXT,
+        last_updated TEXT,
+        message_count INTEGER NOT NULL DEFAULT 0,
+        extra TEXT,
+        history_digest TEXT,
+        PRIMARY KEY (email, chat_id)
+    );
+    CREATE INDEX IF NOT EXISTS chats_by_update ON chats (email, last_updated);
+    CREATE TABLE IF NOT EXISTS messages (
+        email TEXT NOT NULL,
+        chat_id TEXT NOT NULL,
+        position INTEGER NOT NULL,
+        role TEXT NOT NULL,
+        content TEXT NOT NULL,
+        PRIMARY KEY (email, chat_id, position)
+    );
+    """
+
+    _CHAT_COLUMNS = ("title", "created", "last_updated")
+
+    def __init__(self, path: str = os.path.join("user_data", "asha.db")):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.executescript(self.SCHEMA)
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(chats)")]
+            if "history_digest" not in columns:
+                # Databases created before the digest column; their chats are rewritten on next save
+                conn.execute("ALTER TABLE chats ADD COLUMN history_digest TEXT")
+
+    def _connection(self) -> sqlite3.Connection:
+        """One connection per thread, so readers do not queue behind each other"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def save_user(self, email: str, user_data: Dict) -> bool:
+        try:
+            with self._connection() as conn:
+                conn.execute("INSERT OR REPLACE INTO users (email, data) VALUES (?, ?)",
+                             (email, json.dumps(user_data)))
+            return True
+        except sqlite3.Error as e:
+            print(f"SQLite save error: {e}")
+            return False
+
+    def load_user(self, email: str) -> Optional[Dict]:
+        try:
+            row = self._connection().execute("SELECT data FROM users WHERE email = ?", (email,)).fetchone()
+        except sqlite3.Error as e:
+            print(f"SQLite load error: {e}")
+            return None
+        return json.loads(row[0]) if row else None
+
+    def delete_user(self, email: str) -> bool:
+        try:
+            with self._connection() as conn:
+                for table in ("users", "conversations", "chats", "messages"):
+                    conn.execute(f"DELETE FROM {table} WHERE email = ?", (email,))
+            return True
+        except sqlite3.Error as e:
+            print(f"SQLite delete error: {e}")
+            return False
+
+    def append_conversation(self, email: str, conversation: Dict) -> bool:
+        try:
+            with self._connection() as conn:
+                conn.execute("INSERT INTO conversations (email, timestamp, data) VALUES (?, ?, ?)",
+                             (email, conversation['timestamp'], json.dumps(conversation)))
+            return True
+        except sqlite3.Error as e:
+            print(f"SQLite conversation save error: {e}")
+            return False
+
+    def query_conversations(self, email: str, since: str, before: Optional[Tuple[str, str]] = None,
+                            limit: Optional[int] = None) -> List[Dict]:
+        sql = "SELECT data FROM conversations WHERE email = ? AND timestamp > ?"
+        params = [email, since]
+        session_id = "json_extract(data, '$.session_id')"
+        if before:
+            sql += f" AND (timestamp < ? OR (timestamp = ? AND {session_id} < ?))"
+            params += [before[0], before[0], before[1]]
+        sql += f" ORDER BY timestamp DESC, {session_id} DESC"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        try:
+            rows = self._connection().execute(sql, params).fetchall()
+        except sqlite3.Error as e:
+            print(f"SQLite conversation load error: {e}")
+            return []
+        return [json.loads(row[0]) for row in reversed(rows)]
+
+    def compact_conversations(self, email: str, keep: int):
+        try:
+            with self._connection() as conn:
+                conn.execute(
+                    "DELETE FROM conversations WHERE email = ? AND id NOT IN ("
+                    "SELECT id FROM conversations WHERE email = ? ORDER BY timestamp DESC, id DESC LIMIT ?)",
+                    (email, email, keep)
+                )
+        except sqlite3.Error as e:
+            print(f"SQLite compaction error: {e}")
+
+    def save_chat(self, email: str, chat_id: str, chat: Dict) -> bool:
+        history = chat.get("history", [])
+        extra = {key: value for key, value in chat.items()
+                 if key not in self._CHAT_COLUMNS and key != "history"}
+        try:
+            with self._connection() as conn:
+                row = conn.execute("SELECT message_count, history_digest FROM chats WHERE email = ? AND chat_id = ?",
+                                   (email, chat_id)).fetchone()
+                stored = row[0] if row else 0
+                prefix_digest, digest = history_digests(history, stored)
+                if stored and (len(history) < stored or row[1] != prefix_digest):
+                    # The chat was cleared, popped or rewritten; start its messages over
+                    conn.execute("DELETE FROM messages WHERE email = ? AND chat_id = ?", (email, chat_id))
+                    stored = 0
+                conn.executemany(
+                    "INSERT OR REPLACE INTO messages (email, chat_id, position, role, content) VALUES (?, ?, ?, ?, ?)",
+                    [(email, chat_id, position, role, content)
+                     for position, (role, content) in enumerate(history[stored:], start=stored)]
+                )
+                conn.execute(
+                    "INSERT OR REPLACE INTO chats (email, chat_id, title, created, last_updated, message_count, "
+                    "extra, history_digest) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (email, chat_id, chat.get("title"), chat.get("created"), chat.get("last_updated"),
+                     len(history), json.dumps(extra), digest)
+                )
+            return True
+        except sqlite3.Error as e:
+            print(f"SQLite chat save error: {e}")
+            return False
+
+    def _chat_row_to_dict(self, row) -> Dict:
+        chat = json.loads(row[5]) if row[5] else {}
+        chat.update({"title": row[1], "created": row[2], "last_updated": row[3]})
+        return chat
+
+    def load_chat(self, email: str, chat_id: str) -> Optional[Dict]:
+        try:
+            conn = self._connection()
+            row = conn.execute(
+                "SELECT chat_id, title, created, last_updated, message_count, extra "
+                "FROM chats WHERE email = ? AND chat_id = ?", (email, chat_id)
+            ).fetchone()
+            if row is None:
+                return None
+            messages = conn.execute(
+                "SELECT role, content FROM messages WHERE email = ? AND chat_id = ? ORDER BY position",
+                (email, chat_id)
+            ).fetchall()
+        except sqlite3.Error as e:
+            print(f"SQLite chat load error: {e}")
+            return None
+        chat = self._chat_row_to_dict(row)
+        chat["history"] = [[role, content] for role, content in messages]
+        return chat
+
+    def list_chats(self, email: str) -> List[Dict]:
+        try:
+            rows = self._connection().execute(
+                "SELECT chat_id, title, created, last_updated, message_count, extra "
+                "FROM chats WHERE email = ? ORDER BY last_updated DESC", (email,)
+            ).fetchall()
+        except sqlite3.Error as e:
+            print(f"SQLite chat list error: {e}")
+            return []
+        chats = []
+        for row in rows:
+            metadata = self._chat_row_to_dict(row)
+            metadata["chat_id"] = row[0]
+            metadata["message_count"] = row[4]
+            chats.append(metadata)
+        return chats
+
+    def delete_chat(self, email: str, chat_id: str) -> bool:
+        try:
+            with self._connection() as conn:
+                deleted = conn.execute("DELETE FROM chats WHERE email = ? AND chat_id = ?",
+                                       (email, chat_id)).rowcount
+                conn.execute("DELETE FROM messages WHERE email = ? AND chat_id = ?", (email, chat_id))
+            return bool(deleted)
+        except sqlite3.Error as e:
+            print(f"SQLite chat delete error: {e}")
+            return False
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
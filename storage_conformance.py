@@ -0,0 +1,367 @@
+"""Conformance checks and benchmark shared by every storage backend.
+
+Runs against the JSON-file and SQLite engines in a temporary directory,
+and against FirestoreBackend on the in-memory fake_firestore client (or
+the emulator, when FIRESTORE_EMULATOR_HOST is set):
+
+    python storage_conformance.py            # checks + benchmark
+    python storage_conformance.py --checks   # checks only
+"""
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from fake_firestore import FakeFirestore
+from storage import FirestoreBackend, JsonFileBackend, SQLiteBackend, conversation_key
+
+EMAIL = "conformance@example.com"
+
+
+def _timestamp(minutes_ago: float) -> str:
+    return (datetime.now() - timedelta(minutes=minutes_ago)).isoformat()
+
+
+def check_users(backend):
+    assert backend.load_user(EMAIL) is None
+    assert backend.save_user(EMAIL, {"name": "Asha", "interests": ["Data Science"]})
+    backend.flush()
+    assert backend.load_user(EMAIL) == {"name": "Asha", "interests": ["Data Science"]}
+    assert backend.save_user(EMAIL, {"name": "Asha", "interests": []})
+    assert backend.load_user(EMAIL)["interests"] == []
+
+
+def check_conversation_range(backend):
+    for minute in range(30, 0, -1):
+        backend.append_conversation(EMAIL, {"timestamp": _timestamp(minute), "session_id": f"s{minute}",
+                                            "user": f"question {minute}"})
+    recent = backend.query_conversations(EMAIL, _timestamp(10.5))
+    assert [c["user"] for c in recent] == [f"question {m}" for m in range(10, 0, -1)], recent
+    assert backend.query_conversations(EMAIL, _timestamp(0)) == []
+
+
+def check_conversation_paging(backend):
+    since = _timestamp(60)
+    first = backend.query_conversations(EMAIL, since, limit=4)
+    assert [c["user"] for c in first] == ["question 4", "question 3", "question 2", "question 1"]
+    second = backend.query_conversations(EMAIL, since, before=conversation_key(first[0]), limit=4)
+    assert [c["user"] for c in second] == ["question 8", "question 7", "question 6", "question 5"]
+
+    # Rows saved in the same instant straddle a page boundary
+    email, instant = "ties@example.com", _timestamp(1)
+    for session in "cadbe":
+        backend.append_conversation(email, {"timestamp": instant, "session_id": session, "user": session})
+    seen, cursor = [], None
+    while True:
+        page = backend.query_conversations(email, since, before=cursor, limit=2)
+        seen = [c["user"] for c in page] + seen
+        if len(page) < 2:
+            break
+        cursor = conversation_key(page[0])
+    assert seen == list("abcde"), seen
+    backend.delete_user(email)
+
+
+def check_compaction(backend):
+    backend.compact_conversations(EMAIL, keep=5)
+    remaining = backend.query_conversations(EMAIL, _timestamp(60))
+    assert [c["user"] for c in remaining] == [f"question {m}" for m in range(5, 0, -1)], remaining
+    backend.append_conversation(EMAIL, {"timestamp": _timestamp(0), "session_id": "new", "user": "new"})
+    assert backend.query_conversations(EMAIL, _timestamp(60))[-1]["user"] == "new"
+    backend.compact_conversations(EMAIL, keep=0)
+    assert backend.query_conversations(EMAIL, _timestamp(60)) == []
+
+
+def check_chats(backend):
+    chat = {"title": "Salary tips", "created": _timestamp(5), "last_updated": _timestamp(5),
+            "terms": ["do", "how", "i", "know", "negotiate", "worth", "your"],
+            "history": [["user", "How do I negotiate?"], ["assistant", "Know your worth!"]]}
+    assert backend.save_chat(EMAIL, "chat-1", chat)
+    newer = dict(chat, title="Resume help", last_updated=_timestamp(1), history=[["user", "Resume?"]])
+    assert backend.save_chat(EMAIL, "chat-2", newer)
+    assert backend.load_chat(EMAIL, "chat-1") == chat
+
+    listed = backend.list_chats(EMAIL)
+    assert [c["chat_id"] for c in listed] == ["chat-2", "chat-1"]
+    assert listed[1]["message_count"] == 2 and "history" not in listed[1]
+    assert listed[1]["terms"] == chat["terms"]
+
+    chat["history"].append(["user", "Thanks!"])
+    backend.save_chat(EMAIL, "chat-1", chat)
+    assert backend.load_chat(EMAIL, "chat-1")["history"][-1] == ["user", "Thanks!"]
+    # A popped message replaced by another of the same length
+    chat["history"][-1] = ["user", "Thanks?"]
+    backend.save_chat(EMAIL, "chat-1", chat)
+    assert backend.load_chat(EMAIL, "chat-1")["history"][-1] == ["user", "Thanks?"]
+    # A shorter history that is not a prefix of the stored one
+    backend.save_chat(EMAIL, "chat-1", dict(chat, history=[["user", "Start over"], ["assistant", "Sure"]]))
+    assert backend.load_chat(EMAIL, "chat-1")["history"] == [["user", "Start over"], ["assistant", "Sure"]]
+    backend.save_chat(EMAIL, "chat-1", dict(chat, history=[]))
+    assert backend.load_chat(EMAIL, "chat-1")["history"] == []
+
+    assert backend.delete_chat(EMAIL, "chat-2")
+    assert not backend.delete_chat(EMAIL, "chat-2")
+    assert backend.load_chat(EMAIL, "chat-2") is None
+
+
+def check_delete_user(backend):
+    assert backend.delete_user(EMAIL)
+    assert backend.load_user(EMAIL) is None
+    assert backend.list_chats(EMAIL) == []
+    assert backend.query_conversations(EMAIL, _timestamp(60)) == []
+
+
+CHECKS = [check_users, check_conversation_range, check_conversation_paging,
+          check_compaction, check_chats, check_delete_user]
+
+
+def check_firestore_outage(directory) -> bool:
+    """Every FirestoreBackend call falls back to local files while Firestore is down"""
+    db = FakeFirestore()
+    # A long window keeps the background thread from committing while the check runs
+    backend = FirestoreBackend(db, fallback=JsonFileBackend(os.path.join(directory, "outage")), write_window=5)
+    chat = {"title": "Salary tips", "created": _timestamp(5), "last_updated": _timestamp(5),
+            "history": [["user", "How do I negotiate?"]]}
+    try:
+        db.down = True
+        assert backend.save_chat(EMAIL, "chat-1", chat)
+        assert backend.load_chat(EMAIL, "chat-1") == chat
+        assert [c["chat_id"] for c in backend.list_chats(EMAIL)] == ["chat-1"]
+        backend.compact_conversations(EMAIL, 5)
+        # Only the fallback had it, which still counts as deleted
+        assert backend.delete_chat(EMAIL, "chat-1")
+        assert not backend.delete_chat(EMAIL, "chat-1")
+
+        backend.save_user(EMAIL, {"name": "Asha"})
+        assert backend.flush() == 0 and backend.write_queue.failures == 1
+        assert backend.write_queue.delay() >= backend.write_queue.window
+        # While commits fail, a user save is also written locally and reports that result
+        assert backend.save_user(EMAIL, {"name": "Asha", "career_stage": "Returning"})
+        assert backend.load_user(EMAIL)["career_stage"] == "Returning"
+
+        db.down = False
+        assert backend.flush() == 1 and backend.write_queue.failures == 0
+        assert db.collection("users").document(EMAIL).get().to_dict()["career_stage"] == "Returning"
+        print(f"  PASS {'firestore (fake)':<22} check_firestore_outage")
+        return True
+    except AssertionError as e:
+        print(f"  FAIL {'firestore (fake)':<22} check_firestore_outage: {e}")
+        return False
+    finally:
+        backend.close()
+
+
+def check_firestore_messages() -> bool:
+    """Chat turns are message documents, and a save writes only the new ones"""
+    db = FakeFirestore()
+    backend = FirestoreBackend(db, write_window=5)
+    chat_ref = db.collection("users").document(EMAIL).collection("chats").document("chat-1")
+    history = [["user", f"question {turn}"] for turn in range(10)]
+    chat = {"title": "Salary tips", "created": _timestamp(5), "last_updated": _timestamp(5), "history": history}
+    try:
+        backend.save_chat(EMAIL, "chat-1", chat)
+        assert "history" not in chat_ref.get().to_dict()
+        writes = db.writes
+        history.append(["assistant", "answer"])
+        backend.save_chat(EMAIL, "chat-1", chat)
+        # The new message and the chat document
+        assert db.writes - writes == 2, db.writes - writes
+        backend.save_chat(EMAIL, "chat-1", dict(chat, history=history[:3]))
+        assert len(list(chat_ref.collection("messages").stream())) == 3
+        assert backend.load_chat(EMAIL, "chat-1")["history"] == history[:3]
+
+        # A chat saved before messages moved to the subcollection
+        chat_ref.set(dict(chat, message_count=1, history=[{"role": "user", "content": "Hi"}]))
+        assert backend.load_chat(EMAIL, "chat-1")["history"] == [["user", "Hi"]]
+        backend.save_chat(EMAIL, "chat-1", chat)
+        assert backend.load_chat(EMAIL, "chat-1") == chat
+
+        round_trips = db.round_trips
+        assert backend.delete_chat(EMAIL, "chat-1")
+        # One get for the message count, one batch for the chat and its messages
+        assert db.round_trips - round_trips == 2, db.round_trips - round_trips
+        assert list(chat_ref.collection("messages").stream()) == []
+        print(f"  PASS {'firestore (fake)':<22} check_firestore_messages")
+        return True
+    except AssertionError as e:
+        print(f"  FAIL {'firestore (fake)':<22} check_firestore_messages: {e}")
+        return False
+    finally:
+        backend.close()
+
+
+def check_sqlite_errors(directory) -> bool:
+    """A locked database or closed connection fails the call instead of raising"""
+    path = os.path.join(directory, "locked.db")
+    backend = SQLiteBackend(path)
+    chat = {"title": "Salary tips", "created": _timestamp(5), "last_updated": _timestamp(5),
+            "history": [["user", "How do I negotiate?"]]}
+    writer = sqlite3.connect(path)
+    try:
+        assert backend.save_chat(EMAIL, "chat-1", chat)
+        # Another writer holds the lock; don't wait the default 10 s for it
+        backend._connection().execute("PRAGMA busy_timeout = 50")
+        writer.execute("BEGIN EXCLUSIVE")
+        assert not backend.save_user(EMAIL, {"name": "Asha"})
+        assert not backend.append_conversation(EMAIL, {"timestamp": _timestamp(0), "session_id": "s1"})
+        assert not backend.save_chat(EMAIL, "chat-1", dict(chat, history=chat["history"] * 2))
+        backend.compact_conversations(EMAIL, 5)
+        assert not backend.delete_chat(EMAIL, "chat-1")
+        assert not backend.delete_user(EMAIL)
+        writer.rollback()
+        assert backend.load_chat(EMAIL, "chat-1") == chat
+        assert backend.save_user(EMAIL, {"name": "Asha"})
+
+        backend._connection().close()
+        assert backend.load_user(EMAIL) is None
+        assert backend.load_chat(EMAIL, "chat-1") is None
+        assert backend.list_chats(EMAIL) == []
+        assert backend.query_conversations(EMAIL, _timestamp(60)) == []
+        assert not backend.save_user(EMAIL, {"name": "Asha"})
+        print(f"  PASS {'sqlite':<22} check_sqlite_errors")
+        return True
+    except (AssertionError, sqlite3.Error) as e:
+        print(f"  FAIL {'sqlite':<22} check_sqlite_errors: {type(e).__name__}: {e}")
+        return False
+    finally:
+        writer.close()
+        backend.close()
+
+
+def check_json_log_recovery(directory) -> bool:
+    """Torn lines in the conversation log and appends from another process"""
+    path = os.path.join(directory, "torn")
+    backend, other = JsonFileBackend(path), JsonFileBackend(path)
+    log = backend._file(EMAIL, ".conversations.jsonl")
+    try:
+        backend.append_conversation(EMAIL, {"timestamp": _timestamp(3), "session_id": "s3", "user": "q3"})
+        with open(log, 'ab') as f:
+            # An interrupted write: no closing brace, no newline
+            f.write(b'{"timestamp": "')
+        backend.append_conversation(EMAIL, {"timestamp": _timestamp(2), "session_id": "s2", "user": "q2"})
+        assert [c["user"] for c in backend.query_conversations(EMAIL, _timestamp(60))] == ["q3", "q2"]
+        # A second process appends and compacts behind this one's cached index
+        other.append_conversation(EMAIL, {"timestamp": _timestamp(1), "session_id": "s1", "user": "q1"})
+        assert [c["user"] for c in backend.query_conversations(EMAIL, _timestamp(60))] == ["q3", "q2", "q1"]
+        other.compact_conversations(EMAIL, keep=1)
+        assert [c["user"] for c in backend.query_conversations(EMAIL, _timestamp(60))] == ["q1"]
+        print(f"  PASS {'json':<22} check_json_log_recovery")
+        return True
+    except (AssertionError, ValueError) as e:
+        print(f"  FAIL {'json':<22} check_json_log_recovery: {type(e).__name__}: {e}")
+        return False
+
+
+def check_json_errors(directory) -> bool:
+    """A corrupt chat index fails the call instead of raising"""
+    backend = JsonFileBackend(os.path.join(directory, "corrupt"))
+    try:
+        with open(backend._file(EMAIL, ".chats.json"), 'w') as f:
+            f.write('{"chat-1": {"title": ')
+        assert backend.list_chats(EMAIL) == []
+        assert not backend.delete_chat(EMAIL, "chat-1")
+        # The user's files, corrupt index included, still go
+        assert backend.delete_user(EMAIL)
+        assert not os.path.exists(backend._file(EMAIL, ".chats.json"))
+        print(f"  PASS {'json':<22} check_json_errors")
+        return True
+    except (AssertionError, ValueError) as e:
+        print(f"  FAIL {'json':<22} check_json_errors: {type(e).__name__}: {e}")
+        return False
+
+
+def backend_factories(directory):
+    factories = {
+        "json": lambda: JsonFileBackend(os.path.join(directory, "json")),
+        "sqlite": lambda: SQLiteBackend(os.path.join(directory, "asha.db")),
+    }
+    if os.getenv("FIRESTORE_EMULATOR_HOST"):
+        from google.cloud import firestore as cloud_firestore
+        factories["firestore (emulator)"] = lambda: FirestoreBackend(
+            cloud_firestore.Client(project="asha-conformance"), write_window=0.01)
+    else:
+        factories["firestore (fake)"] = lambda: FirestoreBackend(FakeFirestore(), write_window=0.01)
+    return factories
+
+
+def run_checks(factories) -> bool:
+    ok = True
+    for name, factory in factories.items():
+        backend = factory()
+        for check in CHECKS:
+            try:
+                check(backend)
+                print(f"  PASS {name:<22} {check.__name__}")
+            except AssertionError as e:
+                ok = False
+                print(f"  FAIL {name:<22} {check.__name__}: {e}")
+        backend.close()
+    return ok
+
+
+def run_benchmark(factories, users: int = 20, chats: int = 5, turns: int = 20):
+    """Per-operation latency of the calls the app makes on every message"""
+    print(f"\n{'backend':<22} {'append conv':>12} {'save chat':>10} {'list chats':>11} "
+          f"{'load chat':>10} {'last 7 days':>12}  (ms/op)")
+    for name, factory in factories.items():
+        backend = factory()
+        emails = [f"bench{user}@example.com" for user in range(users)]
+        timings = {}
+
+        start = time.perf_counter()
+        for turn in range(turns):
+            for email in emails:
+                backend.append_conversation(email, {"timestamp": datetime.now().isoformat(),
+                                                    "session_id": f"{email}-{turn}",
+                                                    "user": "question " * 20, "asha": "answer " * 100})
+        timings["append"] = (time.perf_counter() - start) / (turns * users)
+
+        start = time.perf_counter()
+        for email in emails:
+            for chat in range(chats):
+                history = []
+                for turn in range(turns):
+                    history += [["user", "question " * 20], ["assistant", "answer " * 100]]
+                    backend.save_chat(email, f"chat-{chat}", {"title": f"Chat {chat}", "created": "",
+                                                              "last_updated": datetime.now().isoformat(),
+                                                              "history": history})
+        timings["save_chat"] = (time.perf_counter() - start) / (users * chats * turns)
+
+        start = time.perf_counter()
+        for email in emails:
+            backend.list_chats(email)
+        timings["list"] = (time.perf_counter() - start) / users
+
+        start = time.perf_counter()
+        for email in emails:
+            backend.load_chat(email, "chat-0")
+        timings["load"] = (time.perf_counter() - start) / users
+
+        since = (datetime.now() - timedelta(days=7)).isoformat()
+        start = time.perf_counter()
+        for email in emails:
+            backend.query_conversations(email, since)
+        timings["query"] = (time.perf_counter() - start) / users
+
+        backend.close()
+        print(f"{name:<22} {timings['append'] * 1000:>12.3f} {timings['save_chat'] * 1000:>10.3f} "
+              f"{timings['list'] * 1000:>11.3f} {timings['load'] * 1000:>10.3f} "
+              f"{timings['query'] * 1000:>12.3f}")
+
+
+if __name__ == "__main__":
+    directory = tempfile.mkdtemp(prefix="asha-storage-")
+    try:
+        passed = run_checks(backend_factories(os.path.join(directory, "checks")))
+        passed = check_firestore_outage(directory) and passed
+        passed = check_firestore_messages() and passed
+        passed = check_sqlite_errors(directory) and passed
+        passed = check_json_log_recovery(directory) and passed
+        passed = check_json_errors(directory) and passed
+        if "--checks" not in sys.argv:
+            run_benchmark(backend_factories(os.path.join(directory, "bench")))
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    sys.exit(0 if passed else 1)
@@ -1,69 +1,39 @@
-import os
-import google.generativeai as genai
 from dotenv import load_dotenv
-from knowledgebase import asha_topics
+from topic_matcher import asha_matcher
+from retrieval import knowledge_index
+from response_cache import response_cache, standalone_key
+from context_builder import context_builder, count_tokens
+from guardrails import GUARDRAIL, NONSENSE, SENSITIVE, guardrails
+from intent_classifier import intent_classifier
+from career_catalog import career_catalog
+from gemini_client import GeminiPool, get_model
+from metrics import metrics
+from resilience import CircuitOpenError, RateLimitedError, counts_as_failure, status_code
 import re
+import time
 
 load_dotenv()
 
-api_key = os.getenv("API_KEY")
-if not api_key:
-    raise ValueError("❌ API Key not found. Please create a .env file with API_KEY=your_key")
-
-# --- Initialize Gemini Client with better error handling ---
-try:
-    genai.configure(api_key=api_key)
-    model = genai.GenerativeModel("gemini-1.5-flash")
-    test_response = model.generate_content("Hello")
-    print("✅ Gemini API connection successful")
-except Exception as e:
-    print(f"❌ Failed to initialize Gemini API: {str(e)}")
-    raise
-
-SENSITIVE_KEYWORDS = [
-    "women are superior", "men are inferior", "gender superiority", "gender war",
-    "feminist extremism", "hate men", "gender bias", "political debate",
-    "controversial gender", "gender discrimination arguments"
-]
+# Shared by every session in this process; bounds concurrent Gemini calls.
+# The model is built on the first request, so importing this module costs
+# no network round-trip (see gemini_client.check_health for a probe).
+gemini_pool = GeminiPool(get_model)
+metrics.add_collector("asha_gemini", gemini_pool.stats)
+metrics.add_collector("asha_response_cache", response_cache.stats)
+# The fixed template is about half the context budget, so a prompt within
+# budget lands near 1.5-2x it; the upper buckets show overruns
+metrics.add_histogram("asha_prompt_tokens",
+                      [int(context_builder.budget * m) for m in (0.5, 1, 1.5, 2, 2.5, 3, 4, 6)])
 
-INAPPROPRIATE_TOPICS = [
-    "dating advice", "relationship problems", "personal relationships",
-    "political opinions", "religious debates", "controversial social issues"
-]
+# Blocked phrases and patterns are rules in guardrails.json
+GUARDRAIL_REPLY = "⚠️ I'm here to support your career journey. Let's keep our conversation respectful and professional. 💜"
 
-def handle_user_input(user_message: str) -> str:
-    message_lower = user_message.lower()
-    guardrail_phrases = [
-        "are you single", "<script>", "aadhar", "social security", "joke about women", 
-        "illegal advice", "why don’t women code", "who makes better leaders"
-    ]
-    if any(phrase in message_lower for phrase in guardrail_phrases):
-        return "⚠️ I'm here to support your career journey. Let's keep our conversation respectful and professional. 💜"
-    return None
-
-def is_sensitive_content(query):
-    query_lower = query.lower()
-    for keyword in SENSITIVE_KEYWORDS + INAPPROPRIATE_TOPICS:
-        if keyword in query_lower:
-            return True
-    extreme_patterns = [
-        r"women are (the )?best",
-        r"men are (the )?worst",
-        r"only women (can|should)",
-        r"men can't",
-        r"gender superiority"
-    ]
-    for pattern in extreme_patterns:
-        if re.search(pattern, query_lower):
-            return True
-    return False
-
-def is_nonsense_input(text):
-    if not text or len(text.strip()) < 3:
-        return True
-    if re.fullmatch(r"[\W_]+", text):
-        return True
-    return False
+SAFETY_SETTINGS = [
+    {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_HIGH_AND_ABOVE"},
+    {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_HIGH_AND_ABOVE"},
+    {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "BLOCK_HIGH_AND_ABOVE"},
+    {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_HIGH_AND_ABOVE"}
+]
 
 def generate_sensitive_content_response():
     return ("I'm Asha AI, your career guidance assistant! 💼\n\n"
@@ -77,25 +47,15 @@ def generate_sensitive_content_response():
             "Let me help you with your professional journey instead! What career goals can I support you with today? 🚀")
 
 def is_topic_found(query):
-    query_lower = query.lower()
-    for keyword in asha_topics:
-        if keyword in query_lower:
-            return asha_topics[keyword]
-    return None
+    return asha_matcher.find(query)
 
 def detect_career_intent(query, context):
-    query_lower = query.lower()
-    if any(word in query_lower for word in ["resume", "cv", "curriculum vitae", "build resume"]):
-        return "resume_building"
-    if any(word in query_lower for word in ["learn", "roadmap", "path", "how to start", "career change"]):
-        return "roadmap"
-    if any(word in query_lower for word in ["job", "opportunity", "hiring", "career", "work", "employment"]):
-        return "job_search"
-    if any(word in query_lower for word in ["scholarship", "funding", "grant", "financial aid"]):
-        return "scholarship"
-    return None
-
-def base_prompt(context_text, user_input):
+    """resume_building, roadmap, job_search, scholarship or None (see intent_classifier)"""
+    return intent_classifier.predict(query, context)
+
+def base_prompt(context_text, user_input, reference_text=None):
+    reference_block = (f"📚 REFERENCE (adapt this to the user's background; don't just repeat it):\n"
+                       f"{reference_text}\n\n" if reference_text else "")
     return f"""You are Asha AI — a warm, supportive, and intelligent career mentor focused on helping women succeed professionally.
 
 Your goal is to provide **friendly, encouraging, and practical** guidance that feels like it's coming from a helpful older sister or coach, NOT a formal chatbot.
@@ -118,113 +78,225 @@ Your goal is to provide **friendly, encouraging, and practical** guidance that f
 👥 CONVERSATION CONTEXT:
 {context_text}
 
-👩‍💻 USER QUESTION:
+{reference_block}👩‍💻 USER QUESTION:
 {user_input}
 
 🧠 YOUR TASK:
 Respond like a real mentor who deeply cares about the user's career growth. Be warm, smart, and real. Avoid overly formal or scripted responses."""
 
-def create_contextual_prompt(user_input, conversation_context):
-    context_text = "\n".join(
-        f"User: {msg['user']}\nAsha: {msg['asha']}" for msg in conversation_context[-3:]
-    ) if conversation_context else "No prior conversation."
-    return base_prompt(context_text, user_input)
+def create_contextual_prompt(user_input, conversation_context, chat_key=None, reference=None):
+    """Prompt with the conversation fitted to the context token budget"""
+    context = context_builder.build(conversation_context, chat_key)
+    return base_prompt(context.text, user_input, reference)
 
-def ask_gemini(user_input, conversation_context=None):
-    if is_nonsense_input(user_input):
+def profile_context(profile):
+    """Context for a standalone question: who is asking instead of what was said"""
+    details = [f"Career stage: {profile['career_stage']}" if profile.get("career_stage") else "",
+               f"Interests: {', '.join(profile['interests'])}" if profile.get("interests") else ""]
+    return "\n".join(["Standalone question; no prior conversation."] + [d for d in details if d])
+
+RESPONSE_CHAR_BUDGET = 800
+RESPONSE_HARD_LIMIT = 1200
+FOLLOW_UP_SUFFIX = "\n\n💡 Would you like me to elaborate on any specific point?"
+
+_SENTENCE_END = re.compile(r"[.!?](\s|$)")
+
+def get_local_reply(user_input):
+    """Canned or knowledge base reply for input that never needs Gemini"""
+    with metrics.span("guardrails"):
+        verdict = guardrails.check(user_input)
+    if not verdict.allowed:
+        metrics.incr("asha_guardrail_blocks_total", action=verdict.action)
+    if verdict.action == NONSENSE:
         return "🤔 I didn’t quite understand that. Could you ask me something about your career journey?"
-    if not user_input.strip() or re.fullmatch(r"[\W_]+", user_input):
-        return "🙋‍♀️ I didn’t quite catch that. Could you please ask a career-related question?"
-    if is_sensitive_content(user_input):
+    if verdict.action == GUARDRAIL:
+        return GUARDRAIL_REPLY
+    if verdict.action == SENSITIVE:
         return generate_sensitive_content_response()
 
-    contextual_prompt = create_contextual_prompt(user_input, conversation_context or [])
-    if contextual_prompt is None:
-        return generate_sensitive_content_response()
+    # A message naming a knowledge base topic gets its answer, as before the
+    # index existed; paraphrased FAQ questions are answered from the index.
+    # Neither needs a Gemini round-trip.
+    with metrics.span("kb_lookup"):
+        answer = asha_matcher.find(user_input) or knowledge_index.answer(user_input)
+    if answer:
+        metrics.incr("asha_kb_hits_total")
+    return answer
 
-    try:
-        safety_settings = [
-            {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_HIGH_AND_ABOVE"},
-            {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_HIGH_AND_ABOVE"},
-            {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "BLOCK_HIGH_AND_ABOVE"},
-            {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_HIGH_AND_ABOVE"}
-        ]
+SCHOLARSHIP_REPLY = """🎓 Great that you're looking into funding! A few programs worth checking out:
 
-        response = model.generate_content(contextual_prompt, safety_settings=safety_settings)
-        if not hasattr(response, "candidates") or not response.candidates:
-            fallback = is_topic_found(user_input)
-            return fallback if fallback else "🤖 I didn’t get a valid response. Could you try rephrasing your question?"
+• **AICTE Pragati Scholarship** – for girls in AICTE-approved technical degree and diploma courses
+• **UGC PG Indira Gandhi Scholarship for Single Girl Child** – for postgraduate studies
+• **Generation Google Scholarship** – for women studying computer science
+• **L'Oréal-UNESCO For Women in Science** – fellowships for women researchers
+• **HerKey** and **JobsForHer** – list women-focused fellowships, returnships and upskilling programs
 
-        # ✅ Use the `.text` attribute directly (Gemini Flash models return `text`)
-        response_text = response.text.strip()
+Eligibility and deadlines change every year, so always confirm on the official website before applying. 💜"""
 
-        # ✂️ Trim long responses
-        if len(response_text) > 800:
-            sentences = response_text.split('. ')
-            if len(sentences) > 4:
-                response_text = '. '.join(sentences[:4]) + ".\n\n💡 Would you like me to elaborate on any specific point?"
+def get_intent_reply(user_input, intent):
+    """Template or catalog reply for intents that do not need Gemini, else None"""
+    if intent == "scholarship":
+        # A loose scholarship guess ("funding for my startup") goes to Gemini
+        if intent_classifier.template_intent(user_input) == "scholarship":
+            return SCHOLARSHIP_REPLY + FOLLOW_UP_SUFFIX
+        return None
+    # Someone describing their own background gets a personalized Gemini
+    # answer instead, with the catalog entry as reference (see ask_gemini_stream)
+    if career_catalog.needs_personalization(user_input):
+        return None
+    reply = career_catalog.answer(user_input, intent)
+    return reply + FOLLOW_UP_SUFFIX if reply else None
 
-        return response_text
+OFFLINE_PREFIX = "📡 I can't reach my AI engine right now, so here's what I know from my knowledge base:\n\n"
 
-    except Exception as e:
-        error_msg = str(e).lower()
-        if "403" in error_msg or "forbidden" in error_msg:
-            return "🔑 API access issue. Please check your API key or permissions."
-        elif "quota" in error_msg:
-            return "📊 Looks like your usage quota is exceeded. Try again later or check your plan."
-        elif "safety" in error_msg:
-            return "⚠️ That content might be flagged as unsafe. Let's focus on career questions!"
+def get_offline_reply(user_input):
+    """Closest knowledge base answer while Gemini is unavailable, or None"""
+    # Unlike get_local_reply there is no similarity threshold: a loose
+    # match is still more useful than an error message
+    results = knowledge_index.search(user_input)
+    answer = knowledge_index.corpus[results[0][0]] if results else is_topic_found(user_input)
+    return OFFLINE_PREFIX + answer if answer else None
+
+def get_error_reply(error):
+    error_msg = str(error).lower()
+    code = status_code(error)
+    if isinstance(error, CircuitOpenError):
+        return "📡 I'm having trouble reaching my AI engine right now. Please try again in a minute. 💜"
+    if isinstance(error, RateLimitedError):
+        return "⏳ I'm getting a lot of questions right now. Please try again in a minute. 💜"
+    if code == 403 or "403" in error_msg or "forbidden" in error_msg:
+        return "🔑 API access issue. Please check your API key or permissions."
+    elif code == 429 or "quota" in error_msg:
+        return "📊 Looks like your usage quota is exceeded. Try again later or check your plan."
+    elif "safety" in error_msg:
+        return "⚠️ That content might be flagged as unsafe. Let's focus on career questions!"
+    else:
+        return "⚙️ Something went wrong on my side. Please try again or rephrase your question."
+
+def iter_response_text(response):
+    """Text of each streamed chunk, skipping chunks without usable candidates"""
+    for chunk in response:
+        if not getattr(chunk, "candidates", None):
+            continue
+        try:
+            text = chunk.text
+        except ValueError:
+            # Raised for chunks that were blocked or carry no text parts
+            continue
+        if text:
+            yield text
+
+def limit_to_budget(chunks, budget=RESPONSE_CHAR_BUDGET, hard_limit=RESPONSE_HARD_LIMIT):
+    """Pass chunks through until ``budget`` characters, then stop at the next sentence end.
+
+    Stopping the iteration stops reading from the stream, so tokens past
+    the budget are never waited for.
+    """
+    emitted = 0
+    for text in chunks:
+        if emitted + len(text) > budget:
+            sentence_end = _SENTENCE_END.search(text, max(0, budget - emitted))
+            if sentence_end:
+                yield text[:sentence_end.start() + 1] + FOLLOW_UP_SUFFIX
+                return
+            if emitted + len(text) > hard_limit:
+                yield text[:hard_limit - emitted] + "…" + FOLLOW_UP_SUFFIX
+                return
+        emitted += len(text)
+        yield text
+
+def ask_gemini_stream(user_input, conversation_context=None, chat_key=None, profile=None):
+    """Yield Asha's reply in chunks as Gemini generates it.
+
+    ``chat_key`` identifies the chat so its context summary is reused.
+    Quick actions pass the user's ``profile`` instead: the conversation is
+    left out and the reply is cached per normalized question and profile,
+    so the same quick action hits the cache from any chat.
+    """
+    if profile is not None:
+        conversation_context = None
+    local_reply = get_local_reply(user_input)
+    if local_reply:
+        metrics.incr("asha_messages_total", source="local")
+        yield local_reply
+        return
+
+    with metrics.span("intent"):
+        intent = detect_career_intent(user_input, conversation_context)
+        intent_reply = get_intent_reply(user_input, intent)
+    if intent_reply:
+        metrics.incr("asha_messages_total", source="intent")
+        yield intent_reply
+        return
+
+    with metrics.span("prompt_build"):
+        reference = career_catalog.answer(user_input, intent)
+        if profile is not None:
+            contextual_prompt = base_prompt(profile_context(profile), user_input, reference)
+            cache_text = standalone_key(user_input, profile)
         else:
-            return "⚙️ Something went wrong on my side. Please try again or rephrase your question."
+            contextual_prompt = create_contextual_prompt(user_input, conversation_context or [], chat_key, reference)
+            cache_text = contextual_prompt
+    if contextual_prompt is None:
+        yield generate_sensitive_content_response()
+        return
+
+    with metrics.span("cache_lookup"):
+        cached_response = response_cache.get(cache_text, SAFETY_SETTINGS)
+    if cached_response:
+        metrics.incr("asha_cache_hits_total")
+        metrics.incr("asha_messages_total", source="cache")
+        yield cached_response
+        return
+
+    parts = []
+    metrics.incr("asha_llm_calls_total")
+    prompt_tokens = count_tokens(contextual_prompt)
+    metrics.incr("asha_prompt_tokens_total", prompt_tokens)
+    metrics.record("asha_prompt_tokens", prompt_tokens)
+    started = time.perf_counter()
+    try:
+        response = gemini_pool.stream(contextual_prompt, SAFETY_SETTINGS)
+        for text in limit_to_budget(iter_response_text(response)):
+            if not parts:
+                text = text.lstrip()
+                metrics.observe("llm_first_chunk", time.perf_counter() - started)
+            parts.append(text)
+            yield text
+    except Exception as e:
+        metrics.observe("llm", time.perf_counter() - started)
+        metrics.incr("asha_errors_total", type=type(e).__name__)
+        # Retries are already spent (see resilience.py); answer from the
+        # knowledge base when nothing has been shown yet
+        unavailable = isinstance(e, (CircuitOpenError, RateLimitedError)) or counts_as_failure(e)
+        offline_reply = get_offline_reply(user_input) if unavailable and not parts else None
+        metrics.incr("asha_messages_total", source="offline" if offline_reply else "error")
+        yield offline_reply or ("\n\n" if parts else "") + get_error_reply(e)
+        return
+
+    metrics.observe("llm", time.perf_counter() - started)
+    if not parts:
+        metrics.incr("asha_messages_total", source="empty")
+        fallback = is_topic_found(user_input)
+        yield fallback if fallback else "🤖 I didn’t get a valid response. Could you try rephrasing your question?"
+        return
+
+    reply = "".join(parts).strip()
+    metrics.incr("asha_messages_total", source="llm")
+    metrics.incr("asha_response_tokens_total", count_tokens(reply))
+    response_cache.set(cache_text, reply, SAFETY_SETTINGS)
+
+def ask_gemini(user_input, conversation_context=None, chat_key=None, profile=None):
+    return "".join(ask_gemini_stream(user_input, conversation_context, chat_key, profile)).strip()
 
 def get_career_suggestions(field=None):
-    tech_careers = [
-        "Software Developer", "Data Scientist", "UI/UX Designer", "Product Manager",
-        "Cybersecurity Analyst", "DevOps Engineer", "AI/ML Engineer", "Quality Assurance Engineer"
-    ]
-    non_tech_careers = [
-        "Digital Marketing Manager", "Content Writer", "HR Business Partner", "Financial Analyst",
-        "Project Manager", "Business Analyst", "Sales Manager", "Operations Manager",
-        "Graphic Designer", "Social Media Manager", "Customer Success Manager"
-    ]
-    if field and "tech" in field.lower():
-        return tech_careers
-    elif field and "non-tech" in field.lower():
-        return non_tech_careers
-    else:
-        return tech_careers + non_tech_careers
+    return career_catalog.careers_for(career_catalog.find_field(field) if field else None)
 
 def format_roadmap_response(skill, level="beginner"):
-    roadmaps = {
-        "python": {
-            "beginner": [
-                "Week 1-2: Python basics, variables, data types",
-                "Week 3-4: Control structures, functions",
-                "Week 5-6: Data structures (lists, dictionaries)",
-                "Week 7-8: File handling, error handling",
-                "Week 9-12: Projects - Calculator, To-do app"
-            ],
-            "intermediate": [
-                "Month 1: OOP concepts, classes, inheritance",
-                "Month 2: Libraries (pandas, numpy, requests)",
-                "Month 3: Web scraping, APIs",
-                "Month 4: Database operations (SQLite, PostgreSQL)",
-                "Month 5-6: Advanced projects - Web app, data analysis"
-            ]
-        },
-        "data science": {
-            "beginner": [
-                "Month 1: Python/R basics, statistics",
-                "Month 2: Data manipulation (pandas, dplyr)",
-                "Month 3: Data visualization (matplotlib, ggplot2)",
-                "Month 4: Machine learning basics",
-                "Month 5-6: Projects - analysis, predictions"
-            ]
-        }
-    }
-    return roadmaps.get(skill.lower(), {}).get(level, [
+    skill_id = career_catalog.find_skill(skill)
+    return (skill_id and career_catalog.roadmap(skill_id, level)) or [
         "Custom roadmap: Start with fundamentals",
         "Practice regularly with hands-on projects", 
         "Join communities and seek mentorship",
         "Build a portfolio to showcase your skills"
-    ])
\ No newline at end of file
+    ]
\ No newline at end of file
@@ -0,0 +1,274 @@
+import atexit
+import copy
+import random
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from typing import Dict, Optional
+
+# Firestore rejects batches with more than 500 writes
+MAX_BATCH_SIZE = 500
+# Longest wait between commit attempts while Firestore keeps failing
+MAX_BACKOFF = 30.0
+
+
+def merge_fields(target: Dict, data: Dict) -> Dict:
+    """Merge ``data`` into ``target`` the way Firestore's ``set(..., merge=True)`` does.
+
+    Nested maps are merged key by key; any other value, lists included,
+    replaces what was there. ``data`` is copied, never aliased.
+    """
+    for key, value in data.items():
+        if isinstance(value, dict) and isinstance(target.get(key), dict):
+            merge_fields(target[key], value)
+        else:
+            target[key] = copy.deepcopy(value)
+    return target
+
+
+# Queues not yet closed; drained once at interpreter exit
+_open_queues = weakref.WeakSet()
+
+
+@atexit.register
+def _close_open_queues():
+    for queue in list(_open_queues):
+        queue.close()
+
+
+class WriteBehindQueue:
+    """Coalescing write-behind buffer for Firestore document writes.
+
+    ``put`` only records the write. Writes to the same document within
+    ``window`` seconds are merged into one (nested maps deeply, as Firestore
+    merges them; see ``merge_fields``), and a background thread commits
+    everything pending with ``db.batch()``, so a burst of per-message saves
+    costs one round-trip per batch instead of one per save. Pending writes
+    are drained by ``flush`` and at interpreter exit. After a failed commit
+    the writes are requeued and retried with jittered exponential backoff;
+    ``failures`` counts consecutive failed commits.
+    """
+
+    def __init__(self, db, window: float = 0.5, max_batch: int = MAX_BATCH_SIZE,
+                 max_backoff: float = MAX_BACKOFF):
+        self.db = db
+        self.window = window
+        self.max_batch = max_batch
+        self.max_backoff = max_backoff
+        self.failures = 0
+        self._pending = OrderedDict()
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._closed = False
+        self.writes = 0
+        self.coalesced = 0
+        self.committed = 0
+        self.batches = 0
+        self.errors = 0
+        self._thread = threading.Thread(target=self._run, name="firestore-write-behind", daemon=True)
+        self._thread.start()
+        _open_queues.add(self)
+
+    def put(self, collection: str, document_id: str, data: Dict):
+        """Queue a merge-write of ``data`` into ``collection/document_id``"""
+        key = (collection, document_id)
+        with self._cond:
+            self.writes += 1
+            if key in self._pending:
+                self.coalesced += 1
+                merge_fields(self._pending[key], data)
+            else:
+                self._pending[key] = merge_fields({}, data)
+            self._cond.notify()
+
+    def pending(self, collection: str, document_id: str) -> Optional[Dict]:
+        """Fields queued for a document but not yet committed, for read-your-writes"""
+        with self._cond:
+            data = self._pending.get((collection, document_id))
+            return copy.deepcopy(data) if data is not None else None
+
+    def flush(self) -> int:
+        """Commit everything queued so far; returns the number of documents written"""
+        with self._flush_lock:
+            with self._cond:
+                writes, self._pending = self._pending, OrderedDict()
+            items = list(writes.items())
+            written = 0
+            for start in range(0, len(items), self.max_batch):
+                chunk = items[start:start + self.max_batch]
+                batch = self.db.batch()
+                for (collection, document_id), data in chunk:
+                    batch.set(self.db.collection(collection).document(document_id), data, merge=True)
+                try:
+                    batch.commit()
+                    written += len(chunk)
+                    self.batches += 1
+                    self.failures = 0
+                except Exception as e:
+                    print(f"Firebase batch write error: {e}")
+                    self.errors += 1
+                    self.failures += 1
+                    self._requeue(items[start:])
+                    break
+            self.committed += written
+            return written
+
+    def _requeue(self, items):
+        # Anything queued since the flush started is newer and wins.
+        # Moving each item to the front in reverse keeps the batch's order.
+        with self._cond:
+            for key, data in reversed(items):
+                newer = self._pending.get(key)
+                if newer is not None:
+                    merge_fields(data, newer)
+                self._pending[key] = data
+                self._pending.move_to_end(key, last=False)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+            # Let more writes to the same documents arrive and coalesce.
+            time.sleep(self.delay())
+            self.flush()
+
+    def delay(self) -> float:
+        """Seconds before the next commit: the window, or a backoff after failures"""
+        if not self.failures:
+            return self.window
+        cap = min(self.max_backoff, self.window * 2 ** self.failures)
+        return random.uniform(cap / 2, cap)
+
+    def close(self):
+        """Stop the background thread and drain what is left"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        _open_queues.discard(self)
+        self.flush()
+
+    def stats(self) -> Dict:
+        with self._cond:
+            return {
+                "pending": len(self._pending),
+                "writes": self.writes,
+                "coalesced": self.coalesced,
+                "committed": self.committed,
+                "batches": self.batches,
+                "errors": self.errors,
+                "failures": self.failures,
+            }
+
+
+def check_nested_merge() -> bool:
+    """Two partial updates to one nested map, coalesced into one flush, keep both keys"""
+    from fake_firestore import FakeFirestore
+
+    updates = [{"profile": {"name": "Asha"}}, {"profile": {"career_stage": "Returning"}, "tags": ["a"]}]
+    expected = {"email": "a@example.com", "profile": {"interests": ["Finance"], "name": "Asha",
+                                                      "career_stage": "Returning"}, "tags": ["a"]}
+    results = {}
+    for label in ("direct set", "write-behind"):
+        db = FakeFirestore()
+        document = db.collection("users").document("a")
+        document.set({"email": "a@example.com", "profile": {"interests": ["Finance"]}, "tags": ["x", "y"]})
+        if label == "direct set":
+            for update in updates:
+                document.set(update, merge=True)
+        else:
+            queue = WriteBehindQueue(db, window=5)
+            for update in updates:
+                queue.put("users", "a", update)
+            queue.flush()
+            queue.close()
+        results[label] = document.get().to_dict()
+    ok = results["direct set"] == results["write-behind"] == expected
+    print(f"two nested partial updates in one flush: {'same as direct sets' if ok else results}")
+    return ok
+
+
+def check_requeue_order() -> bool:
+    """A failed flush puts its writes back in their original order, ahead of newer ones"""
+    from fake_firestore import FakeFirestore
+
+    db = FakeFirestore()
+    queue = WriteBehindQueue(db, window=5)
+    for document_id in ("a", "b", "c"):
+        queue.put("users", document_id, {"n": document_id})
+    db.down = True
+    queue.flush()
+    queue.put("users", "d", {"n": "d"})
+    with queue._cond:
+        order = [document_id for _, document_id in queue._pending]
+    db.down = False
+    queue.close()
+    ok = order == ["a", "b", "c", "d"]
+    print(f"writes requeued after a failed flush: {'in order' if ok else order}")
+    return ok
+
+
+def check_exit_registration() -> bool:
+    """Closed queues are not kept alive by the interpreter-exit hook"""
+    import gc
+    from fake_firestore import FakeFirestore
+
+    queues = [WriteBehindQueue(FakeFirestore(), window=5) for _ in range(3)]
+    open_before = len(_open_queues)
+    for queue in queues:
+        queue.close()
+        queue._thread.join()
+    del queue, queues
+    gc.collect()
+    ok = open_before >= 3 and not _open_queues
+    print(f"queues tracked for exit: {'released on close' if ok else len(_open_queues)}")
+    return ok
+
+
+def run_benchmark(users: int = 20, messages: int = 50, latency: float = 0.005):
+    """Messages/sec for direct document sets vs the write-behind queue.
+
+    Runs against fake_firestore with ``latency`` seconds per round-trip.
+    """
+    from fake_firestore import FakeFirestore
+
+    def user_document(user, message):
+        return {"email": f"user{user}@example.com", "chat_history": [["user", f"message {m}"]
+                                                                     for m in range(message + 1)]}
+
+    db = FakeFirestore(latency=latency)
+    start = time.perf_counter()
+    for message in range(messages):
+        for user in range(users):
+            db.collection("users").document(f"user{user}").set(user_document(user, message), merge=True)
+    direct = time.perf_counter() - start
+    print(f"direct set:    {users * messages / direct:>10.0f} msg/s  ({db.round_trips} round-trips)")
+
+    db = FakeFirestore(latency=latency)
+    queue = WriteBehindQueue(db, window=0.05)
+    start = time.perf_counter()
+    for message in range(messages):
+        for user in range(users):
+            queue.put("users", f"user{user}", user_document(user, message))
+    queue.flush()
+    behind = time.perf_counter() - start
+    queue.close()
+    print(f"write-behind:  {users * messages / behind:>10.0f} msg/s  ({db.round_trips} round-trips, "
+          f"{queue.coalesced} writes coalesced)")
+
+    for user in range(users):
+        stored = db.collection("users").document(f"user{user}").get().to_dict()
+        assert stored == user_document(user, messages - 1), "write-behind lost an update"
+
+
+if __name__ == "__main__":
+    import sys
+
+    run_benchmark()
+    ok = check_nested_merge()
+    ok = check_requeue_order() and ok
+    ok = check_exit_registration() and ok
+    sys.exit(0 if ok else 1)